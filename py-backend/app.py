@@ -1,25 +1,71 @@
-from flask import Flask # Removed unused imports request, jsonify, render_template, defaultdict
-from utils import initialize_databases # Only initialize_databases is needed here now
-from routes.employee_routes import employee_bp # Import from the routes package
-from routes.schedule_routes import schedule_bp # Import from the routes package
-from routes.main_routes import main_bp # Import the new main blueprint
-
-app = Flask(__name__,
-            template_folder="../frontend/dist",  # Point to the dist folder for templates
-            static_folder="../frontend/dist",    # Point to the dist folder for static files
-            static_url_path=''                # Serve static files from the root (e.g., /assets/main.js)
-            )
-
-# Initialize DB files if they don't exist
-initialize_databases()
-
-# Register Blueprints
-app.register_blueprint(employee_bp)
-app.register_blueprint(schedule_bp)
-app.register_blueprint(main_bp)
+import threading
+from flask import Flask
+from config import WARM_UP_ON_START, METRICS_ENABLED
+
+def create_app(warm_up=WARM_UP_ON_START):
+    """
+    Builds the Flask app without touching the database.
+    The storage client and the database bootstrap are created on first use: either by the
+    background warm-up thread started here or by the first request, whichever comes first.
+    """
+    # Imported here so importing this module stays cheap; these don't connect to the database either
+    from utils import ensure_databases_initialized
+    from routes.employee_routes import employee_bp # Import from the routes package
+    from routes.schedule_routes import schedule_bp # Import from the routes package
+    from routes.main_routes import main_bp # Import the new main blueprint
+    from routes.metrics_routes import metrics_bp
+    from metrics import init_app as init_metrics
+    from compression import init_app as init_compression
+
+    app = Flask(__name__,
+                template_folder="../frontend/dist",  # Point to the dist folder for templates
+                static_folder="../frontend/dist",    # Point to the dist folder for static files
+                static_url_path=''                # Serve static files from the root (e.g., /assets/main.js)
+                )
+
+    init_metrics(app) # Request timings, storage round trips and the opt-in profiler (no-op when disabled)
+    init_compression(app) # Gzip for large responses; runs before the metrics hook, so request timings include it
+
+    # Initialize the database (default on-call config) before the first request is handled
+    app.before_request(ensure_databases_initialized)
+    if warm_up:
+        threading.Thread(target=_warm_up, args=(ensure_databases_initialized,), name="db-warm-up", daemon=True).start()
+
+    # Register Blueprints
+    app.register_blueprint(employee_bp)
+    app.register_blueprint(schedule_bp)
+    app.register_blueprint(main_bp)
+    if METRICS_ENABLED:
+        app.register_blueprint(metrics_bp)
+    return app
+
+def _warm_up(ensure_databases_initialized):
+    try:
+        ensure_databases_initialized()
+    except Exception as e: # The first request retries and reports the error
+        print(f"Background database warm-up failed: {e}")
+
+_app = None
+_app_lock = threading.Lock()
+
+def get_app():
+    """Returns the app served as 'app:app', building it on first use."""
+    global _app
+    if _app is None:
+        with _app_lock:
+            if _app is None:
+                _app = create_app()
+    return _app
+
+def __getattr__(name):
+    # Keeps 'app:app' (gunicorn, flask run) working; importing this module no longer builds the app or starts the warm-up
+    if name == 'app':
+        return get_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 if __name__ == '__main__':
     # Ensure Flask runs on 0.0.0.0 to be accessible on the local network if needed,
     # otherwise 127.0.0.1 is fine for purely local access.
     # debug=True is for development, turn off for any "production" use.
-    app.run(host='127.0.0.1', port=5000, debug=True)
+    # For production, serve the app with gunicorn -c gunicorn.conf.py app:app (threaded workers).
+    get_app().run(host='127.0.0.1', port=5000, debug=True)
@@ -0,0 +1,188 @@
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+from config import (
+    DAYS_OF_WEEK, SHIFT_TYPES, SHIFT_DEFINITIONS, DEFAULT_SEATS_PER_SHIFT, MAX_SHIFTS_PER_WEEK, DEFAULT_SOLVER_TIME_BUDGET_MS,
+    DEFAULT_MULTISTART_VARIANTS, MULTISTART_WORKERS,
+)
+from schedule_generator import create_weekly_schedule
+from schedule_model import compile_schedule_model
+from schedule_multistart import create_multistart_schedules
+from schedule_optimizer import create_optimal_schedule
+
+def make_days(day_count):
+    """Day names for the horizon: the configured week, then synthetic names (no '_' in them)."""
+    if day_count <= len(DAYS_OF_WEEK):
+        return DAYS_OF_WEEK[:day_count]
+    return [f"D{i + 1:03d}" for i in range(day_count)]
+
+def make_shift_definitions(shift_types):
+    """
+    The configured definitions if they cover shift_types (None), else synthetic ones that split the
+    day into len(shift_types) back-to-back shifts starting at 08:00.
+    """
+    if all(stype in SHIFT_DEFINITIONS for stype in shift_types):
+        return None
+    minutes = 24 * 60 // len(shift_types)
+    definitions = {}
+    for i, stype in enumerate(shift_types):
+        start = (8 * 60 + i * minutes) % (24 * 60)
+        end = (start + minutes) % (24 * 60)
+        definitions[stype] = {
+            "start": f"{start // 60:02d}:{start % 60:02d}",
+            "end": f"{end // 60:02d}:{end % 60:02d}",
+            "seats": DEFAULT_SEATS_PER_SHIFT,
+        }
+    return definitions
+
+def make_employees(employee_count, rng, max_past_shifts=50):
+    """Synthetic employees_dict with random lifetime counters."""
+    employees_dict = {}
+    for i in range(employee_count):
+        day_shifts = rng.randint(0, max_past_shifts // 2)
+        night_shifts = rng.randint(0, max_past_shifts // 2)
+        emp_id = f"emp{i:06d}"
+        employees_dict[emp_id] = {
+            "id": emp_id,
+            "name": f"Employee {i}",
+            "total_shifts_assigned": day_shifts + night_shifts,
+            "total_day_shifts_assigned": day_shifts,
+            "total_night_shifts_assigned": night_shifts,
+        }
+    return employees_dict
+
+def make_preferences(employees_dict, days_of_week, shift_types, zero_density, one_density, rng):
+    """Synthetic employee_preferences_raw: each slot is "0" or "1" with the given densities, else ""."""
+    slots = [f"{day}_{stype}" for day in days_of_week for stype in shift_types]
+    preferences = {}
+    for emp_id in employees_dict:
+        prefs = {}
+        for shift_slot in slots:
+            roll = rng.random()
+            if roll < zero_density:
+                prefs[shift_slot] = "0"
+            elif roll < zero_density + one_density:
+                prefs[shift_slot] = "1"
+            else:
+                prefs[shift_slot] = ""
+        preferences[emp_id] = prefs
+    return preferences
+
+def schedule_quality(proposed_schedule_with_ids, employee_preferences_raw, employees_dict, model):
+    """Unfilled seats, spread of this week's load and share of assignments on preferred ("1") slots."""
+    week_loads = {emp_id: 0 for emp_id in employees_dict}
+    assignments = preferred = 0
+    for shift_slot, emp_ids_list in proposed_schedule_with_ids.items():
+        for emp_id in emp_ids_list:
+            week_loads[emp_id] += 1
+            assignments += 1
+            preferred += employee_preferences_raw.get(emp_id, {}).get(shift_slot) == "1"
+    loads = list(week_loads.values()) or [0]
+    return {
+        "unfilled_seats": sum(model.unfilled_seats(model.slot_index[slot], len(ids)) for slot, ids in proposed_schedule_with_ids.items()),
+        "unfilled_slots": sum(model.unfilled_seats(model.slot_index[slot], len(ids)) > 0 for slot, ids in proposed_schedule_with_ids.items()),
+        "load_spread": max(loads) - min(loads),
+        "load_stdev": round(statistics.pstdev(loads), 4),
+        "preferred_share": round(preferred / assignments, 4) if assignments else 0.0,
+    }
+
+def run_case(employee_count, zero_density, one_density, day_count, shift_types, max_shifts, mode, time_budget_ms, repeat, seed, variants=DEFAULT_MULTISTART_VARIANTS):
+    rng = random.Random(seed)
+    days_of_week = make_days(day_count)
+    employees_dict = make_employees(employee_count, rng)
+    preferences = make_preferences(employees_dict, days_of_week, shift_types, zero_density, one_density, rng)
+    model = compile_schedule_model(days_of_week, shift_types, make_shift_definitions(shift_types))
+
+    def solve():
+        if mode == 'optimal':
+            return create_optimal_schedule(preferences, employees_dict, days_of_week, shift_types, max_shifts, time_budget_ms, model)[0]
+        if mode == 'multistart':
+            candidates = create_multistart_schedules(
+                preferences, employees_dict, days_of_week, shift_types, max_shifts, variants, 1, time_budget_ms, seed,
+                MULTISTART_WORKERS, model
+            )[0]
+            return candidates[0]["proposed_schedule_with_ids"]
+        return create_weekly_schedule(preferences, employees_dict, days_of_week, shift_types, max_shifts, model)[0]
+
+    # Timed runs without tracemalloc (it slows allocation-heavy code down), then one run for peak memory
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        schedule = solve()
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    solve()
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "employees": employee_count,
+        "zero_density": zero_density,
+        "one_density": one_density,
+        "days": day_count,
+        "shift_types": shift_types,
+        "max_shifts_per_week": max_shifts,
+        "mode": mode,
+        "seed": seed,
+        "wall_time_ms_min": round(min(timings) * 1000, 3),
+        "wall_time_ms_median": round(statistics.median(timings) * 1000, 3),
+        "peak_memory_kb": round(peak_bytes / 1024, 1),
+        **schedule_quality(schedule, preferences, employees_dict, model),
+    }
+
+def _int_list(value):
+    return [int(v) for v in value.split(',')]
+
+def _float_list(value):
+    return [float(v) for v in value.split(',')]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark schedule generation on synthetic rosters.")
+    parser.add_argument('--employees', type=_int_list, default=[10, 100, 1000, 10000], help="Comma-separated employee counts")
+    parser.add_argument('--zero-density', type=_float_list, default=[0.3], help="Comma-separated shares of \"0\" preferences")
+    parser.add_argument('--one-density', type=_float_list, default=[0.2], help="Comma-separated shares of \"1\" preferences")
+    parser.add_argument('--days', type=_int_list, default=[len(DAYS_OF_WEEK)], help="Comma-separated day counts")
+    parser.add_argument('--shift-types', default=','.join(SHIFT_TYPES), help="Comma-separated shift type names (types without a configured definition split the day evenly)")
+    parser.add_argument('--max-shifts', type=_int_list, default=[MAX_SHIFTS_PER_WEEK], help="Comma-separated max shifts per week")
+    parser.add_argument('--mode', choices=['greedy', 'optimal', 'multistart'], default='greedy')
+    parser.add_argument('--time-budget-ms', type=float, default=DEFAULT_SOLVER_TIME_BUDGET_MS, help="Budget for --mode optimal/multistart")
+    parser.add_argument('--variants', type=int, default=DEFAULT_MULTISTART_VARIANTS, help="Variants for --mode multistart")
+    parser.add_argument('--repeat', type=int, default=3, help="Timed runs per case")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Write JSON results to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    shift_types = args.shift_types.split(',')
+    results = []
+    for employee_count in args.employees:
+        for zero_density in args.zero_density:
+            for one_density in args.one_density:
+                for day_count in args.days:
+                    for max_shifts in args.max_shifts:
+                        result = run_case(
+                            employee_count, zero_density, one_density, day_count, shift_types, max_shifts,
+                            args.mode, args.time_budget_ms, args.repeat, args.seed, args.variants
+                        )
+                        results.append(result)
+                        print(
+                            f"employees={employee_count} zeros={zero_density} ones={one_density} days={day_count} "
+                            f"max_shifts={max_shifts}: {result['wall_time_ms_median']} ms, "
+                            f"{result['peak_memory_kb']} KB peak, {result['unfilled_seats']} unfilled seats, "
+                            f"load spread {result['load_spread']}",
+                            file=sys.stderr
+                        )
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
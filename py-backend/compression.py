@@ -0,0 +1,33 @@
+import gzip
+
+from config import GZIP_RESPONSES, GZIP_MIN_BYTES, GZIP_LEVEL
+
+_COMPRESSIBLE_MIMETYPES = {'application/json', 'application/x-ndjson', 'text/html', 'text/csv', 'text/plain', 'text/css', 'application/javascript'}
+
+def _should_compress(request, response):
+    return (
+        response.status_code == 200
+        and not response.direct_passthrough # Files sent by send_file / the static route
+        and not response.is_streamed # Streams (e.g. NDJSON batches) must reach the client as they are produced
+        and response.mimetype in _COMPRESSIBLE_MIMETYPES
+        and 'Content-Encoding' not in response.headers
+        and 'gzip' in request.accept_encodings
+    )
+
+def init_app(app):
+    """Gzips response bodies of at least GZIP_MIN_BYTES for clients that send Accept-Encoding: gzip."""
+    if not GZIP_RESPONSES:
+        return
+    from flask import request
+
+    @app.after_request
+    def compress_response(response):
+        if not _should_compress(request, response):
+            return response
+        response.vary.add('Accept-Encoding')
+        body = response.get_data()
+        if len(body) < GZIP_MIN_BYTES:
+            return response
+        response.set_data(gzip.compress(body, compresslevel=GZIP_LEVEL))
+        response.headers['Content-Encoding'] = 'gzip'
+        return response
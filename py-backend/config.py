@@ -1,7 +1,57 @@
+import os
+
 EMPLOYEES_COLLECTION = 'employees'
 ON_CALL_COLLECTION = 'onCallConfiguration' # Using a single document for on-call state
-SCHEDULE_HISTORY_COLLECTION = 'scheduleHistory' # For future use
+SCHEDULE_HISTORY_COLLECTION = 'scheduleHistory' # Append-only finalized schedules; document IDs sort by finalization time
+EMPLOYEE_NAMES_COLLECTION = 'employeeNames' # Unique-name index: one doc per normalized employee name
 
 DAYS_OF_WEEK = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
 SHIFT_TYPES = ['Day', 'Night']
-MAX_SHIFTS_PER_WEEK = 3
\ No newline at end of file
+MAX_SHIFTS_PER_WEEK = 3
+# Shift types by name: start and end time ("HH:MM"; an end at or before the start is on the next day),
+# seats to fill per slot and the employee counter the shift adds to besides total_shifts_assigned
+SHIFT_DEFINITIONS = {
+    'Day': {'start': '08:00', 'end': '20:00', 'seats': 2, 'counter': 'total_day_shifts_assigned'},
+    'Night': {'start': '20:00', 'end': '08:00', 'seats': 2, 'counter': 'total_night_shifts_assigned'},
+}
+DEFAULT_SEATS_PER_SHIFT = 2 # For shift definitions without 'seats'
+MIN_REST_HOURS = 8 # Minimum time off between two shifts of the same employee (back-to-back Day/Night is not allowed)
+WEEKEND_DAYS = ['Friday', 'Saturday']
+HISTORY_WEEK_START_DAY = 6 # Weekday (Monday=0) weeks start on in the schedule history; Sunday like the frontend's grid
+HISTORY_WINDOW_WEEKS = 8 # Weeks of per-employee shift counts kept on each employee for windowed load balancing
+DEFAULT_HISTORY_PAGE_SIZE = 20
+MAX_HISTORY_PAGE_SIZE = 100
+MAX_ON_CALL_LOOKAHEAD = 52 # Upcoming on-call entries one /api/on_call?next= request may ask for
+SCHEDULE_MODES = ['greedy', 'optimal', 'multistart'] # 'optimal' searches for fewer unfilled seats within a time budget; 'multistart' runs randomized variants in parallel
+DEFAULT_SOLVER_TIME_BUDGET_MS = 200
+MAX_SOLVER_TIME_BUDGET_MS = 10000 # Longest solver budget a request may ask for
+SCHEDULE_CACHE_SIZE = 64 # Generated schedules kept per employee-data version (LRU)
+DEFAULT_HORIZON_WEEKS = 4
+MAX_HORIZON_WEEKS = 12
+HORIZON_MODES = ['greedy', 'optimal']
+HORIZON_SESSION_LIMIT = 16 # Generated horizons kept in memory for incremental re-solves (LRU)
+MULTISTART_WORKERS = int(os.environ.get('SHAVZAK_MULTISTART_WORKERS', '0')) or os.cpu_count() or 1 # Solver processes for 'multistart', batches and offloaded solves (1 runs in-process)
+DEFAULT_MULTISTART_VARIANTS = 64
+MAX_MULTISTART_VARIANTS = 4096
+DEFAULT_MULTISTART_TOP_K = 3
+MAX_BATCH_TEAMS = 200 # Problems accepted by one /api/generate_schedules call
+MAX_CSV_IMPORT_WARNINGS = 100 # Warnings returned by a preferences CSV import (the rest are dropped)
+
+CACHE_TTL_SECONDS = 300 # Upper bound on cache staleness if a snapshot listener silently stops
+CACHE_SNAPSHOT_LISTENERS = True # Keep cached collections/documents fresh with Firestore on_snapshot listeners
+FIRESTORE_BATCH_LIMIT = 500 # Maximum number of writes in a single Firestore batch or transaction
+STORAGE_IO_THREADS = int(os.environ.get('SHAVZAK_STORAGE_IO_THREADS', '16')) # Threads for storage calls a handler issues concurrently (1 runs them in order)
+
+STORAGE_BACKEND = os.environ.get('SHAVZAK_STORAGE_BACKEND', 'firestore') # 'firestore', 'sqlite' (local file, WAL mode) or 'memory'
+SQLITE_DB_PATH = os.environ.get('SHAVZAK_SQLITE_DB_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'shavzak.db'))
+SQLITE_BUSY_TIMEOUT_SECONDS = 30 # How long a thread's connection waits for another writer before raising 'database is locked'
+WARM_UP_ON_START = os.environ.get('SHAVZAK_WARM_UP_ON_START', '1') == '1' # Connect and bootstrap the database in a background thread
+
+GZIP_RESPONSES = os.environ.get('SHAVZAK_GZIP', '1') == '1' # Compress large responses for clients that accept gzip
+GZIP_MIN_BYTES = 1024 # Smaller bodies are sent as-is; compressing them costs more than it saves
+GZIP_LEVEL = 5
+
+METRICS_ENABLED = os.environ.get('SHAVZAK_METRICS', '1') == '1' # Request/storage/solver timings and the /metrics endpoint
+PROFILING_ENABLED = os.environ.get('SHAVZAK_PROFILING', '0') == '1' # Allow ?profile=1 / "X-Profile: 1" per request
+PROFILER_SAMPLE_INTERVAL_MS = 1
+MAX_STORED_PROFILES = 20
@@ -1,15 +1,30 @@
 import firebase_admin
 from firebase_admin import credentials, firestore
 import os
+import threading
 
 # Construct the absolute path to the service account key file
 # This assumes firebase_init.py is in the same directory as the key file
 script_dir = os.path.dirname(os.path.abspath(__file__))
 key_file_path = os.path.join(script_dir, "shavzak-firebase-adminsdk.json")
 
-# Initialize Firebase Admin - This will run once when this module is first imported
-if not firebase_admin._apps: # Check if already initialized to prevent re-initialization
-    cred = credentials.Certificate(key_file_path)
-    firebase_admin.initialize_app(cred)
+_db = None
+_init_lock = threading.Lock()
 
-db = firestore.client() # Firestore database client
\ No newline at end of file
+def get_db():
+    """Returns the Firestore client, initializing Firebase Admin on first use instead of at import time."""
+    global _db
+    if _db is None:
+        with _init_lock:
+            if _db is None:
+                if not firebase_admin._apps: # Check if already initialized to prevent re-initialization
+                    cred = credentials.Certificate(key_file_path)
+                    firebase_admin.initialize_app(cred)
+                _db = firestore.client() # Firestore database client
+    return _db
+
+def __getattr__(name):
+    # Keeps `from firebase_init import db` working; the client is created on that first access
+    if name == 'db':
+        return get_db()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,16 @@
+import os
+
+# Production serving with a threaded WSGI server instead of Flask's development server:
+#   gunicorn -c gunicorn.conf.py app:app
+# Every worker process handles up to `threads` requests at once, so requests waiting on storage
+# or on the solver pool (schedule_batch.solve_schedule_offloaded) don't hold up the others.
+# Scale with threads (and MULTISTART_WORKERS for the solvers) rather than worker processes: horizon
+# sessions, the schedule result cache and the 'memory' database live in one process, so with more
+# workers a horizon edit can land on a worker that never saw the horizon.
+bind = os.environ.get('SHAVZAK_BIND', '127.0.0.1:5000')
+workers = int(os.environ.get('SHAVZAK_WEB_WORKERS', '1'))
+threads = int(os.environ.get('SHAVZAK_WEB_THREADS', '16'))
+worker_class = 'gthread'
+
+if workers > 1 and os.environ.get('SHAVZAK_STORAGE_BACKEND', 'firestore') == 'memory':
+    raise RuntimeError("SHAVZAK_STORAGE_BACKEND=memory keeps the database inside one process; run a single worker (SHAVZAK_WEB_WORKERS=1)")
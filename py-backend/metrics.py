@@ -0,0 +1,303 @@
+import collections
+import contextvars
+import functools
+import sys
+import threading
+import time
+import uuid
+
+from config import METRICS_ENABLED, PROFILING_ENABLED, PROFILER_SAMPLE_INTERVAL_MS, MAX_STORED_PROFILES
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+def _escape(label_value):
+    return str(label_value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class Histogram:
+    """A labelled Prometheus histogram kept in process memory."""
+
+    def __init__(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {} # {label_values: [bucket counts..., sum, count]}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for i, upper_bound in enumerate(self.buckets):
+                if value <= upper_bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series_items = sorted((labels, list(series)) for labels, series in self._series.items())
+        for label_values, series in series_items:
+            labels = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, label_values))
+            prefix = f"{labels}," if labels else ""
+            for upper_bound, bucket_count in zip(self.buckets, series):
+                lines.append(f'{self.name}_bucket{{{prefix}le="{upper_bound}"}} {bucket_count}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {series[-1]}')
+            lines.append(f"{self.name}_sum{{{labels}}} {series[-2]}")
+            lines.append(f"{self.name}_count{{{labels}}} {series[-1]}")
+        return lines
+
+REQUEST_LATENCY = Histogram('shavzak_http_request_duration_seconds', "Flask request latency.", ('method', 'endpoint', 'status'))
+REQUEST_ROUND_TRIPS = Histogram('shavzak_http_request_storage_round_trips', "Storage round trips per request.", ('endpoint',), COUNT_BUCKETS)
+REQUEST_DOCUMENTS = Histogram('shavzak_http_request_documents_read', "Documents read from storage per request.", ('endpoint',), COUNT_BUCKETS)
+HELPER_LATENCY = Histogram('shavzak_utils_helper_duration_seconds', "Latency of utils storage helpers (including cache hits).", ('helper',))
+STORAGE_LATENCY = Histogram('shavzak_storage_round_trip_duration_seconds', "Latency of storage backend calls.", ('operation',))
+SOLVER_PHASE_LATENCY = Histogram('shavzak_solver_phase_duration_seconds', "Time spent per schedule solver phase.", ('solver', 'phase'))
+JSON_LATENCY = Histogram('shavzak_json_serialization_duration_seconds', "Time spent serializing JSON responses.")
+HISTOGRAMS = (REQUEST_LATENCY, REQUEST_ROUND_TRIPS, REQUEST_DOCUMENTS, HELPER_LATENCY, STORAGE_LATENCY, SOLVER_PHASE_LATENCY, JSON_LATENCY)
+
+# Per-request totals, set by the Flask hooks; None outside of a request
+_request_stats = contextvars.ContextVar('request_stats', default=None)
+_request_stats_lock = threading.Lock() # A request's storage calls may run on several threads (see utils.run_concurrently)
+
+def _add_to_request(**amounts):
+    stats = _request_stats.get()
+    if stats is not None:
+        with _request_stats_lock:
+            for key, amount in amounts.items():
+                stats[key] += amount
+
+# --- Spans ---
+
+def timed_helper(func):
+    """Decorator recording the latency of a utils helper. Returns func unchanged when metrics are disabled."""
+    if not METRICS_ENABLED:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            HELPER_LATENCY.observe(time.perf_counter() - start, func.__name__)
+    return wrapper
+
+_captured_phases = contextvars.ContextVar('captured_phases', default=None) # Set while a pool task collects its phase timings
+
+def _record_phase(solver, phase, elapsed):
+    SOLVER_PHASE_LATENCY.observe(elapsed, solver, phase)
+    _add_to_request(solver_seconds=elapsed)
+
+class _PhaseTimer:
+    __slots__ = ('solver', 'phase', 'start')
+
+    def __init__(self, solver, phase):
+        self.solver, self.phase = solver, phase
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        captured = _captured_phases.get()
+        if captured is not None:
+            captured.append((self.solver, self.phase, elapsed))
+        else:
+            _record_phase(self.solver, self.phase, elapsed)
+        return False
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+def solver_phase(solver, phase):
+    """Context manager timing one phase of a schedule solver."""
+    return _PhaseTimer(solver, phase) if METRICS_ENABLED else _NULL_TIMER
+
+def call_with_solver_phases(func, *args, **kwargs):
+    """
+    Calls func and returns (result, [(solver, phase, seconds), ...]) with the solver phases it timed
+    instead of recording them. For process-pool tasks: pass the phases to record_solver_phases in
+    the parent, where the metrics and the request's Server-Timing live.
+    """
+    phases = []
+    token = _captured_phases.set(phases)
+    try:
+        return func(*args, **kwargs), phases
+    finally:
+        _captured_phases.reset(token)
+
+def record_solver_phases(phases):
+    """Records phase timings returned by call_with_solver_phases."""
+    for solver, phase, elapsed in phases:
+        _record_phase(solver, phase, elapsed)
+
+_DOCUMENT_COUNTERS = {
+    'get_all_docs': len,
+    'get_doc': lambda doc: 1 if doc is not None else 0,
+    'get_docs': lambda docs: sum(doc is not None for _, doc in docs),
+    'has_docs': lambda found: 1 if found else 0,
+    'list_docs': len,
+}
+_ROUND_TRIP_METHODS = {
+    'get_all_docs', 'get_doc', 'get_docs', 'has_docs', 'list_docs', 'set_doc', 'add_doc', 'update_doc', 'delete_doc',
+    'run_transaction', 'transform_doc', 'change_counter',
+}
+
+class InstrumentedBackend:
+    """Wraps a storage backend, timing every round trip and counting documents read per request."""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def __getattr__(self, name):
+        attribute = getattr(self.backend, name)
+        if name not in _ROUND_TRIP_METHODS:
+            return attribute
+        count_documents = _DOCUMENT_COUNTERS.get(name)
+
+        @functools.wraps(attribute)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            result = attribute(*args, **kwargs)
+            elapsed = time.perf_counter() - start
+            STORAGE_LATENCY.observe(elapsed, name)
+            documents = count_documents(result) if count_documents else 0
+            _add_to_request(round_trips=1, documents=documents, storage_seconds=elapsed)
+            return result
+        return wrapper
+
+def instrument_backend(backend):
+    return InstrumentedBackend(backend) if METRICS_ENABLED else backend
+
+# --- Sampling profiler ---
+
+class SamplingProfiler:
+    """Samples one thread's stack every interval and aggregates collapsed stacks (flame graph input)."""
+
+    def __init__(self, thread_id, interval_seconds):
+        self.thread_id = thread_id
+        self.interval_seconds = interval_seconds
+        self.stack_counts = collections.Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        return self
+
+    def _run(self):
+        while not self._stopped.wait(self.interval_seconds):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.stack_counts[';'.join(reversed(stack))] += 1
+
+    def collapsed(self):
+        return '\n'.join(f"{stack} {count}" for stack, count in self.stack_counts.most_common())
+
+_profiles = collections.OrderedDict() # {profile_id: collapsed stacks}, newest last
+_profiles_lock = threading.Lock()
+
+def get_profile(profile_id):
+    with _profiles_lock:
+        return _profiles.get(profile_id)
+
+def _store_profile(collapsed_stacks):
+    profile_id = uuid.uuid4().hex
+    with _profiles_lock:
+        _profiles[profile_id] = collapsed_stacks
+        while len(_profiles) > MAX_STORED_PROFILES:
+            _profiles.popitem(last=False)
+    return profile_id
+
+# --- Flask integration ---
+
+def render_metrics(extra_lines=()):
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    lines.extend(extra_lines)
+    return '\n'.join(lines) + '\n'
+
+def init_app(app):
+    """Adds per-request timing, storage counters, a timed JSON provider and the opt-in profiler to a Flask app."""
+    if not METRICS_ENABLED:
+        return
+    from flask import g, request
+    from flask.json.provider import DefaultJSONProvider
+
+    class TimedJSONProvider(DefaultJSONProvider):
+        def dumps(self, obj, **kwargs):
+            start = time.perf_counter()
+            try:
+                return super().dumps(obj, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                JSON_LATENCY.observe(elapsed)
+                _add_to_request(json_seconds=elapsed)
+
+    app.json = TimedJSONProvider(app)
+
+    @app.before_request
+    def start_request_metrics():
+        g.metrics_start = time.perf_counter()
+        g.metrics_token = _request_stats.set(
+            {"round_trips": 0, "documents": 0, "storage_seconds": 0.0, "solver_seconds": 0.0, "json_seconds": 0.0}
+        )
+        g.profiler = None
+        if PROFILING_ENABLED and (request.headers.get('X-Profile') == '1' or request.args.get('profile') == '1'):
+            g.profiler = SamplingProfiler(threading.get_ident(), PROFILER_SAMPLE_INTERVAL_MS / 1000.0).start()
+
+    @app.after_request
+    def record_request_metrics(response):
+        if 'metrics_start' not in g:
+            return response
+        elapsed = time.perf_counter() - g.metrics_start
+        stats = _request_stats.get() or {}
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched' # Bounded label cardinality
+        REQUEST_LATENCY.observe(elapsed, request.method, endpoint, response.status_code)
+        REQUEST_ROUND_TRIPS.observe(stats.get("round_trips", 0), endpoint)
+        REQUEST_DOCUMENTS.observe(stats.get("documents", 0), endpoint)
+        response.headers['Server-Timing'] = ', '.join([
+            f"storage;dur={stats.get('storage_seconds', 0.0) * 1000:.3f}",
+            f"solver;dur={stats.get('solver_seconds', 0.0) * 1000:.3f}",
+            f"json;dur={stats.get('json_seconds', 0.0) * 1000:.3f}",
+            f"total;dur={elapsed * 1000:.3f}",
+        ])
+        response.headers['X-Storage-Round-Trips'] = str(stats.get("round_trips", 0))
+        response.headers['X-Documents-Read'] = str(stats.get("documents", 0))
+        if g.profiler is not None:
+            response.headers['X-Profile-Id'] = _store_profile(g.profiler.stop().collapsed())
+            g.profiler = None
+        return response
+
+    @app.teardown_request
+    def reset_request_metrics(exc):
+        profiler = g.pop('profiler', None)
+        if profiler is not None: # The request failed before after_request ran
+            profiler.stop()
+        token = g.pop('metrics_token', None)
+        if token is not None:
+            _request_stats.reset(token)
@@ -0,0 +1,37 @@
+from config import EMPLOYEES_COLLECTION, EMPLOYEE_NAMES_COLLECTION, FIRESTORE_BATCH_LIMIT
+from storage import get_backend
+from utils import employee_name_key, employee_name_index_id, invalidate_cache
+
+def migrate_name_index():
+    """Backfills 'name_key' on every employee and the unique-name index collection."""
+    print(f"Backfilling name index for collection: {EMPLOYEES_COLLECTION}...")
+    backend = get_backend()
+    employees = sorted(backend.get_all_docs(EMPLOYEES_COLLECTION), key=lambda emp: emp['id'])
+
+    owners = {} # {name_key: employee}, the first employee (by ID) keeps a duplicated name
+    for emp in employees:
+        name_key = employee_name_key(emp['name'])
+        if name_key in owners:
+            print(f"  Duplicate name '{emp['name']}' on {emp['id']} (kept on {owners[name_key]['id']}); rename it manually")
+        else:
+            owners[name_key] = emp
+
+    # Two writes per employee, so each transaction stays within the batch limit
+    chunk_size = FIRESTORE_BATCH_LIMIT // 2
+    employees_to_index = [(name_key, emp) for name_key, emp in owners.items()]
+    for start in range(0, len(employees_to_index), chunk_size):
+        chunk = employees_to_index[start:start + chunk_size]
+
+        def work(transaction, chunk=chunk):
+            for name_key, emp in chunk:
+                transaction.update(EMPLOYEES_COLLECTION, emp['id'], {"name_key": name_key})
+                transaction.set(EMPLOYEE_NAMES_COLLECTION, employee_name_index_id(name_key), {"employee_id": emp['id'], "name_key": name_key})
+
+        backend.run_transaction(work)
+        print(f"  Indexed {start + len(chunk)}/{len(employees_to_index)} employees")
+
+    invalidate_cache(EMPLOYEES_COLLECTION)
+    print(f"Name index backfill complete. {len(employees_to_index)} names indexed, {len(employees) - len(employees_to_index)} duplicates skipped.")
+
+if __name__ == "__main__":
+    migrate_name_index()
@@ -0,0 +1,134 @@
+import codecs
+import collections.abc
+import csv
+
+from config import MAX_CSV_IMPORT_WARNINGS
+
+# Compact wire format for preferences: one slot header plus one row per employee, e.g.
+#   {"slots": ["Monday_Day", "Monday_Night", ...], "rows": {emp_id: "1.0...", ...}}
+# A row has one character per header slot: '1' (preferred), '0' (can't work it) or '.' (no preference).
+# Rows may also be slot-ordered lists of the usual "1"/"0"/"" values.
+ROW_CHARS = {"1": "1", "0": "0", "": "."}
+_ROW_VALUES = {char: pref_val for pref_val, char in ROW_CHARS.items()}
+
+# Row characters -> preference matrix codes (see schedule_generator._encode_preference)
+_MATRIX_CODES = bytes.maketrans(b'10.', b'\x00\xff\x01')
+_NO_PREFERENCE_CODE = 1
+
+class CompactPreferences(collections.abc.Mapping):
+    """
+    Preferences in the compact wire format. Reads like the nested {emp_id: {shift_slot: value}}
+    mapping (rows are decoded on access), while the solvers encode it without building those dicts.
+    """
+
+    def __init__(self, slots, rows):
+        if not isinstance(slots, list) or not all(isinstance(shift_slot, str) for shift_slot in slots):
+            raise ValueError("'slots' must be a list of shift slot names")
+        if len(set(slots)) != len(slots):
+            raise ValueError("'slots' must not repeat a shift slot")
+        if not isinstance(rows, dict):
+            raise ValueError("'rows' must map employee IDs to preference rows")
+        self.slots = slots
+        self.rows = {}
+        for emp_id, row in rows.items():
+            if isinstance(row, list):
+                if not all(pref_val in ROW_CHARS for pref_val in row):
+                    raise ValueError(f"Row of employee '{emp_id}' may only contain \"1\", \"0\" or \"\"")
+                row = ''.join(ROW_CHARS[pref_val] for pref_val in row)
+            if not isinstance(row, str) or len(row) != len(slots) or row.strip('10.'):
+                raise ValueError(f"Row of employee '{emp_id}' must have one of '1', '0' or '.' per slot ({len(slots)})")
+            self.rows[emp_id] = row
+
+    def __getitem__(self, emp_id):
+        row = self.rows[emp_id]
+        return {shift_slot: _ROW_VALUES[char] for shift_slot, char in zip(self.slots, row) if char != '.'}
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def to_wire(self):
+        return {"slots": self.slots, "rows": self.rows}
+
+    def encode_matrix(self, emp_ids, shifts_to_fill):
+        """
+        Preference matrix rows (one bytearray per slot, one column per employee in emp_ids order).
+        The rows are joined into one buffer and translated in a single pass; each slot's column
+        is then a strided slice of it.
+        """
+        stride = len(self.slots)
+        empty_row = '.' * stride
+        buffer = ''.join(self.rows.get(emp_id, empty_row) for emp_id in emp_ids).encode('ascii').translate(_MATRIX_CODES)
+        position = {shift_slot: j for j, shift_slot in enumerate(self.slots)}
+        return [
+            bytearray(buffer[position[shift_slot]::stride]) if shift_slot in position and stride
+            else bytearray(bytes([_NO_PREFERENCE_CODE]) * len(emp_ids))
+            for shift_slot in shifts_to_fill
+        ]
+
+def decode_preferences(preferences_raw):
+    """Returns preferences from a request: CompactPreferences for the compact format, the nested dict otherwise."""
+    if isinstance(preferences_raw, dict) and isinstance(preferences_raw.get("slots"), list): # Nested values are never lists
+        return CompactPreferences(preferences_raw["slots"], preferences_raw.get("rows", {}))
+    if not isinstance(preferences_raw, dict):
+        raise ValueError("'preferences' must be an object")
+    return preferences_raw
+
+def read_preferences_csv(byte_lines, employee_ids_by_name, valid_slots):
+    """
+    Parses a preferences CSV ('Employee' column, then one column per shift slot, as in the
+    downloadable template) line by line into CompactPreferences, keeping only the compact rows.
+    Unknown slot columns, unknown employees, malformed rows and invalid values are skipped with
+    a warning, like the browser import. Raises ValueError if the header is missing or wrong.
+
+    Args:
+        byte_lines (iterable): The uploaded file as lines of bytes (UTF-8, with or without a BOM).
+        employee_ids_by_name (dict): {lower-case employee name: emp_id}.
+        valid_slots (iterable): Shift slots the schedule has.
+
+    Returns:
+        tuple: CompactPreferences, warnings (list of str, at most MAX_CSV_IMPORT_WARNINGS)
+    """
+    reader = csv.reader(codecs.iterdecode(byte_lines, 'utf-8-sig'))
+    header = [cell.strip() for cell in next(reader, [])]
+    if not header or header[0].lower() != "employee":
+        raise ValueError(f"CSV header mismatch. Expected first column to be 'Employee'. Got '{header[0] if header else ''}'.")
+
+    warnings = []
+    def warn(message):
+        if len(warnings) < MAX_CSV_IMPORT_WARNINGS:
+            warnings.append(message)
+
+    valid_slots = set(valid_slots)
+    columns = [] # (CSV column, position in the compact row)
+    slots = []
+    for column, shift_slot in enumerate(header[1:], start=1):
+        if shift_slot in valid_slots and shift_slot not in slots:
+            columns.append((column, len(slots)))
+            slots.append(shift_slot)
+        else:
+            warn(f"CSV header '{shift_slot}' is not a recognized shift slot and will be ignored.")
+
+    rows = {}
+    for line_number, cells in enumerate(reader, start=2):
+        cells = [cell.strip() for cell in cells]
+        if not cells or cells == [""]:
+            continue
+        if len(cells) != len(header):
+            warn(f"Row {line_number} in CSV has {len(cells)} cells, expected {len(header)}. Skipping row.")
+            continue
+        emp_id = employee_ids_by_name.get(cells[0].lower())
+        if emp_id is None:
+            warn(f"Employee '{cells[0]}' from CSV (row {line_number}) not found. Skipping their preferences.")
+            continue
+        row = ['.'] * len(slots)
+        for column, position in columns:
+            pref_val = cells[column]
+            if pref_val in ROW_CHARS:
+                row[position] = ROW_CHARS[pref_val]
+            else:
+                warn(f"Invalid value '{pref_val}' for {cells[0]} in {slots[position]}. Setting to empty.")
+        rows[emp_id] = ''.join(row) # A later row for the same employee replaces the earlier one
+    return CompactPreferences(slots, rows), warnings
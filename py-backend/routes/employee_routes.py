@@ -1,6 +1,8 @@
-from flask import Blueprint, request, jsonify
-from ..config import EMPLOYEES_COLLECTION
-from ..utils import get_all_docs, get_doc, add_doc, set_doc, update_doc, delete_doc # Use Firestore utils
+import re
+
+from flask import Blueprint, request, jsonify, make_response
+from config import EMPLOYEES_COLLECTION
+from utils import get_all_docs, get_collection_etag, add_employee_doc, rename_employee_doc, delete_employee_doc, DuplicateEmployeeNameError # Use Firestore utils
 
 # Using a relative import for utils and config assumes 'shavzak' is a package
 # or that the app is run from the 'shavzak' directory.
@@ -20,12 +22,33 @@ def _sort_employees(employees_list):
     """Sorts a list of employees by name, case-insensitively."""
     return sorted(employees_list, key=lambda emp: emp['name'].lower())
 
+_FIELD_NAME = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
 @employee_bp.route('/employees', methods=['GET'])
 def get_employees():
-    """Returns the list of all employees with their load data."""
-    # The employees.json file is kept sorted by add/update/delete operations.
-    all_employees = get_all_docs(EMPLOYEES_COLLECTION)
-    return jsonify(_sort_employees(all_employees)) # Sort after fetching
+    """
+    Returns the list of all employees with their load data, sorted by name.
+    ?fields=id,name returns only those fields. The response carries an ETag of the roster contents,
+    so polls with If-None-Match get an empty 304 until the roster changes.
+    """
+    fields = None
+    if request.args.get('fields'):
+        fields = list(dict.fromkeys(field.strip() for field in request.args['fields'].split(',') if field.strip()))
+        if not fields or not all(_FIELD_NAME.match(field) for field in fields):
+            return jsonify({"message": "fields must be a comma-separated list of field names"}), 400
+
+    etag = get_collection_etag(EMPLOYEES_COLLECTION, fields) # Read before the employees themselves
+    if request.if_none_match.contains_weak(etag):
+        response = make_response('', 304)
+    else:
+        sort_fields = fields if fields is None or 'name' in fields else fields + ['name'] # Sorting needs the name
+        all_employees = _sort_employees(get_all_docs(EMPLOYEES_COLLECTION, sort_fields))
+        if sort_fields is not fields:
+            for emp in all_employees:
+                emp.pop('name', None)
+        response = jsonify(all_employees)
+    response.set_etag(etag, weak=True)
+    return response
 
 @employee_bp.route('/employees', methods=['POST'])
 def add_employee():
@@ -33,16 +56,15 @@ def add_employee():
     if not data or 'name' not in data or not data['name'].strip():
         return jsonify({"message": "Employee name is required"}), 400
 
-    all_employees = get_all_docs(EMPLOYEES_COLLECTION) # For duplicate check
     new_name = data['name'].strip()
-    if any(emp['name'].lower() == new_name.lower() for emp in all_employees):
-        return jsonify({"message": f"Employee with name '{new_name}' already exists"}), 409
-
     new_employee_data = {
         "name": new_name,
         "total_shifts_assigned": 0, "total_day_shifts_assigned": 0, "total_night_shifts_assigned": 0
     }
-    new_id = add_doc(EMPLOYEES_COLLECTION, new_employee_data)
+    try:
+        new_id = add_employee_doc(new_employee_data) # Duplicate check is a keyed lookup in the same transaction
+    except DuplicateEmployeeNameError:
+        return jsonify({"message": f"Employee with name '{new_name}' already exists"}), 409
     new_employee_data['id'] = new_id # Add the Firestore generated ID to the response
     return jsonify(new_employee_data), 201
 
@@ -52,27 +74,20 @@ def update_employee(employee_id):
     if not data or 'name' not in data or not data['name'].strip():
         return jsonify({"message": "Employee name is required for update"}), 400
 
-    employee_to_update = get_doc(EMPLOYEES_COLLECTION, employee_id)
-
-    if not employee_to_update:
-        return jsonify({"message": "Employee not found"}), 404
-
     updated_name = data['name'].strip()
-    all_employees = get_all_docs(EMPLOYEES_COLLECTION) # Needed for duplicate check
-    if employee_to_update['name'].lower() != updated_name.lower() and \
-       any(emp['name'].lower() == updated_name.lower() and emp['id'] != employee_id for emp in all_employees):
+    try:
+        employee_to_update = rename_employee_doc(employee_id, updated_name)
+    except DuplicateEmployeeNameError:
         return jsonify({"message": f"Another employee with name '{updated_name}' already exists"}), 409
 
-    update_doc(EMPLOYEES_COLLECTION, employee_id, {"name": updated_name})
-    employee_to_update['name'] = updated_name # Update the object for the response
+    if not employee_to_update:
+        return jsonify({"message": "Employee not found"}), 404
     return jsonify(employee_to_update), 200
 
 @employee_bp.route('/employees/<string:employee_id>', methods=['DELETE'])
 def delete_employee(employee_id):
-    employee_to_delete = get_doc(EMPLOYEES_COLLECTION, employee_id) # Check if doc exists
+    employee_to_delete = delete_employee_doc(employee_id) # Also releases the employee's name
 
     if not employee_to_delete:
         return jsonify({"message": "Employee not found"}), 404
-
-    delete_doc(EMPLOYEES_COLLECTION, employee_id) # Use the Firestore delete function
     return jsonify({"message": "Employee deleted successfully"}), 200
\ No newline at end of file
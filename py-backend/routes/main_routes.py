@@ -1,6 +1,16 @@
 from flask import Blueprint, request, jsonify, render_template
-from ..config import EMPLOYEES_COLLECTION # Import necessary configs
-from ..utils import get_all_docs, get_on_call_config, save_on_call_config, update_doc # Import necessary utils
+import datetime
+import time
+
+from config import ( # Import necessary configs
+    EMPLOYEES_COLLECTION, SCHEDULE_HISTORY_COLLECTION, DEFAULT_HISTORY_PAGE_SIZE, MAX_HISTORY_PAGE_SIZE, MAX_ON_CALL_LOOKAHEAD,
+)
+from utils import ( # Import necessary utils
+    get_all_docs, get_on_call_config, sync_on_call_names, upcoming_on_call, advance_on_call_index, list_docs,
+    record_finalized_schedule,
+)
+from schedule_history import shift_counts, week_start
+from schedule_model import counter_field
 
 main_bp = Blueprint('main_api', __name__) # No url_prefix for the root route
 
@@ -11,9 +21,18 @@ def index():
 
 @main_bp.route('/api/on_call', methods=['GET'])
 def get_on_call_info():
-    """Returns the current on-call rotation information."""
-    on_call_data = get_on_call_config()
-    employees = get_all_docs(EMPLOYEES_COLLECTION)
+    """
+    Returns the current on-call rotation information from the rotation document, whose stored names
+    are checked against the cached roster. ?next=K also lists the next K on-call employees, starting with the current one.
+    """
+    try:
+        next_count = int(request.args.get('next', 0))
+    except ValueError:
+        return jsonify({"error": "'next' must be an integer"}), 400
+    if not 0 <= next_count <= MAX_ON_CALL_LOOKAHEAD:
+        return jsonify({"error": f"'next' must be between 0 and {MAX_ON_CALL_LOOKAHEAD}"}), 400
+
+    on_call_data = sync_on_call_names() or get_on_call_config() # Checked against the cached roster; writes only on a mismatch
     
     current_employee_name = "N/A"
     current_emp_id_on_call = None
@@ -22,16 +41,32 @@ def get_on_call_info():
         current_index = on_call_data.get("current_on_call_index", 0)
         if 0 <= current_index < len(on_call_data["rotation_order"]):
             current_emp_id_on_call = on_call_data["rotation_order"][current_index]
-            for emp in employees:
-                if emp["id"] == current_emp_id_on_call:
-                    current_employee_name = emp["name"]
-                    break
+            current_employee_name = (on_call_data.get("rotation_names") or {}).get(current_emp_id_on_call, "N/A")
     
-    return jsonify({
+    response_data = {
         "current_on_call_employee_name": current_employee_name,
         "current_on_call_employee_id": current_emp_id_on_call if current_emp_id_on_call else "N/A",
         "rotation_order_ids": on_call_data.get("rotation_order", [])
-    })
+    }
+    if next_count:
+        response_data["upcoming_on_call"] = upcoming_on_call(on_call_data, next_count)
+    return jsonify(response_data)
+
+def _shift_count_deltas(schedule_with_ids):
+    """Counts this schedule's shifts per employee: {emp_id: {total_* field: amount}}."""
+    deltas_by_id = {}
+    for shift_slot, emp_ids in schedule_with_ids.items():
+        if isinstance(emp_ids, str): # A single id per slot is accepted as well as a list
+            emp_ids = [emp_ids]
+        for emp_id in emp_ids or []:
+            if not emp_id:
+                continue
+            deltas = deltas_by_id.setdefault(emp_id, {"total_shifts_assigned": 0})
+            deltas["total_shifts_assigned"] += 1
+            total_field = counter_field(shift_slot) # From the slot's shift type, e.g. total_night_shifts_assigned
+            if total_field:
+                deltas[total_field] = deltas.get(total_field, 0) + 1
+    return deltas_by_id
 
 @main_bp.route('/api/finalize_schedule', methods=['POST'])
 def finalize_schedule_api():
@@ -45,28 +80,57 @@ def finalize_schedule_api():
     if not finalized_schedule_with_ids:
         return jsonify({"error": "No schedule data provided for finalization"}), 400
 
+    try: # The week the schedule covers; any date in it is accepted, default is the current week
+        requested_week = final_schedule_data.get("week_start")
+        current_week_start = week_start(datetime.date.fromisoformat(requested_week) if requested_week else None)
+    except (TypeError, ValueError):
+        return jsonify({"error": "'week_start' must be a date in YYYY-MM-DD format"}), 400
+
     employees_data = get_all_docs(EMPLOYEES_COLLECTION)
     if not employees_data:
         return jsonify({"error": "Cannot finalize, no employee data found."}), 500
-        
-    employees_dict = {emp['id']: emp.copy() for emp in employees_data}
 
-    for shift_slot, emp_id in finalized_schedule_with_ids.items():
-        if emp_id and emp_id in employees_dict:
-            employees_dict[emp_id]['total_shifts_assigned'] = employees_dict[emp_id].get('total_shifts_assigned', 0) + 1
-            if "Day" in shift_slot:
-                employees_dict[emp_id]['total_day_shifts_assigned'] = employees_dict[emp_id].get('total_day_shifts_assigned', 0) + 1
-            elif "Night" in shift_slot:
-                employees_dict[emp_id]['total_night_shifts_assigned'] = employees_dict[emp_id].get('total_night_shifts_assigned', 0) + 1
-    
-    for emp_id, emp_data in employees_dict.items():
-        data_to_save = {k: v for k, v in emp_data.items() if k != 'id'}
-        update_doc(EMPLOYEES_COLLECTION, emp_id, data_to_save)
+    known_ids = {emp['id'] for emp in employees_data}
+    deltas_by_id = {
+        emp_id: deltas for emp_id, deltas in _shift_count_deltas(finalized_schedule_with_ids).items()
+        if emp_id in known_ids
+    }
+    counts_by_id = shift_counts(finalized_schedule_with_ids)
+    history_record = {
+        "finalized_at": time.time(),
+        "week_start": current_week_start,
+        "schedule": {shift_slot: emp_ids for shift_slot, emp_ids in finalized_schedule_with_ids.items() if emp_ids},
+        "shift_counts": {emp_id: counts_by_id[emp_id] for emp_id in deltas_by_id},
+    }
+    # Only employees who got shifts are written, together with the history record. The rotation
+    # advances only once that succeeded, so a retried finalization doesn't advance it twice.
+    history_id, updated_ids = record_finalized_schedule(deltas_by_id, counts_by_id, current_week_start, history_record)
+    advance_on_call_index()
 
-    on_call_data = get_on_call_config()
-    if on_call_data.get("rotation_order") and len(on_call_data["rotation_order"]) > 0 : # Check list not empty
-        current_index = on_call_data.get("current_on_call_index", 0)
-        on_call_data["current_on_call_index"] = (current_index + 1) % len(on_call_data["rotation_order"])
-        save_on_call_config(on_call_data)
-    
-    return jsonify({"message": "Schedule finalized, employee data updated, and on-call advanced."})
\ No newline at end of file
+    return jsonify({
+        "message": "Schedule finalized, employee data updated, and on-call advanced.",
+        "employees_updated": len(updated_ids),
+        "history_id": history_id,
+        "week_start": current_week_start
+    })
+
+@main_bp.route('/api/schedule_history', methods=['GET'])
+def get_schedule_history():
+    """
+    Returns finalized schedules a page at a time, newest first (?order=asc for oldest first).
+    Pass the returned next_cursor as ?cursor= to get the following page.
+    """
+    try:
+        limit = int(request.args.get('limit', DEFAULT_HISTORY_PAGE_SIZE))
+    except ValueError:
+        return jsonify({"error": "'limit' must be an integer"}), 400
+    if not 1 <= limit <= MAX_HISTORY_PAGE_SIZE:
+        return jsonify({"error": f"'limit' must be between 1 and {MAX_HISTORY_PAGE_SIZE}"}), 400
+    order = request.args.get('order', 'desc')
+    if order not in ('asc', 'desc'):
+        return jsonify({"error": "'order' must be 'asc' or 'desc'"}), 400
+
+    # One extra document tells whether another page follows
+    records = list_docs(SCHEDULE_HISTORY_COLLECTION, limit + 1, request.args.get('cursor') or None, descending=order == 'desc')
+    next_cursor = records[limit - 1]['id'] if len(records) > limit else None
+    return jsonify({"records": records[:limit], "next_cursor": next_cursor})
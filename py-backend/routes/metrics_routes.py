@@ -0,0 +1,26 @@
+from flask import Blueprint, Response, jsonify
+from utils import get_cache_stats
+from metrics import render_metrics, get_profile
+from schedule_cache import schedule_results
+
+metrics_bp = Blueprint('metrics_api', __name__) # Prometheus scrapes /metrics at the root
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Returns latency histograms and cache counters in the Prometheus text format."""
+    cache_lines = []
+    for stat, value in sorted(get_cache_stats().items()):
+        name = f"shavzak_cache_{stat}_total"
+        cache_lines += [f"# TYPE {name} counter", f"{name} {value}"]
+    for stat, value in sorted(schedule_results.get_stats().items()):
+        name = f"shavzak_schedule_cache_{stat}" if stat == "entries" else f"shavzak_schedule_cache_{stat}_total"
+        cache_lines += [f"# TYPE {name} {'gauge' if stat == 'entries' else 'counter'}", f"{name} {value}"]
+    return Response(render_metrics(cache_lines), mimetype='text/plain; version=0.0.4')
+
+@metrics_bp.route('/metrics/profiles/<string:profile_id>', methods=['GET'])
+def get_request_profile(profile_id):
+    """Returns the collapsed stacks of a profiled request (see the X-Profile-Id response header)."""
+    collapsed_stacks = get_profile(profile_id)
+    if collapsed_stacks is None:
+        return jsonify({"message": "Profile not found"}), 404
+    return Response(collapsed_stacks, mimetype='text/plain')
@@ -1,58 +1,396 @@
-from flask import Blueprint, request, jsonify
-from ..config import EMPLOYEES_COLLECTION, DAYS_OF_WEEK, SHIFT_TYPES, MAX_SHIFTS_PER_WEEK # Use EMPLOYEES_COLLECTION
-from ..utils import get_all_docs # Use Firestore utility
-from schedule_generator import create_weekly_schedule
+import math
+import uuid
+
+from flask import Blueprint, Response, request, jsonify, json, stream_with_context
+from config import (
+    EMPLOYEES_COLLECTION, DAYS_OF_WEEK, SHIFT_TYPES, MAX_SHIFTS_PER_WEEK, SCHEDULE_MODES, DEFAULT_SOLVER_TIME_BUDGET_MS, MAX_SOLVER_TIME_BUDGET_MS,
+    DEFAULT_HORIZON_WEEKS, MAX_HORIZON_WEEKS, HORIZON_MODES,
+    DEFAULT_MULTISTART_VARIANTS, MAX_MULTISTART_VARIANTS, DEFAULT_MULTISTART_TOP_K, MAX_BATCH_TEAMS, HISTORY_WINDOW_WEEKS,
+)
+from utils import get_all_docs, get_collection_version # Use Firestore utility
+from preference_codec import ROW_CHARS, decode_preferences, read_preferences_csv
+from schedule_cache import make_key, schedule_results, horizon_sessions
+from schedule_batch import solve_schedule_offloaded, solve_schedules
+from schedule_history import week_start, with_windowed_loads
+from schedule_horizon import create_horizon_schedule
+from schedule_model import compile_schedule_model
 
 schedule_bp = Blueprint('schedule_api', __name__, url_prefix='/api')
 
+def _time_budget_error(time_budget_ms):
+    """Returns an error message unless time_budget_ms is a finite number of milliseconds within the limit, or None."""
+    if (isinstance(time_budget_ms, bool) or not isinstance(time_budget_ms, (int, float)) or not math.isfinite(time_budget_ms)
+            or not 0 < time_budget_ms <= MAX_SOLVER_TIME_BUDGET_MS): # NaN would never reach a deadline
+        return f"time_budget_ms must be a number greater than 0 and at most {MAX_SOLVER_TIME_BUDGET_MS}"
+    return None
+
+def _solver_options_error(mode, time_budget_ms, variants, top_k, seed):
+    """Returns an error message for invalid solver options, or None."""
+    if mode not in SCHEDULE_MODES:
+        return f"Unknown mode '{mode}'. Expected one of: {', '.join(SCHEDULE_MODES)}"
+    time_budget_error = _time_budget_error(time_budget_ms)
+    if time_budget_error:
+        return time_budget_error
+    if mode == 'multistart':
+        if isinstance(variants, bool) or not isinstance(variants, int) or not 1 <= variants <= MAX_MULTISTART_VARIANTS:
+            return f"variants must be an integer between 1 and {MAX_MULTISTART_VARIANTS}"
+        if isinstance(top_k, bool) or not isinstance(top_k, int) or top_k < 1:
+            return "top_k must be a positive integer"
+        if isinstance(seed, bool) or not isinstance(seed, int):
+            return "seed must be an integer"
+    return None
+
+def _solver_options(request_data):
+    """Reads mode, time_budget_ms, variants, top_k and seed; the last three only apply to 'multistart'."""
+    mode = request_data.get('mode', 'greedy')
+    options = {
+        "mode": mode,
+        "time_budget_ms": request_data.get('time_budget_ms', DEFAULT_SOLVER_TIME_BUDGET_MS),
+        "variants": request_data.get('variants', DEFAULT_MULTISTART_VARIANTS),
+        "top_k": request_data.get('top_k', DEFAULT_MULTISTART_TOP_K),
+        "seed": request_data.get('seed', 0),
+    }
+    if mode != 'multistart': # Keeps them out of the cache key for the other modes
+        options.update(variants=None, top_k=None, seed=None)
+    return options
+
+def _load_window_error(load_window_weeks):
+    """Returns an error message for an invalid load_window_weeks (None means lifetime loads), or None."""
+    if load_window_weeks is None:
+        return None
+    if isinstance(load_window_weeks, bool) or not isinstance(load_window_weeks, int) or not 1 <= load_window_weeks <= HISTORY_WINDOW_WEEKS:
+        return f"load_window_weeks must be an integer between 1 and {HISTORY_WINDOW_WEEKS}"
+    return None
+
+def _load_window_key(load_window_weeks):
+    """Cache key part for the load window; windowed loads change when a new week starts."""
+    return None if load_window_weeks is None else (load_window_weeks, week_start())
+
 @schedule_bp.route('/generate_schedule', methods=['POST'])
 def generate_schedule_api():
-    """Generates a shift schedule based on employee preferences and load."""
+    """
+    Generates a shift schedule based on employee preferences and load. With load_window_weeks,
+    load is what employees worked in the last that many finalized weeks instead of their lifetime totals.
+    Preferences may be nested ({emp_id: {shift_slot: value}}) or in the compact format (see preference_codec).
+    With "compact": true the response leaves out the views the client can rebuild (see _compact_response).
+    """
     try:
         request_data = request.json
-        employee_preferences_raw = request_data.get('preferences', {})
+        employee_preferences_raw = decode_preferences(request_data.get('preferences', {}))
+        options = _solver_options(request_data)
+        load_window_weeks = request_data.get('load_window_weeks')
+        compact = request_data.get('compact') is True
     except Exception as e:
         return jsonify({"error": f"Invalid JSON input: {str(e)}"}), 400
+    return _generate_schedule(employee_preferences_raw, options, load_window_weeks, compact)
+
+# Query parameters of the CSV endpoint, which takes the solver options from the URL
+_CSV_OPTION_TYPES = {'mode': str, 'time_budget_ms': float, 'variants': int, 'top_k': int, 'seed': int, 'load_window_weeks': int}
+
+@schedule_bp.route('/generate_schedule_csv', methods=['POST'])
+def generate_schedule_csv_api():
+    """
+    Generates a schedule from an uploaded preferences CSV (the downloadable template format), sent
+    as the request body or as the 'file' field of a form. The file is parsed line by line straight
+    into compact preferences, which are returned with the schedule and any import warnings.
+    Solver options (mode, time_budget_ms, ...) and compact=1 are query parameters.
+    """
+    request_data = {}
+    for name, value_type in _CSV_OPTION_TYPES.items():
+        if name in request.args:
+            try:
+                request_data[name] = value_type(request.args[name])
+            except ValueError:
+                return jsonify({"error": f"Invalid value for '{name}': {request.args[name]}"}), 400
+    options = _solver_options(request_data)
+
+    employees_data = get_all_docs(EMPLOYEES_COLLECTION)
+    if not employees_data:
+        return jsonify({"error": "No employee data found. Please add employees."}), 500
+    upload = request.files.get('file')
+    try:
+        employee_preferences_raw, warnings = read_preferences_csv(
+            upload.stream if upload is not None else request.stream,
+            {emp['name'].lower(): emp['id'] for emp in employees_data},
+            compile_schedule_model(DAYS_OF_WEEK, SHIFT_TYPES).slots,
+        )
+    except (UnicodeDecodeError, ValueError) as e:
+        return jsonify({"error": f"Invalid CSV input: {str(e)}"}), 400
+    return _generate_schedule(
+        employee_preferences_raw, options, request_data.get('load_window_weeks'), request.args.get('compact') == '1',
+        {"preferences": employee_preferences_raw.to_wire(), "warnings": warnings}
+    )
+
+def _compact_response(response_data):
+    """
+    The generate response without the data the client already has: the name views (the roster maps
+    IDs to names) and full copies of every employee, replaced by updated_counts with the new load
+    counters of the employees scheduled this week.
+    """
+    model = compile_schedule_model(DAYS_OF_WEEK, SHIFT_TYPES)
+    counter_fields = ['total_shifts_assigned', *dict.fromkeys(model.counter_fields)]
+    updated_by_id = {emp['id']: emp for emp in response_data["updated_employees"]}
+    compact = {key: value for key, value in response_data.items() if key not in ("proposed_schedule_with_names", "updated_employees")}
+    if "candidates" in compact:
+        compact["candidates"] = [
+            {key: value for key, value in candidate.items() if key != "proposed_schedule_with_names"}
+            for candidate in compact["candidates"]
+        ]
+    compact["updated_counts"] = {
+        emp_id: {field: updated_by_id[emp_id].get(field, 0) for field in counter_fields}
+        for emp_id, shift_count in response_data["employee_shifts_this_week"].items()
+        if shift_count > 0 and emp_id in updated_by_id # The greedy also lists unscheduled employees, with 0
+    }
+    return compact
+
+def _generate_schedule(employee_preferences_raw, options, load_window_weeks, compact=False, extra_response=None):
+    """Validates the options and generates (or serves from the cache) one weekly schedule for all employees."""
+    options_error = _solver_options_error(**options) or _load_window_error(load_window_weeks)
+    if options_error:
+        return jsonify({"error": options_error}), 400
+
+    # The result only depends on these inputs and the employees' load counters, so repeated
+    # clicks with the same grid are served from the cache until an employee write bumps the version
+    employees_version = get_collection_version(EMPLOYEES_COLLECTION) # Read before the employees themselves
+    cache_key = make_key(
+        employee_preferences_raw, options, DAYS_OF_WEEK, SHIFT_TYPES, MAX_SHIFTS_PER_WEEK, _load_window_key(load_window_weeks)
+    )
+    cached_response = schedule_results.get(cache_key, employees_version)
+    if cached_response is not None:
+        return jsonify({**(_compact_response(cached_response) if compact else cached_response), **(extra_response or {}), "cache_hit": True})
 
     employees_data = get_all_docs(EMPLOYEES_COLLECTION) # Fetch employees from Firestore
     if not employees_data:
         return jsonify({"error": "No employee data found. Please add employees."}), 500
 
     employees_dict = {emp['id']: emp.copy() for emp in employees_data}
+    model = compile_schedule_model(DAYS_OF_WEEK, SHIFT_TYPES)
 
-    (
-        proposed_schedule_with_ids,
-        proposed_schedule_with_names,
-        unfilled_shifts,
-        employee_shifts_this_week,
-    ) = create_weekly_schedule(
-        employee_preferences_raw,
-        employees_dict,
-        DAYS_OF_WEEK,
-        SHIFT_TYPES,
-        MAX_SHIFTS_PER_WEEK
+    solved = solve_schedule_offloaded( # CPU-bound; runs on the solver pool so this process keeps serving other requests
+        employee_preferences_raw=employee_preferences_raw,
+        employees_dict=with_windowed_loads(employees_dict, load_window_weeks, model) if load_window_weeks else employees_dict,
+        days_of_week=DAYS_OF_WEEK,
+        shift_types=SHIFT_TYPES,
+        max_shifts_per_week=MAX_SHIFTS_PER_WEEK,
+        **{name: value for name, value in options.items() if value is not None}
     )
+    proposed_schedule_with_ids = solved["proposed_schedule_with_ids"]
 
     # --- Update total employee shift counts based on the generated schedule for *this* week ---
     updated_employees_for_response = {emp_id: emp.copy() for emp_id, emp in employees_dict.items()}
 
     for shift_slot, employee_id_list in proposed_schedule_with_ids.items(): # employee_id_list is a list
+        total_field = model.counter_fields[model.slot_index[shift_slot]] # e.g. total_day_shifts_assigned
         for employee_id in employee_id_list: # Iterate through each ID in the list
             if employee_id and employee_id in updated_employees_for_response:
                 emp_to_update = updated_employees_for_response[employee_id]
                 emp_to_update['total_shifts_assigned'] = emp_to_update.get('total_shifts_assigned', 0) + 1
-                if "_Day" in shift_slot:
-                    emp_to_update['total_day_shifts_assigned'] = emp_to_update.get('total_day_shifts_assigned', 0) + 1
-                elif "_Night" in shift_slot:
-                    emp_to_update['total_night_shifts_assigned'] = emp_to_update.get('total_night_shifts_assigned', 0) + 1
+                emp_to_update[total_field] = emp_to_update.get(total_field, 0) + 1
     
     updated_employees_list = sorted(list(updated_employees_for_response.values()), key=lambda emp: emp['name'].lower())
 
-    return jsonify({
+    response_data = {
         "message": "Schedule generated successfully.",
+        **solved,
+        "updated_employees": updated_employees_list
+    }
+    schedule_results.put(cache_key, employees_version, response_data) # Cached in full, either view is derived from it
+    return jsonify({**(_compact_response(response_data) if compact else response_data), **(extra_response or {}), "cache_hit": False})
+
+def _week_config_error(days_of_week, shift_types, max_shifts_per_week):
+    """Returns an error message for an invalid per-team week configuration, or None."""
+    for name, values in (("days_of_week", days_of_week), ("shift_types", shift_types)):
+        if not isinstance(values, list) or not values or len(set(map(str, values))) != len(values):
+            return f"{name} must be a non-empty list of unique names"
+        if not all(isinstance(value, str) and value and '_' not in value for value in values):
+            return f"{name} entries must be non-empty strings without '_'"
+    if isinstance(max_shifts_per_week, bool) or not isinstance(max_shifts_per_week, int) or max_shifts_per_week < 1:
+        return "max_shifts_per_week must be a positive integer"
+    return None
+
+@schedule_bp.route('/generate_schedules', methods=['POST'])
+def generate_schedules_api():
+    """
+    Generates schedules for many teams in one call. Each team has its own preferences, optional
+    employee_ids subset, week configuration (days_of_week, shift_types, max_shifts_per_week,
+    shift_definitions, min_rest_hours), optional load_window_weeks and solver options. Employees are fetched once and the teams are solved concurrently; results are
+    streamed as newline-delimited JSON in completion order, one line per team.
+    """
+    try:
+        request_data = request.json
+        teams = request_data.get('teams')
+        if not isinstance(teams, list) or not teams:
+            raise ValueError("'teams' must be a non-empty list")
+        team_requests = []
+        for team in teams:
+            team_requests.append({
+                "team_id": team.get('team_id'),
+                "preferences": decode_preferences(team.get('preferences', {})),
+                "employee_ids": team.get('employee_ids'),
+                "days_of_week": team.get('days_of_week', DAYS_OF_WEEK),
+                "shift_types": team.get('shift_types', SHIFT_TYPES),
+                "max_shifts_per_week": team.get('max_shifts_per_week', MAX_SHIFTS_PER_WEEK),
+                "shift_definitions": team.get('shift_definitions'), # None uses the configured ones
+                "min_rest_hours": team.get('min_rest_hours'),
+                "load_window_weeks": team.get('load_window_weeks'), # None balances lifetime loads
+                "options": _solver_options(team),
+            })
+    except Exception as e:
+        return jsonify({"error": f"Invalid JSON input: {str(e)}"}), 400
+
+    if len(team_requests) > MAX_BATCH_TEAMS:
+        return jsonify({"error": f"At most {MAX_BATCH_TEAMS} teams can be generated in one call"}), 400
+
+    employees_version = get_collection_version(EMPLOYEES_COLLECTION) # Read before the employees themselves
+    employees_data = get_all_docs(EMPLOYEES_COLLECTION) # One scan shared by every team
+    if not employees_data:
+        return jsonify({"error": "No employee data found. Please add employees."}), 500
+    all_employees = {emp['id']: emp for emp in employees_data}
+
+    problems, problem_teams, cached_lines = [], [], []
+    for index, team in enumerate(team_requests):
+        error = (
+            _solver_options_error(**team["options"])
+            or _week_config_error(team["days_of_week"], team["shift_types"], team["max_shifts_per_week"])
+            or _load_window_error(team["load_window_weeks"])
+        )
+        if not error:
+            try:
+                model = compile_schedule_model(team["days_of_week"], team["shift_types"], team["shift_definitions"], team["min_rest_hours"])
+            except (TypeError, ValueError) as e:
+                error = str(e)
+        employee_ids = team["employee_ids"]
+        if not error and employee_ids is not None:
+            if not isinstance(employee_ids, list) or not employee_ids or not all(isinstance(emp_id, str) for emp_id in employee_ids):
+                error = "employee_ids must be a non-empty list of employee IDs"
+            elif any(emp_id not in all_employees for emp_id in employee_ids):
+                error = "employee_ids contains unknown employees"
+        if error:
+            return jsonify({"error": f"Team {index} ({team['team_id']}): {error}"}), 400
+
+        employees_dict = {
+            emp_id: all_employees[emp_id].copy() for emp_id in (employee_ids if employee_ids is not None else all_employees)
+        }
+        cache_key = make_key(
+            team["preferences"], team["options"], sorted(employees_dict), team["days_of_week"], team["shift_types"],
+            team["max_shifts_per_week"], team["shift_definitions"], team["min_rest_hours"], _load_window_key(team["load_window_weeks"])
+        )
+        cached_result = schedule_results.get(cache_key, employees_version)
+        if cached_result is not None:
+            cached_lines.append({"index": index, "team_id": team["team_id"], **cached_result, "cache_hit": True})
+            continue
+        if team["load_window_weeks"]:
+            employees_dict = with_windowed_loads(employees_dict, team["load_window_weeks"], model)
+        problems.append({
+            "employee_preferences_raw": team["preferences"],
+            "employees_dict": employees_dict,
+            "days_of_week": team["days_of_week"],
+            "shift_types": team["shift_types"],
+            "max_shifts_per_week": team["max_shifts_per_week"],
+            "shift_definitions": team["shift_definitions"],
+            "min_rest_hours": team["min_rest_hours"],
+            **{name: value for name, value in team["options"].items() if value is not None},
+        })
+        problem_teams.append((index, team["team_id"], cache_key))
+
+    def generate():
+        for line in cached_lines: # Cached teams go out first
+            yield json.dumps(line) + '\n'
+        for problem_index, result, error in solve_schedules(problems):
+            index, team_id, cache_key = problem_teams[problem_index]
+            if error is not None:
+                yield json.dumps({"index": index, "team_id": team_id, "error": f"Schedule generation failed: {error}"}) + '\n'
+                continue
+            schedule_results.put(cache_key, employees_version, result)
+            yield json.dumps({"index": index, "team_id": team_id, **result, "cache_hit": False}) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+def _horizon_response(horizon_id, horizon):
+    """Serializes a horizon; the caller must hold horizon.lock once the horizon is shared."""
+    (
+        proposed_schedule_with_ids,
+        proposed_schedule_with_names,
+        unfilled_shifts,
+        employee_shifts_per_week,
+        objective,
+    ) = horizon.result()
+    return {
+        "horizon_id": horizon_id,
+        "weeks": horizon.week_count,
+        "objective": objective,
         "proposed_schedule_with_ids": proposed_schedule_with_ids,
         "proposed_schedule_with_names": proposed_schedule_with_names,
         "unfilled_shifts": unfilled_shifts,
-        "employee_shifts_this_week": employee_shifts_this_week,
-        "updated_employees": updated_employees_list
-    })
\ No newline at end of file
+        "employee_shifts_per_week": employee_shifts_per_week,
+    }
+
+@schedule_bp.route('/generate_horizon', methods=['POST'])
+def generate_horizon_api():
+    """
+    Plans several weeks at once (slots are named like 'W2-Monday_Day'). The horizon is kept in memory
+    so preference edits can be re-solved incrementally via /api/horizon/<horizon_id>/preferences.
+    """
+    try:
+        request_data = request.json
+        employee_preferences_raw = decode_preferences(request_data.get('preferences', {}))
+        weeks = request_data.get('weeks', DEFAULT_HORIZON_WEEKS)
+        mode = request_data.get('mode', 'greedy')
+        time_budget_ms = request_data.get('time_budget_ms', DEFAULT_SOLVER_TIME_BUDGET_MS)
+    except Exception as e:
+        return jsonify({"error": f"Invalid JSON input: {str(e)}"}), 400
+
+    if isinstance(weeks, bool) or not isinstance(weeks, int) or not 1 <= weeks <= MAX_HORIZON_WEEKS:
+        return jsonify({"error": f"weeks must be an integer between 1 and {MAX_HORIZON_WEEKS}"}), 400
+    if mode not in HORIZON_MODES:
+        return jsonify({"error": f"Unknown mode '{mode}'. Expected one of: {', '.join(HORIZON_MODES)}"}), 400
+    time_budget_error = _time_budget_error(time_budget_ms)
+    if time_budget_error:
+        return jsonify({"error": time_budget_error}), 400
+
+    employees_version = get_collection_version(EMPLOYEES_COLLECTION) # Read before the employees themselves
+    employees_data = get_all_docs(EMPLOYEES_COLLECTION)
+    if not employees_data:
+        return jsonify({"error": "No employee data found. Please add employees."}), 500
+
+    employees_dict = {emp['id']: emp.copy() for emp in employees_data}
+    horizon = create_horizon_schedule(
+        employee_preferences_raw,
+        employees_dict,
+        weeks,
+        DAYS_OF_WEEK,
+        SHIFT_TYPES,
+        MAX_SHIFTS_PER_WEEK,
+        time_budget_ms if mode == 'optimal' else None
+    )
+
+    horizon_id = uuid.uuid4().hex
+    response_data = _horizon_response(horizon_id, horizon)
+    horizon_sessions.put(horizon_id, employees_version, horizon)
+    return jsonify({"message": "Horizon generated successfully.", "mode": mode, **response_data})
+
+@schedule_bp.route('/horizon/<string:horizon_id>/preferences', methods=['PUT'])
+def update_horizon_preferences_api(horizon_id):
+    """Applies one employee's preference edits to a generated horizon, re-solving only the affected slots."""
+    try:
+        request_data = request.json
+        employee_id = request_data.get('employee_id')
+        changed_preferences = request_data.get('preferences', {})
+    except Exception as e:
+        return jsonify({"error": f"Invalid JSON input: {str(e)}"}), 400
+
+    if not isinstance(employee_id, str):
+        return jsonify({"error": "employee_id must be an employee ID string"}), 400
+    if not isinstance(changed_preferences, dict) or not all(isinstance(pref_val, str) and pref_val in ROW_CHARS for pref_val in changed_preferences.values()):
+        return jsonify({"error": "preferences must be an object of {shift_slot: \"1\", \"0\" or \"\"}"}), 400
+
+    horizon = horizon_sessions.get(horizon_id, get_collection_version(EMPLOYEES_COLLECTION))
+    if horizon is None:
+        return jsonify({"error": "Horizon not found or employee data changed since it was generated. Please generate it again."}), 404
+    if employee_id not in horizon.index_of:
+        return jsonify({"error": f"Employee '{employee_id}' is not part of this horizon."}), 400
+
+    with horizon.lock:
+        resolved_slots = horizon.update_preferences(employee_id, changed_preferences)
+        response_data = _horizon_response(horizon_id, horizon)
+    return jsonify({"message": "Horizon updated successfully.", "resolved_slots": resolved_slots, **response_data})
@@ -0,0 +1,115 @@
+import concurrent.futures
+
+from config import DEFAULT_SOLVER_TIME_BUDGET_MS, DEFAULT_MULTISTART_VARIANTS, DEFAULT_MULTISTART_TOP_K, MULTISTART_WORKERS
+from metrics import call_with_solver_phases, record_solver_phases
+from schedule_generator import create_weekly_schedule
+from schedule_model import compile_schedule_model
+from schedule_multistart import create_multistart_schedules, get_solver_pool, reset_solver_pool
+from schedule_optimizer import create_optimal_schedule, schedule_objective
+
+def solve_schedule(employee_preferences_raw, employees_dict, days_of_week, shift_types, max_shifts_per_week, mode='greedy',
+                   time_budget_ms=DEFAULT_SOLVER_TIME_BUDGET_MS, variants=DEFAULT_MULTISTART_VARIANTS,
+                   top_k=DEFAULT_MULTISTART_TOP_K, seed=0, workers=MULTISTART_WORKERS, shift_definitions=None, min_rest_hours=None):
+    """
+    Solves one weekly problem with the given mode ('greedy', 'optimal' or 'multistart').
+    shift_definitions and min_rest_hours override the configured constraint model.
+
+    Returns:
+        dict: mode, objective, proposed_schedule_with_ids, proposed_schedule_with_names, unfilled_shifts,
+              employee_shifts_this_week, plus candidates and variants_evaluated for 'multistart'
+    """
+    model = compile_schedule_model(days_of_week, shift_types, shift_definitions, min_rest_hours)
+    result = {"mode": mode}
+    if mode == 'multistart':
+        candidates, variants_evaluated = create_multistart_schedules(
+            employee_preferences_raw, employees_dict, days_of_week, shift_types, max_shifts_per_week,
+            variants, top_k, time_budget_ms, seed, workers, model
+        )
+        best = candidates[0] # Variant 0 (the greedy schedule) is always a candidate
+        result.update(
+            objective=best["score"],
+            proposed_schedule_with_ids=best["proposed_schedule_with_ids"],
+            proposed_schedule_with_names=best["proposed_schedule_with_names"],
+            unfilled_shifts=best["unfilled_shifts"],
+            employee_shifts_this_week=best["employee_shifts_this_week"],
+            candidates=candidates,
+            variants_evaluated=variants_evaluated,
+        )
+    elif mode == 'optimal':
+        (
+            result["proposed_schedule_with_ids"],
+            result["proposed_schedule_with_names"],
+            result["unfilled_shifts"],
+            result["employee_shifts_this_week"],
+            result["objective"],
+        ) = create_optimal_schedule(
+            employee_preferences_raw, employees_dict, days_of_week, shift_types, max_shifts_per_week, time_budget_ms, model
+        )
+    else:
+        (
+            result["proposed_schedule_with_ids"],
+            result["proposed_schedule_with_names"],
+            result["unfilled_shifts"],
+            result["employee_shifts_this_week"],
+        ) = create_weekly_schedule(
+            employee_preferences_raw, employees_dict, days_of_week, shift_types, max_shifts_per_week, model
+        )
+        result["objective"] = schedule_objective(
+            result["proposed_schedule_with_ids"], employee_preferences_raw, employees_dict,
+            days_of_week, shift_types, max_shifts_per_week, model
+        )
+    return result
+
+def solve_schedule_offloaded(workers=MULTISTART_WORKERS, **problem):
+    """
+    solve_schedule on the shared solver process pool, so a web server thread only waits for it and
+    other requests keep being served while it computes. 'greedy' takes a few milliseconds and stays
+    on the calling thread (shipping the problem to a worker costs more), and so does 'multistart',
+    which then just waits for its variants on the same pool; with one worker everything runs here.
+    """
+    if workers <= 1 or problem.get("mode", 'greedy') in ('greedy', 'multistart'):
+        return solve_schedule(**problem, workers=workers)
+    pool = get_solver_pool(workers)
+    try:
+        result, phases = pool.submit(call_with_solver_phases, solve_schedule, **problem, workers=1).result()
+    except concurrent.futures.process.BrokenProcessPool:
+        reset_solver_pool(pool)
+        raise
+    record_solver_phases(phases)
+    return result
+
+def solve_schedules(problems, workers=MULTISTART_WORKERS):
+    """
+    Solves independent problems concurrently, yielding (index, result, error) as each one finishes.
+
+    problems is a list of solve_schedule keyword arguments. With more than one worker they run on
+    the shared solver process pool (a 'multistart' problem then searches within its own worker);
+    otherwise they run one after the other in this process.
+    """
+    if workers <= 1 or len(problems) < 2:
+        for index, problem in enumerate(problems):
+            try:
+                yield index, solve_schedule(**problem), None
+            except Exception as e:
+                yield index, None, e
+        return
+
+    pool = get_solver_pool(workers)
+    futures = {
+        pool.submit(call_with_solver_phases, solve_schedule, **{**problem, "workers": 1}): index
+        for index, problem in enumerate(problems)
+    }
+    try:
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                result, phases = future.result()
+                record_solver_phases(phases)
+                yield futures[future], result, None
+            except concurrent.futures.process.BrokenProcessPool:
+                reset_solver_pool(pool)
+                raise
+            except Exception as e:
+                yield futures[future], None, e
+    finally:
+        for future in futures: # The consumer stopped early (e.g. the client disconnected)
+            future.cancel()
@@ -0,0 +1,66 @@
+import collections
+import hashlib
+import json
+import threading
+
+from config import SCHEDULE_CACHE_SIZE, HORIZON_SESSION_LIMIT
+
+def _wire_value(value):
+    if hasattr(value, 'to_wire'): # e.g. CompactPreferences
+        return value.to_wire()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def make_key(*inputs):
+    """Canonical hash of JSON-compatible inputs (dict key order doesn't matter)."""
+    canonical = json.dumps(inputs, sort_keys=True, separators=(',', ':'), default=_wire_value)
+    return hashlib.blake2b(canonical.encode('utf-8'), digest_size=16).hexdigest()
+
+class ScheduleResultCache:
+    """
+    Bounded LRU of generated schedules for one version of the employee data.
+    Entries are only valid for the version they were computed from; as soon as a lookup or
+    store sees a newer version, everything cached for the old one is dropped.
+    """
+
+    def __init__(self, max_entries=SCHEDULE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict() # {key: result}, most recently used last
+        self._version = None
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def _sync_version(self, version):
+        if version != self._version:
+            if self._entries:
+                self.stats["invalidations"] += 1
+            self._entries.clear()
+            self._version = version
+
+    def get(self, key, version):
+        with self._lock:
+            self._sync_version(version)
+            result = self._entries.get(key)
+            if result is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return result
+
+    def put(self, key, version, result):
+        with self._lock:
+            if self._version is not None and version < self._version:
+                return # Computed from data that has changed since
+            self._sync_version(version)
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def get_stats(self):
+        with self._lock:
+            return {**self.stats, "entries": len(self._entries)}
+
+schedule_results = ScheduleResultCache() # Shared by the schedule routes
+horizon_sessions = ScheduleResultCache(HORIZON_SESSION_LIMIT) # {horizon_id: HorizonSchedule} for incremental re-solves
@@ -1,115 +1,139 @@
-from collections import defaultdict
+import heapq
 
-def _is_not_consecutive(employee_id, target_shift_slot, proposed_schedule_with_ids, days_of_week_ordered):
-    """
-    Checks if assigning employee_id to target_shift_slot would result in a consecutive shift.
-    - Day shift cannot follow the previous day's Night shift.
-    - Night shift cannot follow the same day's Day shift.
-    """
-    target_day, target_type = target_shift_slot.split('_')
-
-    if target_type == "Day":
-        try:
-            current_day_index = days_of_week_ordered.index(target_day)
-            if current_day_index > 0:  # If it's not the first day of the week
-                previous_day = days_of_week_ordered[current_day_index - 1]
-                previous_night_shift = f"{previous_day}_Night"
-                if employee_id in proposed_schedule_with_ids.get(previous_night_shift, []):
-                    return False  # Cannot work Day after previous Night
-        except ValueError: # Should not happen if days_of_week_ordered is correct and target_day is valid
-            pass # If day not found, assume it's okay for now or handle error
-    elif target_type == "Night":
-        same_day_day_shift = f"{target_day}_Day"
-        if employee_id in proposed_schedule_with_ids.get(same_day_day_shift, []):
-            return False  # Cannot work Night after same day Day
-    return True # It's not a consecutive shift violation
+from metrics import solver_phase
+from preference_codec import CompactPreferences
+from schedule_model import compile_schedule_model
+
+_BLOCKED = 255 # Preference code for "0" (cannot work) in the encoded preference matrix
 
 def get_preference_score(pref_val):
     if pref_val == "1": return 0  # Most preferred
     if pref_val == "": return 1   # Available (less preferred than "1")
     return float('inf') # Effectively excludes "0" or other invalid values if not filtered earlier
 
-def create_weekly_schedule(employee_preferences_raw, employees_dict, days_of_week, shift_types, max_shifts_per_week):
+def _encode_preference(pref_val):
+    """Maps a raw preference value to a small integer code that sorts like get_preference_score."""
+    if pref_val == "0":
+        return _BLOCKED
+    score = get_preference_score(pref_val)
+    return 2 if score == float('inf') else score
+
+def _encode_preference_matrix(employee_preferences_raw, employees_dict, shifts_to_fill):
+    """Encodes preferences into one bytearray row per slot, with one column per known employee."""
+    if isinstance(employee_preferences_raw, CompactPreferences): # Compact rows translate without per-slot dict lookups
+        return employee_preferences_raw.encode_matrix(list(employees_dict), shifts_to_fill)
+    slot_index = {shift_slot: i for i, shift_slot in enumerate(shifts_to_fill)}
+    pref_matrix = [bytearray(b'\x01' * len(employees_dict)) for _ in shifts_to_fill] # Default "" -> available
+    for col, emp_id in enumerate(employees_dict):
+        for shift_slot, pref_val in employee_preferences_raw.get(emp_id, {}).items():
+            if shift_slot in slot_index:
+                pref_matrix[slot_index[shift_slot]][col] = _encode_preference(pref_val)
+    return pref_matrix
+
+def _dense_ranks(values):
+    """Returns the dense rank of every value (equal values share a rank)."""
+    rank_of = {value: rank for rank, value in enumerate(sorted(set(values)))}
+    return [rank_of[value] for value in values]
+
+def _summarize_schedule(proposed_schedule_with_ids, employees_dict, model):
+    """Returns the unfilled shift slots and the schedule with employee names for easier display."""
+    unfilled_shifts = [
+        shift for shift, emp_ids_list in proposed_schedule_with_ids.items()
+        if len(emp_ids_list) < model.seat_counts[model.slot_index[shift]]
+    ]
+
+    proposed_schedule_with_names = {}
+    for shift, emp_ids_list in proposed_schedule_with_ids.items():
+        if not emp_ids_list:
+            proposed_schedule_with_names[shift] = "UNFILLED"
+        else:
+            names = [employees_dict[emp_id]['name'] for emp_id in emp_ids_list if emp_id in employees_dict]
+            proposed_schedule_with_names[shift] = ", ".join(names) if names else "UNFILLED"
+    return unfilled_shifts, proposed_schedule_with_names
+
+def create_weekly_schedule(employee_preferences_raw, employees_dict, days_of_week, shift_types, max_shifts_per_week, model=None):
     """
     Generates a weekly shift schedule.
 
+    Preferences are encoded once into a slot x employee matrix and the rest rules come from the
+    compiled model's conflict bitmasks, so each candidate check is a couple of integer operations.
+    The greedy order and tie-breaking are the same as sorting candidates by
+    (shifts this week, total shifts, preference, total shifts of the slot's type, id).
+
     Args:
         employee_preferences_raw (dict): Raw preferences from the request {emp_id: {shift_slot: "0"/"1"/""}}.
         employees_dict (dict): Dictionary of employee details {emp_id: employee_object}.
         days_of_week (list): List of day names.
         shift_types (list): List of shift types (e.g., ['Day', 'Night']).
         max_shifts_per_week (int): Maximum number of shifts an employee can be assigned in a week.
+        model (ScheduleModel): Compiled constraints; defaults to the configured shift definitions.
 
     Returns:
         tuple: proposed_schedule_with_ids, proposed_schedule_with_names,
                unfilled_shifts, employee_shifts_this_week
     """
-    shifts_to_fill = [f"{day}_{stype}" for day in days_of_week for stype in shift_types]
+    model = model or compile_schedule_model(days_of_week, shift_types)
+    shifts_to_fill = model.slots
     proposed_schedule_with_ids = {shift: [] for shift in shifts_to_fill} # {shift_slot: [emp_id1, emp_id2]}
-    employee_shifts_this_week = defaultdict(int) # {emp_id: count_this_week}
-    # Convert preferences to a more usable format: {shift_slot: {emp_id: preference_value}}
-    shift_specific_preferences = defaultdict(dict)
-    for emp_id, prefs in employee_preferences_raw.items():
-        for shift_slot, pref_val in prefs.items():
-            if emp_id in employees_dict: # Only consider known employees
-                 shift_specific_preferences[shift_slot][emp_id] = pref_val
-    # Assign shifts, trying to fill up to 2 spots per shift
-    for shift_slot in shifts_to_fill:
-        # Try to fill up to 2 spots for this shift
-        while len(proposed_schedule_with_ids[shift_slot]) < 2:
-            eligible_candidates = []
-            for emp_id, emp_details in employees_dict.items():
-                # Rule 1: Employee not already assigned to this specific shift slot
-                if emp_id in proposed_schedule_with_ids[shift_slot]:
-                    continue
-
-                emp_pref_for_shift = shift_specific_preferences.get(shift_slot, {}).get(emp_id, "") # Default to ""
-                
-                # Rule 2: Cannot work (preference "0")
-                if emp_pref_for_shift == "0":
-                    continue
-
-                # Rule 3: Max shifts per week
-                if employee_shifts_this_week[emp_id] >= max_shifts_per_week:
-                    continue
-                
-                # Rule 4: Not consecutive
-                if not _is_not_consecutive(emp_id, shift_slot, proposed_schedule_with_ids, days_of_week):
-                    continue
-                
-                # If all rules pass, add to candidates
-                eligible_candidates.append(emp_details)
-            
-            if not eligible_candidates:
-                break # No more eligible candidates for this slot in this iteration (or for the second spot)
-
-            eligible_candidates.sort(key=lambda emp: (
-                    employee_shifts_this_week.get(emp['id'], 0), # Prioritize by shifts this week
-                    emp.get('total_shifts_assigned', 0),
-                    get_preference_score(shift_specific_preferences.get(shift_slot, {}).get(emp['id'], "")), # Then by preference
-                    emp.get('total_day_shifts_assigned', 0) if "Day" in shift_slot else emp.get('total_night_shifts_assigned', 0),
-                    emp['id'] 
-                ))
-            
-            chosen_emp = eligible_candidates[0]
-            proposed_schedule_with_ids[shift_slot].append(chosen_emp['id'])
-            employee_shifts_this_week[chosen_emp['id']] += 1
-            # The while loop will continue to try and fill the second spot if len < 2
-    
-    unfilled_shifts = [shift for shift, emp_ids_list in proposed_schedule_with_ids.items() if len(emp_ids_list) < 2]
-    
-    # Prepare schedule with employee names for easier display
-    proposed_schedule_with_names = {}
-    for shift, emp_ids_list in proposed_schedule_with_ids.items():
-        if not emp_ids_list:
-            proposed_schedule_with_names[shift] = "UNFILLED"
-        else:
-            names = [employees_dict[emp_id]['name'] for emp_id in emp_ids_list if emp_id in employees_dict]
-            proposed_schedule_with_names[shift] = ", ".join(names) if names else "UNFILLED"
+
+    employees = list(employees_dict.values())
+    emp_ids = [emp['id'] for emp in employees]
+    n = len(employees)
+
+    with solver_phase("greedy", "encode"):
+        pref_matrix = _encode_preference_matrix(employee_preferences_raw, employees_dict, shifts_to_fill)
+        block_masks = model.conflict_masks
+
+        # Static part of the sort key, packed into one integer per employee and counter field:
+        # key = shifts_this_week * k_week + rank(total_shifts) * k_total + preference * n + rank(type_total, id)
+        total_ranks = _dense_ranks([emp.get('total_shifts_assigned', 0) for emp in employees])
+        k_total = 3 * n
+        k_week = (max(total_ranks, default=0) + 1) * k_total
+        base_keys, tail_orders = {}, {}
+        for total_field in dict.fromkeys(model.counter_fields):
+            tail_order = sorted(range(n), key=lambda i: (employees[i].get(total_field, 0), emp_ids[i], i))
+            base = [0] * n
+            for tail_rank, i in enumerate(tail_order):
+                base[i] = total_ranks[i] * k_total + tail_rank
+            base_keys[total_field], tail_orders[total_field] = base, tail_order
+
+    with solver_phase("greedy", "assign"):
+        shifts_this_week = [0] * n
+        assigned_masks = [0] * n # Bitmask of slots each employee holds this week
+        for slot, shift_slot in enumerate(shifts_to_fill):
+            total_field = model.counter_fields[slot]
+            base, tail_order = base_keys[total_field], tail_orders[total_field]
+            block = block_masks[slot]
+            candidate_keys = [
+                shifts_this_week[i] * k_week + base[i] + pref * n
+                for i, pref in enumerate(pref_matrix[slot])
+                if pref != _BLOCKED and shifts_this_week[i] < max_shifts_per_week and not assigned_masks[i] & block
+            ]
+            # Filling a seat only changes the chosen employee, who is then excluded from this slot,
+            # so the remaining seats go to the next-best keys of the same candidate set.
+            for key in heapq.nsmallest(model.seat_counts[slot], candidate_keys):
+                i = tail_order[key % n]
+                proposed_schedule_with_ids[shift_slot].append(emp_ids[i])
+                shifts_this_week[i] += 1
+                assigned_masks[i] |= 1 << slot
+
+    with solver_phase("greedy", "summarize"):
+        # Every employee checked against the weekly limit is reported, in the order they were first checked
+        employee_shifts_this_week = {}
+        unchecked = range(n)
+        for row in pref_matrix:
+            if not unchecked:
+                break
+            for i in unchecked:
+                if row[i] != _BLOCKED:
+                    employee_shifts_this_week[emp_ids[i]] = shifts_this_week[i]
+            unchecked = [i for i in unchecked if row[i] == _BLOCKED]
+
+        unfilled_shifts, proposed_schedule_with_names = _summarize_schedule(proposed_schedule_with_ids, employees_dict, model)
 
     return (
         proposed_schedule_with_ids,
         proposed_schedule_with_names,
         unfilled_shifts,
-        dict(employee_shifts_this_week) # Convert defaultdict to dict
-    )
\ No newline at end of file
+        employee_shifts_this_week
+    )
@@ -0,0 +1,78 @@
+import datetime
+
+from config import WEEKEND_DAYS, HISTORY_WEEK_START_DAY, HISTORY_WINDOW_WEEKS
+
+# Each employee keeps 'recent_weeks': one bucket per finalized week, oldest first and at most
+# HISTORY_WINDOW_WEEKS long, e.g. {"week_start": "2026-10-18", "shifts": 3, "day": 2, "night": 1, "weekend": 1}.
+# Buckets are rolled forward whenever a schedule is finalized, so windowed loads are a sum over
+# a handful of buckets on the employee document instead of a scan of the history collection.
+
+def week_start(day=None):
+    """ISO date of the first day of the week containing day (default: today)."""
+    day = day or datetime.date.today()
+    return (day - datetime.timedelta(days=(day.weekday() - HISTORY_WEEK_START_DAY) % 7)).isoformat()
+
+def _oldest_week_in_window(current_week_start, window_weeks):
+    return (datetime.date.fromisoformat(current_week_start) - datetime.timedelta(weeks=window_weeks - 1)).isoformat()
+
+def shift_counts(schedule_with_ids):
+    """
+    Counts shifts per employee in a {shift_slot: [emp_id, ...]} schedule:
+    {emp_id: {"shifts": n, "<shift type>": n, "weekend": n}}, e.g. "day"/"night" for the default types.
+    """
+    counts_by_id = {}
+    for shift_slot, emp_ids in schedule_with_ids.items():
+        if isinstance(emp_ids, str): # A single id per slot is accepted as well as a list
+            emp_ids = [emp_ids]
+        day, _, shift_type = shift_slot.rpartition('_')
+        is_weekend = day.rpartition('-')[2] in WEEKEND_DAYS # Horizon days look like 'W2-Friday'
+        for emp_id in emp_ids or []:
+            if not emp_id:
+                continue
+            counts = counts_by_id.setdefault(emp_id, {"shifts": 0})
+            counts["shifts"] += 1
+            counts[shift_type.lower()] = counts.get(shift_type.lower(), 0) + 1
+            if is_weekend:
+                counts["weekend"] = counts.get("weekend", 0) + 1
+    return counts_by_id
+
+def roll_recent_weeks(recent_weeks, current_week_start, counts, window_weeks=HISTORY_WINDOW_WEEKS):
+    """Adds counts to the bucket of current_week_start and drops buckets that fell out of the window."""
+    oldest = _oldest_week_in_window(current_week_start, window_weeks)
+    buckets = [dict(bucket) for bucket in recent_weeks or [] if bucket.get("week_start", "") >= oldest]
+    bucket = next((bucket for bucket in buckets if bucket["week_start"] == current_week_start), None)
+    if bucket is None:
+        bucket = {"week_start": current_week_start}
+        buckets.append(bucket)
+        buckets.sort(key=lambda b: b["week_start"])
+    for key, amount in counts.items():
+        bucket[key] = bucket.get(key, 0) + amount
+    return buckets
+
+def windowed_loads(employee, window_weeks, current_week_start=None):
+    """Sums an employee's buckets over the last window_weeks weeks up to current_week_start: {"shifts": n, ...}."""
+    current_week_start = current_week_start or week_start()
+    oldest = _oldest_week_in_window(current_week_start, window_weeks)
+    totals = {"shifts": 0}
+    for bucket in employee.get('recent_weeks') or []:
+        if oldest <= bucket.get("week_start", "") <= current_week_start:
+            for key, amount in bucket.items():
+                if key != "week_start":
+                    totals[key] = totals.get(key, 0) + amount
+    return totals
+
+def with_windowed_loads(employees_dict, window_weeks, model, current_week_start=None):
+    """
+    Copies of the employees whose load counters (total_shifts_assigned and the model's per-type
+    counters) hold the last window_weeks weeks instead of lifetime totals, so the solvers balance
+    recent load without any other change.
+    """
+    counter_by_type = dict(zip(model.slot_types, model.counter_fields))
+    windowed = {}
+    for emp_id, emp in employees_dict.items():
+        totals = windowed_loads(emp, window_weeks, current_week_start)
+        emp_copy = {**emp, 'total_shifts_assigned': totals["shifts"]}
+        for shift_type, total_field in counter_by_type.items():
+            emp_copy[total_field] = totals.get(shift_type.lower(), 0)
+        windowed[emp_id] = emp_copy
+    return windowed
@@ -0,0 +1,169 @@
+import threading
+import time
+
+from metrics import solver_phase
+from schedule_generator import _BLOCKED, _encode_preference, _summarize_schedule, create_weekly_schedule
+from schedule_model import compile_schedule_model
+from schedule_optimizer import _ScheduleSearch
+
+def horizon_days(days_of_week, week_count):
+    """Day labels for a horizon of week_count weeks: 'W1-Monday', ..., 'W1-Sunday', 'W2-Monday', ..."""
+    return [f"W{week + 1}-{day}" for week in range(week_count) for day in days_of_week]
+
+def expand_horizon_preferences(employee_preferences_raw, days_of_week, shift_types, week_count):
+    """
+    Maps preferences onto horizon slots. A weekly key such as 'Monday_Day' applies to that slot
+    in every week; a horizon key such as 'W2-Monday_Day' overrides it for a single week.
+    """
+    weekly_slots = [f"{day}_{stype}" for day in days_of_week for stype in shift_types]
+    horizon_slots = {f"{day}_{stype}" for day in horizon_days(days_of_week, week_count) for stype in shift_types}
+    expanded = {}
+    for emp_id, prefs in employee_preferences_raw.items():
+        emp_prefs = {}
+        for week in range(week_count):
+            for shift_slot in weekly_slots:
+                if shift_slot in prefs:
+                    emp_prefs[f"W{week + 1}-{shift_slot}"] = prefs[shift_slot]
+        emp_prefs.update((shift_slot, pref_val) for shift_slot, pref_val in prefs.items() if shift_slot in horizon_slots)
+        expanded[emp_id] = emp_prefs
+    return expanded
+
+class HorizonSchedule(_ScheduleSearch):
+    """
+    Assignment state for a multi-week horizon, kept between calls so preference edits can be re-solved locally.
+
+    Days are labelled per week (see horizon_days) and compiled into one model, so the rest rules
+    also apply across week boundaries. The shift limit applies per calendar week.
+    """
+
+    def __init__(self, employee_preferences_raw, employees_dict, week_count, days_of_week, shift_types, max_shifts_per_week):
+        self.week_count = week_count
+        self.weekly_days = list(days_of_week)
+        self.shift_types = list(shift_types)
+        self.employees_dict = employees_dict
+        self.preferences = expand_horizon_preferences(employee_preferences_raw, days_of_week, shift_types, week_count)
+        super().__init__(self.preferences, employees_dict, horizon_days(days_of_week, week_count), shift_types, max_shifts_per_week)
+
+        self.weekly_model = compile_schedule_model(days_of_week, shift_types)
+        self.slot_index = self.model.slot_index
+        self.week_of = [int(shift_slot[1:shift_slot.index('-')]) - 1 for shift_slot in self.shifts_to_fill]
+        self.week_masks = [0] * week_count # Bitmask of the slots in each week
+        for s, week in enumerate(self.week_of):
+            self.week_masks[week] |= 1 << s
+        self.lock = threading.Lock() # Held by callers while they edit or read a shared horizon
+
+    def _can_take(self, e, s, held=None, count=None):
+        """Like the weekly check, but the shift limit only counts the slot's own week."""
+        held = self.held[e] if held is None else held
+        week_shifts = bin(held & self.week_masks[self.week_of[s]]).count('1')
+        return self.pref_matrix[s][e] != _BLOCKED and week_shifts < self.max_shifts and not held & self.conflict_masks[s]
+
+    def solve(self, time_budget_ms=None):
+        """
+        Plans the horizon week by week with the weekly greedy generator, carrying the load counters
+        and the shifts that conflict across the week boundary into the next week. With a time
+        budget, the optimal search then runs over the whole horizon.
+        """
+        deadline = time.perf_counter() + time_budget_ms / 1000.0 if time_budget_ms else None
+        running_employees = {emp_id: emp.copy() for emp_id, emp in self.employees_dict.items()}
+        earlier_weeks_mask = 0
+
+        with solver_phase("horizon", "greedy"):
+            for week in range(self.week_count):
+                prefix = f"W{week + 1}-"
+                week_preferences = {
+                    emp_id: {shift_slot[len(prefix):]: pref_val for shift_slot, pref_val in prefs.items() if shift_slot.startswith(prefix)}
+                    for emp_id, prefs in self.preferences.items()
+                }
+                # Block this week's slots for employees holding a conflicting slot in an earlier week
+                for weekly_slot in self.weekly_model.slots:
+                    cross_week_conflicts = self.conflict_masks[self.slot_index[prefix + weekly_slot]] & earlier_weeks_mask
+                    if cross_week_conflicts:
+                        for e, held in enumerate(self.held):
+                            if held & cross_week_conflicts:
+                                week_preferences.setdefault(self.emp_ids[e], {})[weekly_slot] = "0"
+
+                week_schedule = create_weekly_schedule(
+                    week_preferences, running_employees, self.weekly_days, self.shift_types, self.max_shifts, self.weekly_model
+                )[0]
+                for shift_slot, emp_ids_list in week_schedule.items():
+                    total_field = self.weekly_model.counter_fields[self.weekly_model.slot_index[shift_slot]]
+                    for emp_id in emp_ids_list:
+                        self._assign(self.index_of[emp_id], self.slot_index[prefix + shift_slot])
+                        emp = running_employees[emp_id]
+                        emp['total_shifts_assigned'] = emp.get('total_shifts_assigned', 0) + 1
+                        emp[total_field] = emp.get(total_field, 0) + 1
+                earlier_weeks_mask |= self.week_masks[week]
+
+        if deadline is not None:
+            self.deadline = deadline
+            with solver_phase("horizon", "fill"):
+                self.fill_unfilled_seats()
+            with solver_phase("horizon", "improve"):
+                self.improve()
+            self.deadline = None
+        return self
+
+    def update_preferences(self, emp_id, changed_preferences):
+        """
+        Applies one employee's preference edits (weekly or horizon keys) and re-solves only the
+        edited slots and the slots they conflict with. Returns the re-solved slots in order.
+        """
+        e = self.index_of[emp_id]
+        changed = expand_horizon_preferences({emp_id: changed_preferences}, self.weekly_days, self.shift_types, self.week_count)[emp_id]
+        prefs = self.preferences.setdefault(emp_id, {})
+        window = set()
+        for shift_slot, pref_val in changed.items():
+            prefs[shift_slot] = pref_val
+            s = self.slot_index[shift_slot]
+            code = _encode_preference(pref_val)
+            if self.pref_matrix[s][e] != code:
+                self.pref_matrix[s][e] = code
+                window.update(t for t in range(len(self.shifts_to_fill)) if self.conflict_masks[s] >> t & 1)
+
+        with solver_phase("horizon", "resolve"):
+            for s in window:
+                for seated in list(self.seats[s]):
+                    self._unassign(seated, s)
+            # Reassignment chains may only move employees between slots of the window
+            outside_window = set(range(len(self.shifts_to_fill))) - window
+            for s in sorted(window):
+                while len(self.seats[s]) < self.seat_counts[s]:
+                    if not self._augment(s, set(outside_window)):
+                        break
+            self._improve_by_replacement(sorted(window))
+        return [self.shifts_to_fill[s] for s in sorted(window)]
+
+    def result(self):
+        """
+        Returns:
+            tuple: proposed_schedule_with_ids, proposed_schedule_with_names, unfilled_shifts,
+                   employee_shifts_per_week ({emp_id: [shifts in week 1, ...]}), objective
+        """
+        proposed_schedule_with_ids = self.schedule_with_ids()
+        unfilled_shifts, proposed_schedule_with_names = _summarize_schedule(proposed_schedule_with_ids, self.employees_dict, self.model)
+        employee_shifts_per_week = {
+            self.emp_ids[e]: [bin(held & week_mask).count('1') for week_mask in self.week_masks]
+            for e, held in enumerate(self.held) if held
+        }
+        return proposed_schedule_with_ids, proposed_schedule_with_names, unfilled_shifts, employee_shifts_per_week, self.objective()
+
+def create_horizon_schedule(employee_preferences_raw, employees_dict, week_count, days_of_week, shift_types, max_shifts_per_week, time_budget_ms=None):
+    """
+    Plans week_count weeks in one call, including the rest rule across week boundaries.
+
+    Args:
+        employee_preferences_raw (dict): {emp_id: {shift_slot: "0"/"1"/""}}, with weekly and/or horizon keys.
+        employees_dict (dict): Dictionary of employee details {emp_id: employee_object}.
+        week_count (int): Number of weeks in the horizon.
+        days_of_week (list): List of day names of one week.
+        shift_types (list): List of shift types (e.g., ['Day', 'Night']).
+        max_shifts_per_week (int): Maximum number of shifts an employee can be assigned in each week.
+        time_budget_ms (float): Budget for the optimal search; None keeps the week-by-week greedy plan.
+
+    Returns:
+        HorizonSchedule: the solved horizon; call result() for the schedule and update_preferences() for edits.
+    """
+    return HorizonSchedule(
+        employee_preferences_raw, employees_dict, week_count, days_of_week, shift_types, max_shifts_per_week
+    ).solve(time_budget_ms)
@@ -0,0 +1,114 @@
+import functools
+import json
+
+from config import SHIFT_DEFINITIONS, DEFAULT_SEATS_PER_SHIFT, MIN_REST_HOURS
+
+MINUTES_PER_DAY = 24 * 60
+
+def _parse_time(value):
+    """'HH:MM' -> minutes after midnight."""
+    try:
+        hours, minutes = (int(part) for part in value.split(':'))
+    except (AttributeError, ValueError):
+        raise ValueError(f"Invalid time '{value}'. Expected HH:MM.") from None
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        raise ValueError(f"Invalid time '{value}'. Expected HH:MM.")
+    return hours * 60 + minutes
+
+def shift_definition(shift_type, shift_definitions=None):
+    """Normalized definition of a shift type: start (minutes after midnight), duration, seats and counter."""
+    definitions = SHIFT_DEFINITIONS if shift_definitions is None else shift_definitions
+    if not isinstance(definitions, dict):
+        raise ValueError("shift_definitions must be an object of {shift_type: definition}")
+    definition = definitions.get(shift_type)
+    if not isinstance(definition, dict):
+        raise ValueError(f"Shift type '{shift_type}' has no definition with a start and end time.")
+    start = _parse_time(definition.get('start'))
+    end = _parse_time(definition.get('end'))
+    seats = definition.get('seats', DEFAULT_SEATS_PER_SHIFT)
+    if isinstance(seats, bool) or not isinstance(seats, int) or seats < 1:
+        raise ValueError(f"Shift type '{shift_type}' must have a positive integer number of seats.")
+    counter = definition.get('counter', f"total_{shift_type.lower()}_shifts_assigned")
+    if not isinstance(counter, str) or not counter:
+        raise ValueError(f"Shift type '{shift_type}' must name its counter as a non-empty string.")
+    return {
+        "start": start,
+        "duration": (end - start) % MINUTES_PER_DAY or MINUTES_PER_DAY, # An end at or before the start is on the next day
+        "seats": seats,
+        "counter": counter,
+    }
+
+def counter_field(shift_slot, shift_definitions=None):
+    """The employee counter a slot such as 'Monday_Night' adds to besides total_shifts_assigned (None if unknown)."""
+    definitions = SHIFT_DEFINITIONS if shift_definitions is None else shift_definitions
+    definition = definitions.get(shift_slot.rsplit('_', 1)[-1])
+    if not isinstance(definition, dict):
+        return None
+    return definition.get('counter', f"total_{shift_slot.rsplit('_', 1)[-1].lower()}_shifts_assigned")
+
+def _check_min_rest_hours(min_rest_hours):
+    if isinstance(min_rest_hours, bool) or not isinstance(min_rest_hours, (int, float)) or not 0 <= min_rest_hours < float('inf'):
+        raise ValueError("min_rest_hours must be a non-negative number")
+    return min_rest_hours
+
+class ScheduleModel:
+    """
+    Constraints of one planning period compiled to integer slot indices.
+
+    Slots are '<day>_<shift type>' in day order. For every slot the model keeps its seats,
+    employee counter and time interval (minutes from the start of the first day), and a conflict
+    bitmask of the slots the same employee can't also work: the slot itself, overlapping shifts
+    and shifts less than the minimum rest apart. The graph is symmetric, so checking a candidate
+    is a single AND with the slots they already hold, whatever order slots are filled in.
+    """
+
+    def __init__(self, days_of_week, shift_types, shift_definitions=None, min_rest_hours=None):
+        min_rest_hours = _check_min_rest_hours(MIN_REST_HOURS if min_rest_hours is None else min_rest_hours)
+        definitions = {stype: shift_definition(stype, shift_definitions) for stype in shift_types}
+        day_offsets = {}
+        for i, day in enumerate(days_of_week):
+            day_offsets.setdefault(day, i * MINUTES_PER_DAY)
+
+        self.days = list(days_of_week)
+        self.shift_types = list(shift_types)
+        self.slots = list(dict.fromkeys(f"{day}_{stype}" for day in days_of_week for stype in shift_types))
+        self.slot_index = {shift_slot: s for s, shift_slot in enumerate(self.slots)}
+        self.slot_types, self.seat_counts, self.counter_fields, self.intervals = [], [], [], []
+        for day in dict.fromkeys(days_of_week):
+            for stype in dict.fromkeys(shift_types):
+                definition = definitions[stype]
+                start = day_offsets[day] + definition["start"]
+                self.slot_types.append(stype)
+                self.seat_counts.append(definition["seats"])
+                self.counter_fields.append(definition["counter"])
+                self.intervals.append((start, start + definition["duration"]))
+
+        # Sweep the slots by start time: a later-starting slot conflicts while it starts within the rest window
+        min_rest_minutes = min_rest_hours * 60
+        self.conflict_masks = [1 << s for s in range(len(self.slots))]
+        by_start = sorted(range(len(self.slots)), key=lambda s: self.intervals[s])
+        for i, s in enumerate(by_start):
+            rest_until = self.intervals[s][1] + min_rest_minutes
+            for t in by_start[i + 1:]:
+                if self.intervals[t][0] >= rest_until:
+                    break
+                self.conflict_masks[s] |= 1 << t
+                self.conflict_masks[t] |= 1 << s
+
+    def unfilled_seats(self, s, seated_count):
+        return max(self.seat_counts[s] - seated_count, 0)
+
+@functools.lru_cache(maxsize=64)
+def _compile(days_of_week, shift_types, definitions_json, min_rest_hours):
+    shift_definitions = json.loads(definitions_json) if definitions_json is not None else None
+    return ScheduleModel(days_of_week, shift_types, shift_definitions, min_rest_hours)
+
+def compile_schedule_model(days_of_week, shift_types, shift_definitions=None, min_rest_hours=None):
+    """
+    Returns the ScheduleModel for these inputs, compiled once and then reused.
+    Models are shared between callers, so treat them as read-only. Raises ValueError on invalid definitions.
+    """
+    if min_rest_hours is not None:
+        _check_min_rest_hours(min_rest_hours) # Before it becomes part of the (hashable) cache key
+    definitions_json = json.dumps(shift_definitions, sort_keys=True) if shift_definitions is not None else None
+    return _compile(tuple(days_of_week), tuple(shift_types), definitions_json, min_rest_hours)
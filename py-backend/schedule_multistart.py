@@ -0,0 +1,185 @@
+import concurrent.futures
+import multiprocessing
+import random
+import threading
+import time
+
+from config import MULTISTART_WORKERS
+from metrics import solver_phase
+from schedule_generator import _BLOCKED, _summarize_schedule, create_weekly_schedule
+from schedule_optimizer import _ScheduleSearch
+
+def _randomized_fill(search, rng):
+    """
+    Greedy fill with a perturbed slot order (shuffled, or hardest slots first with random ties)
+    and random tie-breaking between otherwise equal candidates, followed by the optimal search moves.
+    """
+    slots = list(range(len(search.shifts_to_fill)))
+    if rng.random() < 0.5:
+        rng.shuffle(slots)
+    else: # Slots with the fewest employees who can work them first
+        slots.sort(key=lambda s: (len(search.pref_matrix[s]) - search.pref_matrix[s].count(_BLOCKED), rng.random()))
+
+    for s in slots:
+        row = search.pref_matrix[s]
+        candidates = [e for e in range(len(row)) if search._can_take(e, s)]
+        candidates.sort(key=lambda e: (search.counts[e], search._load(e), row[e], rng.random()))
+        for e in candidates[:search.seat_counts[s]]:
+            search._assign(e, s)
+    search.fill_unfilled_seats()
+    search.improve()
+
+def _score(search):
+    """The solver objective plus the variance of everyone's load and the share of assignments on "1" slots."""
+    score = search.objective()
+    loads = [search._load(e) for e in range(len(search.emp_ids))]
+    mean_load = sum(loads) / len(loads) if loads else 0.0
+    score["load_variance"] = round(sum((load - mean_load) ** 2 for load in loads) / len(loads), 4) if loads else 0.0
+    assigned = sum(search.counts)
+    preferred = sum(search.pref_matrix[s][e] == 0 for s, seated in enumerate(search.seats) for e in seated)
+    score["preferred_share"] = round(preferred / assigned, 4) if assigned else 0.0
+    return score
+
+def _collect(candidates, search, variant, top_k):
+    """Keeps the search's schedule in candidates ({fingerprint: candidate}) if it is new and among the top_k."""
+    fingerprint = tuple(tuple(sorted(seated)) for seated in search.seats)
+    if fingerprint in candidates:
+        return
+    score = _score(search)
+    candidates[fingerprint] = ((score["unfilled_seats"], score["total_cost"], variant), variant, search.schedule_with_ids(), score)
+    if len(candidates) > 4 * top_k: # Trim now and then instead of on every insert
+        for fingerprint_to_drop in sorted(candidates, key=lambda key: candidates[key][0])[top_k:]:
+            del candidates[fingerprint_to_drop]
+
+def _search_variants(search_inputs, model, seed, variants, deadline, top_k):
+    """
+    Runs the given variant numbers on one encoded search (a process-pool task).
+    Each variant has its own RNG seeded from (seed, variant), so results don't depend on which
+    worker ran it. Variants not started before the deadline (a time.time() value) are skipped, and
+    the search moves of the variant in flight stop at it.
+
+    Returns:
+        tuple: number of variants evaluated, {fingerprint: (rank, variant, schedule_with_ids, score)}
+    """
+    # The deadline crosses processes as wall-clock time; the search moves check a perf_counter deadline
+    search = _ScheduleSearch(*search_inputs, deadline=time.perf_counter() + (deadline - time.time()), model=model)
+    candidates = {}
+    evaluated = 0
+    for variant in variants:
+        if time.time() >= deadline:
+            break
+        search.clear()
+        _randomized_fill(search, random.Random(f"{seed}:{variant}"))
+        _collect(candidates, search, variant, top_k)
+        evaluated += 1
+    return evaluated, candidates
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_solver_pool(workers=MULTISTART_WORKERS):
+    """Returns the process pool shared by the CPU-bound solvers, starting it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Workers are forked from a clean single-threaded server (forking the threaded web server
+            # could deadlock them) that preloads the solver modules instead of re-running the app's main module
+            if 'forkserver' in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context('forkserver')
+                context.set_forkserver_preload([__name__, 'schedule_batch'])
+            else:
+                context = multiprocessing.get_context('spawn')
+            _pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=context)
+        return _pool
+
+def reset_solver_pool(pool):
+    """Drops a broken pool so the next caller starts fresh workers."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def create_multistart_schedules(employee_preferences_raw, employees_dict, days_of_week, shift_types, max_shifts_per_week,
+                                variants, top_k, time_budget_ms, seed=0, workers=MULTISTART_WORKERS, model=None):
+    """
+    Searches many randomized variants of the greedy schedule in parallel and returns the best ones.
+
+    Variant 0 is the plain greedy schedule, so the best candidate is never worse than greedy mode.
+    The other variants perturb the slot order and tie-breaking and are spread over a process pool.
+    Candidates are ranked by unfilled seats, then by the optimal solver's total cost (preference
+    plus fairness), with duplicates removed. The result is deterministic for a given seed as long as
+    every variant finishes within the time budget.
+
+    Args:
+        employee_preferences_raw (dict): Raw preferences from the request {emp_id: {shift_slot: "0"/"1"/""}}.
+        employees_dict (dict): Dictionary of employee details {emp_id: employee_object}.
+        days_of_week (list): List of day names.
+        shift_types (list): List of shift types (e.g., ['Day', 'Night']).
+        max_shifts_per_week (int): Maximum number of shifts an employee can be assigned in a week.
+        variants (int): Number of variants to evaluate, including the greedy one.
+        top_k (int): Number of candidates to return.
+        time_budget_ms (float): Wall-clock budget for the search in milliseconds.
+        seed (int): Seed for the randomized variants.
+        workers (int): Worker processes; 1 runs every variant in this process.
+        model (ScheduleModel): Compiled constraints; defaults to the configured shift definitions.
+
+    Returns:
+        tuple: candidates (best first; each with proposed_schedule_with_ids, proposed_schedule_with_names,
+               unfilled_shifts, employee_shifts_this_week, score and variant), variants_evaluated
+    """
+    deadline = time.time() + time_budget_ms / 1000.0
+    search_inputs = (employee_preferences_raw, employees_dict, days_of_week, shift_types, max_shifts_per_week)
+
+    candidates = {}
+    with solver_phase("multistart", "greedy"):
+        greedy_search = _ScheduleSearch(*search_inputs, model=model)
+        model = greedy_search.model
+        greedy_search.load_schedule(create_weekly_schedule(*search_inputs, model)[0])
+        _collect(candidates, greedy_search, 0, top_k)
+    variants_evaluated = 1
+
+    variant_numbers = list(range(1, variants))
+    with solver_phase("multistart", "search"):
+        if workers <= 1 or len(variant_numbers) < 2:
+            results = [_search_variants(search_inputs, model, seed, variant_numbers, deadline, top_k)]
+        else:
+            # A few chunks per worker balances the load without re-sending the inputs for every variant
+            chunk_size = max(1, -(-len(variant_numbers) // (workers * 4)))
+            pool = get_solver_pool(workers)
+            futures = [
+                pool.submit(_search_variants, search_inputs, model, seed, variant_numbers[start:start + chunk_size], deadline, top_k)
+                for start in range(0, len(variant_numbers), chunk_size)
+            ]
+            # Workers stop starting variants at the deadline; the grace period covers the variant in flight
+            done, not_done = concurrent.futures.wait(futures, timeout=max(deadline - time.time(), 0) + 1.0)
+            for future in not_done:
+                future.cancel()
+            try:
+                results = [future.result() for future in futures if future in done]
+            except concurrent.futures.process.BrokenProcessPool:
+                reset_solver_pool(pool)
+                raise
+
+    for evaluated, chunk_candidates in results:
+        variants_evaluated += evaluated
+        for fingerprint, candidate in chunk_candidates.items():
+            if fingerprint not in candidates or candidate[0] < candidates[fingerprint][0]:
+                candidates[fingerprint] = candidate
+
+    best_candidates = []
+    for _, variant, proposed_schedule_with_ids, score in sorted(candidates.values(), key=lambda candidate: candidate[0])[:top_k]:
+        unfilled_shifts, proposed_schedule_with_names = _summarize_schedule(proposed_schedule_with_ids, employees_dict, model)
+        employee_shifts_this_week = {}
+        for emp_ids_list in proposed_schedule_with_ids.values():
+            for emp_id in emp_ids_list:
+                employee_shifts_this_week[emp_id] = employee_shifts_this_week.get(emp_id, 0) + 1
+        best_candidates.append({
+            "variant": variant,
+            "score": score,
+            "proposed_schedule_with_ids": proposed_schedule_with_ids,
+            "proposed_schedule_with_names": proposed_schedule_with_names,
+            "unfilled_shifts": unfilled_shifts,
+            "employee_shifts_this_week": employee_shifts_this_week,
+        })
+    return best_candidates, variants_evaluated
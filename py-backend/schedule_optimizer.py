@@ -0,0 +1,233 @@
+import time
+
+from metrics import solver_phase
+from schedule_generator import _BLOCKED, _encode_preference_matrix, _summarize_schedule, create_weekly_schedule
+from schedule_model import compile_schedule_model
+
+class _ScheduleSearch:
+    """
+    Mutable assignment state for the optimal solver.
+
+    The objective is lexicographic: unfilled seats first, then a cost made of
+    - preference_cost: 0 per "1" assignment, 1 per "" assignment, 2 per any other value,
+    - fairness_cost: sum over employees of (total + week)^2 - total^2, which penalizes
+      piling this week's shifts on people who already carry the most load.
+    """
+
+    def __init__(self, employee_preferences_raw, employees_dict, days_of_week, shift_types, max_shifts_per_week, deadline=None, model=None):
+        self.model = model or compile_schedule_model(days_of_week, shift_types)
+        self.shifts_to_fill = self.model.slots
+        self.seat_counts = self.model.seat_counts
+        self.max_shifts = max_shifts_per_week
+        self.deadline = deadline
+        employees = list(employees_dict.values())
+        self.emp_ids = [emp['id'] for emp in employees]
+        self.index_of = {emp_id: i for i, emp_id in enumerate(self.emp_ids)}
+        self.past_loads = [emp.get('total_shifts_assigned', 0) for emp in employees]
+        self.pref_matrix = _encode_preference_matrix(employee_preferences_raw, employees_dict, self.shifts_to_fill)
+        self.conflict_masks = self.model.conflict_masks # Symmetric, so moves can go either way
+
+        self.seats = [[] for _ in self.shifts_to_fill] # Employee indices per slot
+        self.held = [0] * len(employees) # Bitmask of slots per employee
+        self.counts = [0] * len(employees)
+
+    def clear(self):
+        """Removes every assignment, keeping the encoded inputs for another search."""
+        self.seats = [[] for _ in self.shifts_to_fill]
+        self.held = [0] * len(self.emp_ids)
+        self.counts = [0] * len(self.emp_ids)
+
+    def _out_of_time(self):
+        return self.deadline is not None and time.perf_counter() >= self.deadline
+
+    def _assign(self, e, s):
+        self.seats[s].append(e)
+        self.held[e] |= 1 << s
+        self.counts[e] += 1
+
+    def _unassign(self, e, s):
+        self.seats[s].remove(e)
+        self.held[e] &= ~(1 << s)
+        self.counts[e] -= 1
+
+    def _can_take(self, e, s, held=None, count=None):
+        """Checks "0" preferences, the weekly limit and the conflict graph (optionally for a hypothetical state)."""
+        held = self.held[e] if held is None else held
+        count = self.counts[e] if count is None else count
+        return self.pref_matrix[s][e] != _BLOCKED and count < self.max_shifts and not held & self.conflict_masks[s]
+
+    def _load(self, e):
+        return self.past_loads[e] + self.counts[e]
+
+    def load_schedule(self, proposed_schedule_with_ids):
+        """Seeds the state from a {shift_slot: [emp_id, ...]} schedule, skipping unknown slots and employees."""
+        slot_index = {shift_slot: s for s, shift_slot in enumerate(self.shifts_to_fill)}
+        for shift_slot, emp_ids_list in proposed_schedule_with_ids.items():
+            for emp_id in emp_ids_list:
+                if shift_slot in slot_index and emp_id in self.index_of:
+                    self._assign(self.index_of[emp_id], slot_index[shift_slot])
+
+    def schedule_with_ids(self):
+        return {shift_slot: [self.emp_ids[e] for e in self.seats[s]] for s, shift_slot in enumerate(self.shifts_to_fill)}
+
+    def objective(self):
+        unfilled_seats = sum(self.model.unfilled_seats(s, len(seated)) for s, seated in enumerate(self.seats))
+        preference_cost = sum(self.pref_matrix[s][e] for s, seated in enumerate(self.seats) for e in seated)
+        fairness_cost = sum(count * (2 * past + count) for past, count in zip(self.past_loads, self.counts))
+        return {
+            "unfilled_seats": unfilled_seats,
+            "preference_cost": preference_cost,
+            "fairness_cost": fairness_cost,
+            "total_cost": preference_cost + fairness_cost,
+        }
+
+    def fill_unfilled_seats(self):
+        """Fills open seats directly or through chains of reassignments (augmenting paths)."""
+        for s in range(len(self.shifts_to_fill)):
+            while len(self.seats[s]) < self.seat_counts[s] and not self._out_of_time():
+                if not self._augment(s, set()):
+                    break
+
+    def _augment(self, s, visited):
+        """Tries to add one employee to slot s, moving an employee out of a slot not yet visited if needed."""
+        if self._out_of_time():
+            return False
+        visited.add(s)
+        row = self.pref_matrix[s]
+
+        best, best_cost = None, None
+        for e, pref in enumerate(row):
+            if self._can_take(e, s):
+                cost = pref + 2 * self._load(e)
+                if best is None or cost < best_cost:
+                    best, best_cost = e, cost
+        if best is not None:
+            self._assign(best, s)
+            return True
+
+        for e, pref in enumerate(row):
+            if pref == _BLOCKED or self.held[e] >> s & 1:
+                continue
+            for t in range(len(self.shifts_to_fill)):
+                if t in visited or not self.held[e] >> t & 1:
+                    continue
+                if not self._can_take(e, s, self.held[e] & ~(1 << t), self.counts[e] - 1):
+                    continue
+                self._unassign(e, t)
+                self._assign(e, s)
+                if self._augment(t, visited):
+                    return True
+                self._unassign(e, s)
+                self._assign(e, t)
+        return False
+
+    def improve(self):
+        """Applies improving replacements and swaps until none is left or time runs out."""
+        improved = True
+        while improved and not self._out_of_time():
+            improved = self._improve_by_replacement()
+            improved = self._improve_by_swap() or improved
+
+    def _improve_by_replacement(self, slots=None):
+        """Replaces a seated employee with an idle one when it lowers the cost (optionally only in the given slots)."""
+        improved = False
+        for s in range(len(self.shifts_to_fill)) if slots is None else slots:
+            row = self.pref_matrix[s]
+            for a in list(self.seats[s]):
+                if self._out_of_time():
+                    return improved
+                removal = 2 * self._load(a) - 1 + row[a]
+                best, best_delta = None, 0
+                for b, pref in enumerate(row):
+                    if self._can_take(b, s):
+                        delta = pref + 2 * self._load(b) + 1 - removal
+                        if delta < best_delta:
+                            best, best_delta = b, delta
+                if best is not None:
+                    self._unassign(a, s)
+                    self._assign(best, s)
+                    improved = True
+        return improved
+
+    def _improve_by_swap(self):
+        """Swaps two employees between slots when it lowers the preference cost."""
+        improved = False
+        for s in range(len(self.shifts_to_fill)):
+            for t in range(s + 1, len(self.shifts_to_fill)):
+                if self._out_of_time():
+                    return improved
+                for a in list(self.seats[s]):
+                    for b in list(self.seats[t]):
+                        if a == b or a in self.seats[t] or b in self.seats[s]:
+                            continue
+                        delta = (self.pref_matrix[t][a] + self.pref_matrix[s][b]
+                                 - self.pref_matrix[s][a] - self.pref_matrix[t][b])
+                        if delta >= 0:
+                            continue
+                        held_a = self.held[a] & ~(1 << s)
+                        held_b = self.held[b] & ~(1 << t)
+                        if not (self._can_take(a, t, held_a, 0) and self._can_take(b, s, held_b, 0)):
+                            continue
+                        self._unassign(a, s)
+                        self._unassign(b, t)
+                        self._assign(a, t)
+                        self._assign(b, s)
+                        improved = True
+                        break # Seats of s changed, move on to the next slot pair
+                    else:
+                        continue
+                    break
+        return improved
+
+def schedule_objective(proposed_schedule_with_ids, employee_preferences_raw, employees_dict, days_of_week, shift_types, max_shifts_per_week, model=None):
+    """Scores a schedule with the same objective the optimal solver minimizes."""
+    search = _ScheduleSearch(employee_preferences_raw, employees_dict, days_of_week, shift_types, max_shifts_per_week, model=model)
+    search.load_schedule(proposed_schedule_with_ids)
+    return search.objective()
+
+def create_optimal_schedule(employee_preferences_raw, employees_dict, days_of_week, shift_types, max_shifts_per_week, time_budget_ms, model=None):
+    """
+    Generates a weekly shift schedule that minimizes unfilled seats, then preference and fairness cost.
+
+    Starts from the greedy schedule, fills remaining seats with augmenting reassignment chains
+    and then applies improving replacements and swaps. The search stops when no improving move
+    is left or the time budget runs out, so the result is never worse than the greedy one.
+
+    Args:
+        employee_preferences_raw (dict): Raw preferences from the request {emp_id: {shift_slot: "0"/"1"/""}}.
+        employees_dict (dict): Dictionary of employee details {emp_id: employee_object}.
+        days_of_week (list): List of day names.
+        shift_types (list): List of shift types (e.g., ['Day', 'Night']).
+        max_shifts_per_week (int): Maximum number of shifts an employee can be assigned in a week.
+        time_budget_ms (float): Wall-clock budget for the search in milliseconds.
+        model (ScheduleModel): Compiled constraints; defaults to the configured shift definitions.
+
+    Returns:
+        tuple: proposed_schedule_with_ids, proposed_schedule_with_names,
+               unfilled_shifts, employee_shifts_this_week, objective
+    """
+    deadline = time.perf_counter() + time_budget_ms / 1000.0
+    greedy_schedule_with_ids = create_weekly_schedule(
+        employee_preferences_raw, employees_dict, days_of_week, shift_types, max_shifts_per_week, model
+    )[0]
+
+    with solver_phase("optimal", "setup"):
+        search = _ScheduleSearch(employee_preferences_raw, employees_dict, days_of_week, shift_types, max_shifts_per_week, deadline, model)
+        search.load_schedule(greedy_schedule_with_ids)
+    with solver_phase("optimal", "fill"):
+        search.fill_unfilled_seats()
+    with solver_phase("optimal", "improve"):
+        search.improve()
+
+    with solver_phase("optimal", "summarize"):
+        proposed_schedule_with_ids = search.schedule_with_ids()
+        unfilled_shifts, proposed_schedule_with_names = _summarize_schedule(proposed_schedule_with_ids, employees_dict, search.model)
+        employee_shifts_this_week = {search.emp_ids[e]: count for e, count in enumerate(search.counts) if count}
+
+    return (
+        proposed_schedule_with_ids,
+        proposed_schedule_with_names,
+        unfilled_shifts,
+        employee_shifts_this_week,
+        search.objective()
+    )
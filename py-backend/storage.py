@@ -0,0 +1,387 @@
+import contextlib
+import json
+import secrets
+import sqlite3
+import string
+import threading
+
+from config import STORAGE_BACKEND, SQLITE_DB_PATH, SQLITE_BUSY_TIMEOUT_SECONDS
+from metrics import instrument_backend
+
+class DocumentNotFoundError(LookupError):
+    """Raised when updating a document that doesn't exist."""
+
+class StorageBackend:
+    """
+    Document store used by the helpers in utils.py.
+    Documents are plain dicts; every read returns them with their document ID under 'id'.
+    """
+
+    def get_all_docs(self, collection_name, fields=None):
+        """Fetches every document; with fields, the backend may return only those fields (plus 'id')."""
+        raise NotImplementedError
+
+    def get_doc(self, collection_name, doc_id):
+        raise NotImplementedError
+
+    def get_docs(self, collection_name, doc_ids):
+        """Fetches several documents in one round trip: [(doc_id, doc_data or None), ...]."""
+        raise NotImplementedError
+
+    def has_docs(self, collection_name):
+        """Checks whether a collection holds at least one document, reading at most one."""
+        raise NotImplementedError
+
+    def list_docs(self, collection_name, limit, start_after=None, descending=False):
+        """Reads one page of a collection ordered by document ID, starting after the start_after ID."""
+        raise NotImplementedError
+
+    def set_doc(self, collection_name, doc_id, data):
+        raise NotImplementedError
+
+    def add_doc(self, collection_name, data):
+        raise NotImplementedError
+
+    def update_doc(self, collection_name, doc_id, data_to_update):
+        raise NotImplementedError
+
+    def delete_doc(self, collection_name, doc_id):
+        raise NotImplementedError
+
+    def run_transaction(self, work):
+        """
+        Runs work(transaction) atomically and returns its result. The transaction offers
+        get/set/update/delete(collection_name, doc_id, ...), get_many(collection_name, doc_ids)
+        and new_id(collection_name); all reads must come before the first write.
+        work may be retried on contention.
+        """
+        raise NotImplementedError
+
+    def transform_doc(self, collection_name, doc_id, transform):
+        """
+        Atomic read-modify-write of one document. transform(current doc or None) returns the
+        fields to update (or None to leave it untouched). Returns the resulting document or None.
+        """
+        def work(transaction):
+            current = transaction.get(collection_name, doc_id)
+            updates = transform(current)
+            if not updates:
+                return current
+            transaction.update(collection_name, doc_id, updates)
+            return {**current, **updates}
+        return self.run_transaction(work)
+
+    def watch_collection(self, collection_name, callback):
+        """Calls callback(docs) on every change. Returns a handle, or None if change feeds aren't supported."""
+        return None
+
+    def watch_doc(self, collection_name, doc_id, callback):
+        """Calls callback(doc or None) on every change. Returns a handle, or None if change feeds aren't supported."""
+        return None
+
+    def change_counter(self, collection_name):
+        """
+        A cheap value that changes whenever any writer (in any process) changes the collection, or None
+        if the backend can't tell. Lets callers without a change feed check cached data is still current.
+        """
+        return None
+
+def _snapshot_to_dict(snapshot):
+    doc_data = snapshot.to_dict()
+    doc_data['id'] = snapshot.id # Use Firestore document ID as 'id'
+    return doc_data
+
+class FirestoreBackend(StorageBackend):
+    """Cloud Firestore through firebase_admin."""
+
+    def __init__(self):
+        from firebase_admin import firestore # Only needed (and installed) when Firestore is used
+        from firebase_init import get_db
+        self._firestore = firestore
+        self.db = get_db()
+
+    def _doc_ref(self, collection_name, doc_id):
+        return self.db.collection(collection_name).document(doc_id)
+
+    def get_all_docs(self, collection_name, fields=None):
+        query = self.db.collection(collection_name)
+        if fields is not None:
+            query = query.select(fields) # Projection on the server: only these fields are sent
+        return [_snapshot_to_dict(doc) for doc in query.stream()]
+
+    def get_doc(self, collection_name, doc_id):
+        doc = self._doc_ref(collection_name, doc_id).get()
+        return _snapshot_to_dict(doc) if doc.exists else None
+
+    def get_docs(self, collection_name, doc_ids):
+        doc_refs = [self._doc_ref(collection_name, doc_id) for doc_id in doc_ids]
+        return [(doc.id, _snapshot_to_dict(doc) if doc.exists else None) for doc in self.db.get_all(doc_refs)]
+
+    def has_docs(self, collection_name):
+        return len(self.db.collection(collection_name).limit(1).get()) > 0
+
+    def list_docs(self, collection_name, limit, start_after=None, descending=False):
+        document_id = self._firestore.FieldPath.document_id()
+        direction = self._firestore.Query.DESCENDING if descending else self._firestore.Query.ASCENDING
+        query = self.db.collection(collection_name).order_by(document_id, direction=direction)
+        if start_after is not None:
+            query = query.start_after({document_id: self._doc_ref(collection_name, start_after)})
+        return [_snapshot_to_dict(doc) for doc in query.limit(limit).stream()]
+
+    def set_doc(self, collection_name, doc_id, data):
+        self._doc_ref(collection_name, doc_id).set(data)
+
+    def add_doc(self, collection_name, data):
+        _, doc_ref = self.db.collection(collection_name).add(data)
+        return doc_ref.id
+
+    def update_doc(self, collection_name, doc_id, data_to_update):
+        self._doc_ref(collection_name, doc_id).update(data_to_update)
+
+    def delete_doc(self, collection_name, doc_id):
+        self._doc_ref(collection_name, doc_id).delete()
+
+    def run_transaction(self, work):
+        @self._firestore.transactional
+        def run(transaction):
+            return work(_FirestoreTransaction(self, transaction))
+        return run(self.db.transaction())
+
+    def watch_collection(self, collection_name, callback):
+        def on_snapshot(doc_snapshots, changes, read_time):
+            callback([_snapshot_to_dict(doc) for doc in doc_snapshots])
+        return self.db.collection(collection_name).on_snapshot(on_snapshot)
+
+    def watch_doc(self, collection_name, doc_id, callback):
+        def on_snapshot(doc_snapshots, changes, read_time):
+            callback(next((_snapshot_to_dict(doc) for doc in doc_snapshots if doc.exists), None))
+        return self._doc_ref(collection_name, doc_id).on_snapshot(on_snapshot)
+
+class _FirestoreTransaction:
+    def __init__(self, backend, transaction):
+        self._backend = backend
+        self._transaction = transaction
+
+    def get(self, collection_name, doc_id):
+        snapshot = self._backend._doc_ref(collection_name, doc_id).get(transaction=self._transaction)
+        return _snapshot_to_dict(snapshot) if snapshot.exists else None
+
+    def get_many(self, collection_name, doc_ids):
+        doc_refs = [self._backend._doc_ref(collection_name, doc_id) for doc_id in doc_ids]
+        return [
+            (snapshot.id, _snapshot_to_dict(snapshot) if snapshot.exists else None)
+            for snapshot in self._transaction.get_all(doc_refs)
+        ]
+
+    def set(self, collection_name, doc_id, data):
+        self._transaction.set(self._backend._doc_ref(collection_name, doc_id), data)
+
+    def update(self, collection_name, doc_id, data_to_update):
+        self._transaction.update(self._backend._doc_ref(collection_name, doc_id), data_to_update)
+
+    def delete(self, collection_name, doc_id):
+        self._transaction.delete(self._backend._doc_ref(collection_name, doc_id))
+
+    def new_id(self, collection_name):
+        return self._backend.db.collection(collection_name).document().id
+
+class SqliteBackend(StorageBackend):
+    """
+    Local SQLite document store, one JSON row per document keyed by (collection, doc_id).
+    File databases run in WAL mode; ':memory:' gives a purely in-memory store.
+    Triggers count the writes to each collection in collection_changes (see change_counter).
+    """
+
+    _ID_ALPHABET = string.ascii_letters + string.digits
+
+    def __init__(self, path=SQLITE_DB_PATH):
+        self._path = path
+        self._shared = path == ':memory:'
+        if self._shared:
+            # ':memory:' is private to its connection, so every thread shares one behind a lock
+            self._lock = threading.RLock()
+            self._shared_conn = self._connect()
+        else:
+            # File databases get one connection per thread; WAL lets readers run alongside the writer
+            # and BEGIN IMMEDIATE (with the busy timeout) serializes the writers
+            self._lock = contextlib.nullcontext()
+            self._local = threading.local()
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " collection TEXT NOT NULL, doc_id TEXT NOT NULL, data TEXT NOT NULL,"
+            " PRIMARY KEY (collection, doc_id)) WITHOUT ROWID"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS collection_changes ("
+            " collection TEXT PRIMARY KEY, counter INTEGER NOT NULL) WITHOUT ROWID"
+        )
+        for event, row in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+            # Part of the writing statement, so the counter commits (or rolls back) with the change itself
+            self._conn.execute(
+                f"CREATE TRIGGER IF NOT EXISTS documents_{event.lower()}_counter AFTER {event} ON documents BEGIN"
+                f" INSERT INTO collection_changes (collection, counter) VALUES ({row}.collection, 1)"
+                f" ON CONFLICT (collection) DO UPDATE SET counter = counter + 1; END"
+            )
+
+    def _connect(self):
+        conn = sqlite3.connect(self._path, check_same_thread=False, isolation_level=None, timeout=SQLITE_BUSY_TIMEOUT_SECONDS)
+        if not self._shared:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @property
+    def _conn(self):
+        if self._shared:
+            return self._shared_conn
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def _new_id(self):
+        return ''.join(secrets.choice(self._ID_ALPHABET) for _ in range(20)) # Same shape as Firestore auto-IDs
+
+    def _read(self, collection_name, doc_id):
+        row = self._conn.execute(
+            "SELECT data FROM documents WHERE collection = ? AND doc_id = ?", (collection_name, doc_id)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _write(self, collection_name, doc_id, data):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO documents (collection, doc_id, data) VALUES (?, ?, ?)",
+            (collection_name, doc_id, json.dumps(data))
+        )
+
+    def _in_transaction(self, work):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = work()
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def get_all_docs(self, collection_name, fields=None):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT doc_id, data FROM documents WHERE collection = ?", (collection_name,)
+            ).fetchall()
+        return [{**json.loads(data), 'id': doc_id} for doc_id, data in rows]
+
+    def get_doc(self, collection_name, doc_id):
+        with self._lock:
+            doc_data = self._read(collection_name, doc_id)
+        return {**doc_data, 'id': doc_id} if doc_data is not None else None
+
+    def get_docs(self, collection_name, doc_ids):
+        return [(doc_id, self.get_doc(collection_name, doc_id)) for doc_id in doc_ids]
+
+    def has_docs(self, collection_name):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM documents WHERE collection = ? LIMIT 1", (collection_name,)
+            ).fetchone() is not None
+
+    def list_docs(self, collection_name, limit, start_after=None, descending=False):
+        # Range scan on the (collection, doc_id) primary key
+        query = "SELECT doc_id, data FROM documents WHERE collection = ?"
+        params = [collection_name]
+        if start_after is not None:
+            query += " AND doc_id < ?" if descending else " AND doc_id > ?"
+            params.append(start_after)
+        query += f" ORDER BY doc_id {'DESC' if descending else 'ASC'} LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [{**json.loads(data), 'id': doc_id} for doc_id, data in rows]
+
+    def set_doc(self, collection_name, doc_id, data):
+        with self._lock:
+            self._write(collection_name, doc_id, data)
+
+    def add_doc(self, collection_name, data):
+        doc_id = self._new_id()
+        self.set_doc(collection_name, doc_id, data)
+        return doc_id
+
+    def update_doc(self, collection_name, doc_id, data_to_update):
+        def work():
+            current = self._read(collection_name, doc_id)
+            if current is None:
+                raise DocumentNotFoundError(f"{collection_name}/{doc_id}")
+            self._write(collection_name, doc_id, {**current, **data_to_update})
+        self._in_transaction(work)
+
+    def delete_doc(self, collection_name, doc_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM documents WHERE collection = ? AND doc_id = ?", (collection_name, doc_id))
+
+    def run_transaction(self, work):
+        return self._in_transaction(lambda: work(_SqliteTransaction(self)))
+
+    def change_counter(self, collection_name):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT counter FROM collection_changes WHERE collection = ?", (collection_name,)
+            ).fetchone()
+        return row[0] if row else 0
+
+class _SqliteTransaction:
+    """Runs inside SqliteBackend._in_transaction, i.e. under a BEGIN IMMEDIATE on the calling thread's connection."""
+
+    def __init__(self, backend):
+        self._backend = backend
+
+    def get(self, collection_name, doc_id):
+        doc_data = self._backend._read(collection_name, doc_id)
+        return {**doc_data, 'id': doc_id} if doc_data is not None else None
+
+    def get_many(self, collection_name, doc_ids):
+        return [(doc_id, self.get(collection_name, doc_id)) for doc_id in doc_ids]
+
+    def set(self, collection_name, doc_id, data):
+        self._backend._write(collection_name, doc_id, data)
+
+    def update(self, collection_name, doc_id, data_to_update):
+        current = self._backend._read(collection_name, doc_id)
+        if current is None:
+            raise DocumentNotFoundError(f"{collection_name}/{doc_id}")
+        self._backend._write(collection_name, doc_id, {**current, **data_to_update})
+
+    def delete(self, collection_name, doc_id):
+        self._backend._conn.execute(
+            "DELETE FROM documents WHERE collection = ? AND doc_id = ?", (collection_name, doc_id)
+        )
+
+    def new_id(self, collection_name):
+        return self._backend._new_id()
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_backend():
+    """Returns the storage backend selected by STORAGE_BACKEND, creating it on first use."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if STORAGE_BACKEND == 'firestore':
+                    backend = FirestoreBackend()
+                elif STORAGE_BACKEND == 'sqlite':
+                    backend = SqliteBackend(SQLITE_DB_PATH)
+                elif STORAGE_BACKEND == 'memory':
+                    backend = SqliteBackend(':memory:')
+                else:
+                    raise ValueError(f"Unknown STORAGE_BACKEND '{STORAGE_BACKEND}'. Expected firestore, sqlite or memory.")
+                _backend = instrument_backend(backend) # Times round trips when metrics are enabled
+    return _backend
+
+def set_backend(backend):
+    """Replaces the storage backend, e.g. with an in-memory store for load tests."""
+    global _backend
+    with _backend_lock:
+        _backend = instrument_backend(backend)
@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+# The backend modules import each other as top-level modules (e.g. 'from config import ...')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def memory_backend(monkeypatch):
+    """A fresh in-memory SqliteBackend behind the utils helpers, with empty caches."""
+    import utils
+    from storage import SqliteBackend
+    backend = SqliteBackend(':memory:')
+    monkeypatch.setattr(utils, 'get_backend', lambda: backend)
+    monkeypatch.setattr(utils, '_listeners', {})
+    monkeypatch.setattr(utils, '_collection_digests', {})
+    utils.invalidate_cache()
+    yield backend
+    utils.invalidate_cache()
@@ -0,0 +1,239 @@
+import copy
+
+import pytest
+
+import utils
+from config import EMPLOYEES_COLLECTION, ON_CALL_COLLECTION
+from storage import StorageBackend
+
+class FakeBackend(StorageBackend):
+    """In-memory document store that counts reads and changes and lets tests fire snapshot callbacks."""
+
+    def __init__(self):
+        self.collections = {}
+        self.changes = {}
+        self.reads = 0
+        self.collection_watchers = {}
+        self.doc_watchers = {}
+
+    def get_all_docs(self, collection_name, fields=None):
+        self.reads += 1
+        return [{**copy.deepcopy(data), 'id': doc_id} for doc_id, data in self.collections.get(collection_name, {}).items()]
+
+    def get_doc(self, collection_name, doc_id):
+        self.reads += 1
+        data = self.collections.get(collection_name, {}).get(doc_id)
+        return {**copy.deepcopy(data), 'id': doc_id} if data is not None else None
+
+    def set_doc(self, collection_name, doc_id, data):
+        self.collections.setdefault(collection_name, {})[doc_id] = copy.deepcopy(data)
+        self.changes[collection_name] = self.changes.get(collection_name, 0) + 1
+
+    def add_doc(self, collection_name, data):
+        doc_id = f"doc{sum(len(docs) for docs in self.collections.values())}"
+        self.set_doc(collection_name, doc_id, data)
+        return doc_id
+
+    def update_doc(self, collection_name, doc_id, data_to_update):
+        self.collections[collection_name][doc_id].update(copy.deepcopy(data_to_update))
+        self.changes[collection_name] = self.changes.get(collection_name, 0) + 1
+
+    def delete_doc(self, collection_name, doc_id):
+        self.collections.get(collection_name, {}).pop(doc_id, None)
+        self.changes[collection_name] = self.changes.get(collection_name, 0) + 1
+
+    def watch_collection(self, collection_name, callback):
+        self.collection_watchers[collection_name] = callback
+        return object()
+
+    def watch_doc(self, collection_name, doc_id, callback):
+        self.doc_watchers[(collection_name, doc_id)] = callback
+        return object()
+
+    def change_counter(self, collection_name):
+        return self.changes.get(collection_name, 0)
+
+@pytest.fixture
+def backend(monkeypatch):
+    fake = FakeBackend()
+    fake.set_doc(EMPLOYEES_COLLECTION, 'e1', {'name': 'Alice', 'total_shifts_assigned': 3})
+    fake.set_doc(EMPLOYEES_COLLECTION, 'e2', {'name': 'Bob', 'total_shifts_assigned': 5})
+    fake.set_doc(ON_CALL_COLLECTION, 'current', {'rotation_order': ['e1', 'e2'], 'current_index': 0})
+    monkeypatch.setattr(utils, 'get_backend', lambda: fake)
+    monkeypatch.setattr(utils, 'CACHE_SNAPSHOT_LISTENERS', True)
+    monkeypatch.setattr(utils, '_listeners', {})
+    monkeypatch.setattr(utils, '_collection_digests', {})
+    utils.invalidate_cache()
+    yield fake
+    utils.invalidate_cache()
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(utils.time, 'monotonic', lambda: now[0])
+    return now
+
+def _names(docs):
+    return sorted(doc['name'] for doc in docs)
+
+def test_collection_read_through_hits_after_first_miss(backend):
+    stats = utils.get_cache_stats()
+    assert _names(utils.get_all_docs(EMPLOYEES_COLLECTION)) == ['Alice', 'Bob']
+    assert utils.get_doc(EMPLOYEES_COLLECTION, 'e2')['name'] == 'Bob'
+    assert _names(utils.get_all_docs(EMPLOYEES_COLLECTION, ['name'])) == ['Alice', 'Bob']
+    assert backend.reads == 1
+    after = utils.get_cache_stats()
+    assert after['misses'] - stats['misses'] == 1
+    assert after['hits'] - stats['hits'] == 2
+
+def test_cached_doc_read_through(backend):
+    assert utils.get_doc(ON_CALL_COLLECTION, 'current')['current_index'] == 0
+    assert utils.get_doc(ON_CALL_COLLECTION, 'current')['current_index'] == 0
+    assert backend.reads == 1
+
+def test_reads_return_copies(backend):
+    utils.get_doc(EMPLOYEES_COLLECTION, 'e1')['name'] = 'Mallory'
+    utils.get_doc(ON_CALL_COLLECTION, 'current')['rotation_order'].append('e3')
+    assert utils.get_doc(EMPLOYEES_COLLECTION, 'e1')['name'] == 'Alice'
+    assert utils.get_doc(ON_CALL_COLLECTION, 'current')['rotation_order'] == ['e1', 'e2']
+
+def test_writes_patch_the_cache_without_rereading(backend):
+    utils.get_all_docs(EMPLOYEES_COLLECTION)
+    utils.get_doc(ON_CALL_COLLECTION, 'current')
+    reads = backend.reads
+
+    new_id = utils.add_doc(EMPLOYEES_COLLECTION, {'name': 'Carol', 'total_shifts_assigned': 0})
+    utils.update_doc(EMPLOYEES_COLLECTION, 'e1', {'total_shifts_assigned': 4})
+    utils.delete_doc(EMPLOYEES_COLLECTION, 'e2')
+    utils.set_doc(ON_CALL_COLLECTION, 'current', {'rotation_order': ['e1'], 'current_index': 0})
+
+    assert _names(utils.get_all_docs(EMPLOYEES_COLLECTION)) == ['Alice', 'Carol']
+    assert utils.get_doc(EMPLOYEES_COLLECTION, new_id) == {'name': 'Carol', 'total_shifts_assigned': 0, 'id': new_id}
+    assert utils.get_doc(EMPLOYEES_COLLECTION, 'e1')['total_shifts_assigned'] == 4
+    assert utils.get_doc(ON_CALL_COLLECTION, 'current')['rotation_order'] == ['e1']
+    assert backend.reads == reads
+
+def test_write_bumps_version_and_etag(backend):
+    etag = utils.get_collection_etag(EMPLOYEES_COLLECTION, None)
+    version = utils.get_collection_version(EMPLOYEES_COLLECTION)
+    assert utils.get_collection_etag(EMPLOYEES_COLLECTION, None) == etag
+    utils.update_doc(EMPLOYEES_COLLECTION, 'e1', {'name': 'Alicia'})
+    assert utils.get_collection_version(EMPLOYEES_COLLECTION) > version
+    assert utils.get_collection_etag(EMPLOYEES_COLLECTION, None) != etag
+
+def test_etag_depends_only_on_contents(backend):
+    etag = utils.get_collection_etag(EMPLOYEES_COLLECTION, ['id', 'name'])
+    utils.invalidate_cache()
+    utils._collection_digests.clear()
+    assert utils.get_collection_etag(EMPLOYEES_COLLECTION, ['id', 'name']) == etag
+    assert utils.get_collection_etag(EMPLOYEES_COLLECTION, None) != etag
+
+def test_merge_into_uncached_document_invalidates(backend):
+    utils.get_all_docs(EMPLOYEES_COLLECTION)
+    backend.set_doc(EMPLOYEES_COLLECTION, 'e3', {'name': 'Dave'}) # Written behind the cache's back
+    utils.update_doc(EMPLOYEES_COLLECTION, 'e3', {'total_shifts_assigned': 1})
+    assert _names(utils.get_all_docs(EMPLOYEES_COLLECTION)) == ['Alice', 'Bob', 'Dave']
+    assert backend.reads == 2
+
+def test_ttl_expiry_reloads(backend, clock):
+    utils.get_all_docs(EMPLOYEES_COLLECTION)
+    utils.get_doc(ON_CALL_COLLECTION, 'current')
+    backend.set_doc(EMPLOYEES_COLLECTION, 'e1', {'name': 'Alicia'})
+
+    clock[0] += utils.CACHE_TTL_SECONDS - 1
+    assert _names(utils.get_all_docs(EMPLOYEES_COLLECTION)) == ['Alice', 'Bob']
+    assert backend.reads == 2
+
+    clock[0] += 2
+    assert _names(utils.get_all_docs(EMPLOYEES_COLLECTION)) == ['Alicia', 'Bob']
+    utils.get_doc(ON_CALL_COLLECTION, 'current')
+    assert backend.reads == 4
+
+def test_ttl_reload_keeps_version_when_unchanged(backend, clock):
+    utils.get_all_docs(EMPLOYEES_COLLECTION)
+    version = utils.get_collection_version(EMPLOYEES_COLLECTION)
+    clock[0] += utils.CACHE_TTL_SECONDS + 1
+    utils.get_all_docs(EMPLOYEES_COLLECTION)
+    assert backend.reads == 2
+    assert utils.get_collection_version(EMPLOYEES_COLLECTION) == version
+
+def test_snapshot_replaces_cached_collection(backend):
+    utils.get_all_docs(EMPLOYEES_COLLECTION)
+    version = utils.get_collection_version(EMPLOYEES_COLLECTION)
+    snapshots = utils.get_cache_stats()['snapshots']
+
+    backend.collection_watchers[EMPLOYEES_COLLECTION]([{'id': 'e9', 'name': 'Zoe'}])
+    assert _names(utils.get_all_docs(EMPLOYEES_COLLECTION)) == ['Zoe']
+    assert utils.get_collection_version(EMPLOYEES_COLLECTION) > version
+    assert utils.get_cache_stats()['snapshots'] == snapshots + 1
+    assert backend.reads == 1
+
+def test_snapshot_replaces_cached_doc(backend):
+    utils.get_doc(ON_CALL_COLLECTION, 'current')
+    backend.doc_watchers[(ON_CALL_COLLECTION, 'current')]({'id': 'current', 'rotation_order': ['e2'], 'current_index': 0})
+    assert utils.get_doc(ON_CALL_COLLECTION, 'current')['rotation_order'] == ['e2']
+    backend.doc_watchers[(ON_CALL_COLLECTION, 'current')](None) # Document deleted
+    assert utils.get_doc(ON_CALL_COLLECTION, 'current') is None
+    assert backend.reads == 1
+
+def test_unchanged_snapshot_keeps_version(backend):
+    docs = utils.get_all_docs(EMPLOYEES_COLLECTION)
+    version = utils.get_collection_version(EMPLOYEES_COLLECTION)
+    backend.collection_watchers[EMPLOYEES_COLLECTION](docs)
+    assert utils.get_collection_version(EMPLOYEES_COLLECTION) == version
+
+def test_without_listener_change_counter_validates(backend, monkeypatch):
+    monkeypatch.setattr(backend, 'watch_collection', lambda collection_name, callback: None) # No change feed, like SQLite
+    monkeypatch.setattr(backend, 'watch_doc', lambda collection_name, doc_id, callback: None)
+    utils.get_all_docs(EMPLOYEES_COLLECTION)
+    utils.get_doc(ON_CALL_COLLECTION, 'current')
+    utils.get_all_docs(EMPLOYEES_COLLECTION)
+    utils.get_doc(ON_CALL_COLLECTION, 'current')
+    assert backend.reads == 2
+
+    backend.set_doc(EMPLOYEES_COLLECTION, 'e3', {'name': 'Carol'}) # E.g. another worker process
+    backend.set_doc(ON_CALL_COLLECTION, 'current', {'rotation_order': ['e3'], 'current_index': 0})
+    assert _names(utils.get_all_docs(EMPLOYEES_COLLECTION)) == ['Alice', 'Bob', 'Carol']
+    assert utils.get_doc(ON_CALL_COLLECTION, 'current')['rotation_order'] == ['e3']
+    assert backend.reads == 4
+
+def test_without_listener_or_counter_bypasses_cache(backend, monkeypatch):
+    monkeypatch.setattr(utils, 'CACHE_SNAPSHOT_LISTENERS', False)
+    monkeypatch.setattr(backend, 'change_counter', lambda collection_name: None)
+    utils.get_all_docs(EMPLOYEES_COLLECTION)
+    backend.set_doc(EMPLOYEES_COLLECTION, 'e3', {'name': 'Carol'})
+    assert _names(utils.get_all_docs(EMPLOYEES_COLLECTION)) == ['Alice', 'Bob', 'Carol']
+    assert backend.collection_watchers == {}
+    assert backend.reads == 2
+
+def test_version_reloads_stale_collection(backend, clock):
+    utils.get_all_docs(EMPLOYEES_COLLECTION)
+    version = utils.get_collection_version(EMPLOYEES_COLLECTION)
+    backend.set_doc(EMPLOYEES_COLLECTION, 'e3', {'name': 'Carol'}) # Written behind the cache's back
+    assert utils.get_collection_version(EMPLOYEES_COLLECTION) == version
+
+    clock[0] += utils.CACHE_TTL_SECONDS + 1
+    assert utils.get_collection_version(EMPLOYEES_COLLECTION) > version # Without a get_all_docs in between
+    assert backend.reads == 2
+
+def test_write_during_read_is_not_overwritten(backend, monkeypatch):
+    read_all = backend.get_all_docs
+    def racing_read(collection_name, fields=None):
+        docs = read_all(collection_name, fields) # The read completes, then a write lands before it is cached
+        utils.update_doc(EMPLOYEES_COLLECTION, 'e1', {'name': 'Alicia'})
+        return docs
+    monkeypatch.setattr(backend, 'get_all_docs', racing_read)
+    utils.get_all_docs(EMPLOYEES_COLLECTION)
+    monkeypatch.setattr(backend, 'get_all_docs', read_all)
+    assert _names(utils.get_all_docs(EMPLOYEES_COLLECTION)) == ['Alicia', 'Bob']
+
+def test_doc_write_during_read_is_not_overwritten(backend, monkeypatch):
+    read_doc = backend.get_doc
+    def racing_read(collection_name, doc_id):
+        doc = read_doc(collection_name, doc_id)
+        utils.set_doc(ON_CALL_COLLECTION, 'current', {'rotation_order': ['e2'], 'current_index': 0})
+        return doc
+    monkeypatch.setattr(backend, 'get_doc', racing_read)
+    utils.get_doc(ON_CALL_COLLECTION, 'current')
+    monkeypatch.setattr(backend, 'get_doc', read_doc)
+    assert utils.get_doc(ON_CALL_COLLECTION, 'current')['rotation_order'] == ['e2']
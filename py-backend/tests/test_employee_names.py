@@ -0,0 +1,67 @@
+import pytest
+
+import utils
+from config import EMPLOYEES_COLLECTION, EMPLOYEE_NAMES_COLLECTION, ON_CALL_COLLECTION
+
+def _index_owner(backend, name):
+    entry = backend.get_doc(EMPLOYEE_NAMES_COLLECTION, utils.employee_name_index_id(utils.employee_name_key(name)))
+    return entry and entry["employee_id"]
+
+def test_add_claims_the_normalized_name(memory_backend):
+    emp_id = utils.add_employee_doc({"name": "Alice", "total_shifts_assigned": 0})
+    assert memory_backend.get_doc(EMPLOYEES_COLLECTION, emp_id)["name_key"] == "alice"
+    assert _index_owner(memory_backend, "Alice") == emp_id
+    with pytest.raises(utils.DuplicateEmployeeNameError):
+        utils.add_employee_doc({"name": "  ALICE "})
+    assert len(memory_backend.get_all_docs(EMPLOYEES_COLLECTION)) == 1
+
+def test_delete_releases_the_name(memory_backend):
+    emp_id = utils.add_employee_doc({"name": "Alice"})
+    assert utils.delete_employee_doc(emp_id)["name"] == "Alice"
+    assert _index_owner(memory_backend, "Alice") is None
+    assert utils.add_employee_doc({"name": "alice"}) != emp_id
+    assert utils.delete_employee_doc("missing") is None
+
+def test_rename_moves_the_claim(memory_backend):
+    emp_id = utils.add_employee_doc({"name": "Alice"})
+    assert utils.rename_employee_doc(emp_id, "Alicia")["name"] == "Alicia"
+    assert _index_owner(memory_backend, "Alice") is None
+    assert _index_owner(memory_backend, "Alicia") == emp_id
+    assert utils.get_doc(EMPLOYEES_COLLECTION, emp_id)["name"] == "Alicia"
+    utils.add_employee_doc({"name": "Alice"}) # The old name is free again
+    assert utils.rename_employee_doc("missing", "Bob") is None
+
+def test_rename_to_a_different_case_of_the_own_name(memory_backend):
+    emp_id = utils.add_employee_doc({"name": "alice"})
+    utils.rename_employee_doc(emp_id, "Alice")
+    assert _index_owner(memory_backend, "Alice") == emp_id
+    assert utils.get_doc(EMPLOYEES_COLLECTION, emp_id)["name"] == "Alice"
+
+def test_rename_to_a_taken_name_changes_nothing(memory_backend):
+    alice = utils.add_employee_doc({"name": "Alice"})
+    bob = utils.add_employee_doc({"name": "Bob"})
+    with pytest.raises(utils.DuplicateEmployeeNameError):
+        utils.rename_employee_doc(bob, "alice")
+    assert memory_backend.get_doc(EMPLOYEES_COLLECTION, bob)["name"] == "Bob"
+    assert (_index_owner(memory_backend, "Alice"), _index_owner(memory_backend, "Bob")) == (alice, bob)
+
+def test_stale_index_entries_are_ignored(memory_backend):
+    emp_id = utils.add_employee_doc({"name": "Alice"})
+    memory_backend.delete_doc(EMPLOYEES_COLLECTION, emp_id) # Deleted without releasing the name
+    new_id = utils.add_employee_doc({"name": "Alice"})
+    assert _index_owner(memory_backend, "Alice") == new_id
+
+    memory_backend.update_doc(EMPLOYEES_COLLECTION, new_id, {"name": "Alicia", "name_key": "alicia"}) # Renamed without moving the claim
+    utils.add_employee_doc({"name": "Alice"})
+
+def test_rename_and_delete_update_the_rotation(memory_backend):
+    alice = utils.add_employee_doc({"name": "Alice"})
+    bob = utils.add_employee_doc({"name": "Bob"})
+    utils.save_on_call_config({"rotation_order": [alice, bob], "current_on_call_index": 1})
+
+    utils.rename_employee_doc(bob, "Robert")
+    assert utils.get_on_call_config()["rotation_names"] == {alice: "Alice", bob: "Robert"}
+    utils.delete_employee_doc(bob)
+    stored = memory_backend.get_doc(ON_CALL_COLLECTION, "current")
+    assert (stored["rotation_order"], stored["current_on_call_index"], stored["rotation_names"]) == ([alice], 0, {alice: "Alice"})
+    assert utils.get_on_call_config()["rotation_order"] == [alice]
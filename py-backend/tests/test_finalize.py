@@ -0,0 +1,104 @@
+import pytest
+
+import utils
+from config import EMPLOYEES_COLLECTION, SCHEDULE_HISTORY_COLLECTION
+
+WEEK = "2026-10-18"
+
+def _employee(backend, emp_id, **counters):
+    backend.set_doc(EMPLOYEES_COLLECTION, emp_id, {"name": emp_id.title(), **counters})
+
+def test_record_applies_deltas_and_recent_weeks(memory_backend):
+    _employee(memory_backend, "ann", total_shifts_assigned=4, total_day_shifts_assigned=4)
+    _employee(memory_backend, "bob")
+    _employee(memory_backend, "cat", total_shifts_assigned=7)
+    utils.get_all_docs(EMPLOYEES_COLLECTION) # Cached, so the cache must be patched too
+    deltas_by_id = {
+        "ann": {"total_shifts_assigned": 2, "total_day_shifts_assigned": 1, "total_night_shifts_assigned": 1},
+        "bob": {"total_shifts_assigned": 1, "total_night_shifts_assigned": 1},
+        "gone": {"total_shifts_assigned": 1}, # Deleted since the schedule was generated
+    }
+    counts_by_id = {"ann": {"shifts": 2, "day": 1, "night": 1}, "bob": {"shifts": 1, "night": 1}, "gone": {"shifts": 1}}
+
+    history_id, updated_ids = utils.record_finalized_schedule(deltas_by_id, counts_by_id, WEEK, {"week_start": WEEK})
+    assert sorted(updated_ids) == ["ann", "bob"]
+    ann = memory_backend.get_doc(EMPLOYEES_COLLECTION, "ann")
+    assert (ann["total_shifts_assigned"], ann["total_day_shifts_assigned"], ann["total_night_shifts_assigned"]) == (6, 5, 1)
+    assert ann["recent_weeks"] == [{"week_start": WEEK, "shifts": 2, "day": 1, "night": 1}]
+    assert memory_backend.get_doc(EMPLOYEES_COLLECTION, "bob")["total_shifts_assigned"] == 1
+    assert memory_backend.get_doc(EMPLOYEES_COLLECTION, "cat") == {"name": "Cat", "total_shifts_assigned": 7, "id": "cat"}
+    assert memory_backend.get_doc(EMPLOYEES_COLLECTION, "gone") is None
+    assert memory_backend.get_doc(SCHEDULE_HISTORY_COLLECTION, history_id) == {"week_start": WEEK, "id": history_id}
+    assert utils.get_doc(EMPLOYEES_COLLECTION, "ann") == ann
+
+def test_second_finalization_of_a_week_adds_to_its_bucket(memory_backend):
+    _employee(memory_backend, "ann")
+    for _ in range(2):
+        utils.record_finalized_schedule({"ann": {"total_shifts_assigned": 1}}, {"ann": {"shifts": 1, "day": 1}}, WEEK, {})
+    assert memory_backend.get_doc(EMPLOYEES_COLLECTION, "ann")["recent_weeks"] == [{"week_start": WEEK, "shifts": 2, "day": 2}]
+    assert len(memory_backend.get_all_docs(SCHEDULE_HISTORY_COLLECTION)) == 2
+
+def test_record_in_chunks_writes_history_once(memory_backend, monkeypatch):
+    monkeypatch.setattr(utils, 'FIRESTORE_BATCH_LIMIT', 3) # Two employees per transaction
+    emp_ids = [f"e{i}" for i in range(5)]
+    for emp_id in emp_ids:
+        _employee(memory_backend, emp_id, total_shifts_assigned=1)
+    history_id, updated_ids = utils.record_finalized_schedule(
+        {emp_id: {"total_shifts_assigned": 1} for emp_id in emp_ids}, {}, WEEK, {"week_start": WEEK}
+    )
+    assert sorted(updated_ids) == emp_ids
+    assert all(memory_backend.get_doc(EMPLOYEES_COLLECTION, emp_id)["total_shifts_assigned"] == 2 for emp_id in emp_ids)
+    assert [doc["id"] for doc in memory_backend.get_all_docs(SCHEDULE_HISTORY_COLLECTION)] == [history_id]
+
+def test_advance_wraps_around(memory_backend):
+    for emp_id in ("ann", "bob"):
+        _employee(memory_backend, emp_id)
+    utils.save_on_call_config({"rotation_order": ["ann", "bob"], "current_on_call_index": 0})
+    assert [utils.advance_on_call_index()["current_on_call_index"] for _ in range(3)] == [1, 0, 1]
+    assert utils.get_on_call_config()["current_on_call_index"] == 1
+
+def test_advance_with_an_empty_rotation(memory_backend):
+    utils.get_on_call_config() # Creates the default document
+    assert utils.advance_on_call_index()["current_on_call_index"] == 0
+
+# --- The finalize route (needs Flask) ---
+
+@pytest.fixture
+def client(memory_backend):
+    pytest.importorskip("flask")
+    from app import create_app
+    app = create_app(warm_up=False)
+    app.testing = True
+    return app.test_client()
+
+def test_shift_count_deltas():
+    pytest.importorskip("flask")
+    from routes.main_routes import _shift_count_deltas
+    assert _shift_count_deltas({"Monday_Day": ["ann", "bob"], "Monday_Night": "ann", "Tuesday_Night": [None, ""], "Friday_Day": []}) == {
+        "ann": {"total_shifts_assigned": 2, "total_day_shifts_assigned": 1, "total_night_shifts_assigned": 1},
+        "bob": {"total_shifts_assigned": 1, "total_day_shifts_assigned": 1},
+    }
+
+def test_finalize_updates_loads_and_advances_once(client, memory_backend):
+    for emp_id in ("ann", "bob"):
+        _employee(memory_backend, emp_id, total_shifts_assigned=1)
+    utils.save_on_call_config({"rotation_order": ["ann", "bob"], "current_on_call_index": 0})
+
+    response = client.post('/api/finalize_schedule', json={"schedule_to_finalize": {"Monday_Day": ["ann", "unknown"]}, "week_start": "2026-10-21"})
+    assert response.status_code == 200
+    assert (response.json["employees_updated"], response.json["week_start"]) == (1, WEEK)
+    ann = memory_backend.get_doc(EMPLOYEES_COLLECTION, "ann")
+    assert (ann["total_shifts_assigned"], ann["total_day_shifts_assigned"]) == (2, 1)
+    assert memory_backend.get_doc(EMPLOYEES_COLLECTION, "bob")["total_shifts_assigned"] == 1
+    assert utils.get_on_call_config()["current_on_call_index"] == 1
+
+def test_failed_finalize_does_not_advance(client, memory_backend, monkeypatch):
+    from routes import main_routes
+    _employee(memory_backend, "ann")
+    utils.save_on_call_config({"rotation_order": ["ann", "ann2"], "current_on_call_index": 0})
+    def fail(*args):
+        raise RuntimeError("storage unavailable")
+    monkeypatch.setattr(main_routes, 'record_finalized_schedule', fail)
+    with pytest.raises(RuntimeError):
+        client.post('/api/finalize_schedule', json={"schedule_to_finalize": {"Monday_Day": ["ann"]}})
+    assert utils.get_on_call_config()["current_on_call_index"] == 0
@@ -0,0 +1,57 @@
+import pytest
+
+import utils
+from config import EMPLOYEES_COLLECTION, ON_CALL_COLLECTION
+
+def _rotation(order, current_index):
+    return {"rotation_order": order, "current_on_call_index": current_index, "rotation_names": {emp_id: emp_id.upper() for emp_id in order}}
+
+@pytest.mark.parametrize("order, current_index, removed_ids, expected_order, expected_current", [
+    (["a", "b", "c", "d"], 2, {"a"}, ["b", "c", "d"], "c"), # Removed before the current one
+    (["a", "b", "c", "d"], 1, {"d"}, ["a", "b", "c"], "b"), # Removed after it
+    (["a", "b", "c", "d"], 2, {"c"}, ["a", "b", "d"], "d"), # The current one: the next takes over
+    (["a", "b", "c"], 2, {"c"}, ["a", "b"], "a"), # The current one at the end wraps around
+    (["a", "b", "c", "d", "e"], 2, {"a", "c"}, ["b", "d", "e"], "d"),
+    (["a", "b", "c"], 0, {"x"}, ["a", "b", "c"], "a"), # Not in the rotation
+    (["a", "b"], 1, {"a", "b"}, [], None),
+])
+def test_prune_rotation_keeps_the_current_employee(order, current_index, removed_ids, expected_order, expected_current):
+    pruned = utils._prune_rotation(_rotation(order, current_index), removed_ids)
+    assert pruned["rotation_order"] == expected_order
+    assert pruned["rotation_names"] == {emp_id: emp_id.upper() for emp_id in expected_order}
+    if expected_current is None:
+        assert pruned["current_on_call_index"] == 0
+    else:
+        assert expected_order[pruned["current_on_call_index"]] == expected_current
+
+def test_upcoming_on_call_wraps_around():
+    on_call_data = _rotation(["a", "b", "c"], 1)
+    assert [entry["id"] for entry in utils.upcoming_on_call(on_call_data, 5)] == ["b", "c", "a"]
+    assert utils.upcoming_on_call(on_call_data, 2) == [{"id": "b", "name": "B"}, {"id": "c", "name": "C"}]
+    assert utils.upcoming_on_call(_rotation([], 0), 3) == []
+
+def _add_employees(backend, names):
+    for emp_id, name in names.items():
+        backend.set_doc(EMPLOYEES_COLLECTION, emp_id, {"name": name})
+
+def test_sync_backfills_refreshes_and_prunes(memory_backend):
+    _add_employees(memory_backend, {"a": "Alice", "b": "Bob", "c": "Carol"})
+    memory_backend.set_doc(ON_CALL_COLLECTION, "current", {"rotation_order": ["a", "b", "c"], "current_on_call_index": 2, "rotation_names": {"b": "Bob"}})
+    assert utils.sync_on_call_names()["rotation_names"] == {"a": "Alice", "b": "Bob", "c": "Carol"}
+
+    # Edited straight in storage, like the frontend does
+    memory_backend.update_doc(EMPLOYEES_COLLECTION, "c", {"name": "Caroline"})
+    memory_backend.delete_doc(EMPLOYEES_COLLECTION, "a")
+    on_call_data = utils.sync_on_call_names()
+    assert on_call_data["rotation_order"] == ["b", "c"]
+    assert on_call_data["rotation_names"] == {"b": "Bob", "c": "Caroline"}
+    assert on_call_data["rotation_order"][on_call_data["current_on_call_index"]] == "c"
+    assert memory_backend.get_doc(ON_CALL_COLLECTION, "current")["rotation_names"] == {"b": "Bob", "c": "Caroline"}
+
+def test_sync_writes_nothing_when_consistent(memory_backend):
+    _add_employees(memory_backend, {"a": "Alice", "b": "Bob"})
+    utils.save_on_call_config({"rotation_order": ["a", "b"], "current_on_call_index": 0})
+    changes = memory_backend.change_counter(ON_CALL_COLLECTION)
+    for _ in range(3):
+        assert utils.sync_on_call_names()["rotation_names"] == {"a": "Alice", "b": "Bob"}
+    assert memory_backend.change_counter(ON_CALL_COLLECTION) == changes
@@ -0,0 +1,58 @@
+import datetime
+
+from config import DAYS_OF_WEEK, SHIFT_TYPES
+from schedule_history import roll_recent_weeks, shift_counts, week_start, windowed_loads, with_windowed_loads
+from schedule_model import compile_schedule_model
+
+SUNDAY = "2026-10-18" # HISTORY_WEEK_START_DAY is Sunday
+
+def _bucket(day, shifts):
+    return {"week_start": day, "shifts": shifts}
+
+def test_week_start_is_the_configured_weekday():
+    assert week_start(datetime.date(2026, 10, 18)) == SUNDAY
+    assert week_start(datetime.date(2026, 10, 24)) == SUNDAY # Saturday
+    assert week_start(datetime.date(2026, 10, 25)) == "2026-10-25"
+
+def test_shift_counts_by_type_and_weekend():
+    counts = shift_counts({
+        "Monday_Day": ["a", "b"], "Friday_Night": ["a"], "W2-Saturday_Day": "b", "Sunday_Night": [None, ""],
+    })
+    assert counts == {"a": {"shifts": 2, "day": 1, "night": 1, "weekend": 1}, "b": {"shifts": 2, "day": 2, "weekend": 1}}
+
+def test_roll_keeps_buckets_inside_the_window():
+    recent_weeks = [_bucket("2026-09-20", 9), _bucket("2026-09-27", 2), _bucket("2026-10-11", 1)]
+    rolled = roll_recent_weeks(recent_weeks, SUNDAY, {"shifts": 3, "day": 3}, window_weeks=4)
+    # The oldest week in a 4-week window is three weeks before the current one
+    assert rolled == [_bucket("2026-09-27", 2), _bucket("2026-10-11", 1), {"week_start": SUNDAY, "shifts": 3, "day": 3}]
+    assert recent_weeks[0] == _bucket("2026-09-20", 9) # Input untouched
+
+def test_roll_adds_to_the_current_bucket():
+    rolled = roll_recent_weeks([{"week_start": SUNDAY, "shifts": 1, "night": 1}], SUNDAY, {"shifts": 2, "day": 2})
+    assert rolled == [{"week_start": SUNDAY, "shifts": 3, "night": 1, "day": 2}]
+
+def test_roll_inserts_an_earlier_week_in_order():
+    rolled = roll_recent_weeks([_bucket(SUNDAY, 1)], "2026-10-11", {"shifts": 1})
+    assert [bucket["week_start"] for bucket in rolled] == ["2026-10-11", SUNDAY]
+
+def test_roll_with_a_one_week_window_keeps_only_the_current_week():
+    assert roll_recent_weeks([_bucket("2026-10-11", 5)], SUNDAY, {"shifts": 1}, window_weeks=1) == [_bucket(SUNDAY, 1)]
+
+def test_windowed_loads_window_boundaries():
+    employee = {"recent_weeks": [
+        _bucket("2026-09-20", 100), # Just outside a 4-week window
+        {"week_start": "2026-09-27", "shifts": 2, "day": 2}, # Oldest week inside it
+        {"week_start": SUNDAY, "shifts": 3, "night": 3},
+        _bucket("2026-10-25", 50), # After the current week
+    ]}
+    assert windowed_loads(employee, 4, SUNDAY) == {"shifts": 5, "day": 2, "night": 3}
+    assert windowed_loads(employee, 1, SUNDAY) == {"shifts": 3, "night": 3}
+    assert windowed_loads({}, 4, SUNDAY) == {"shifts": 0}
+
+def test_with_windowed_loads_replaces_the_counters():
+    model = compile_schedule_model(DAYS_OF_WEEK, SHIFT_TYPES)
+    employees = {"a": {"id": "a", "total_shifts_assigned": 40, "total_day_shifts_assigned": 30, "total_night_shifts_assigned": 10,
+                       "recent_weeks": [{"week_start": SUNDAY, "shifts": 2, "night": 2}]}}
+    windowed = with_windowed_loads(employees, 4, model, SUNDAY)["a"]
+    assert (windowed["total_shifts_assigned"], windowed["total_day_shifts_assigned"], windowed["total_night_shifts_assigned"]) == (2, 0, 2)
+    assert employees["a"]["total_shifts_assigned"] == 40
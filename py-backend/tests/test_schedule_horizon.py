@@ -0,0 +1,89 @@
+import random
+
+import pytest
+
+from config import DAYS_OF_WEEK, SHIFT_TYPES
+from schedule_horizon import create_horizon_schedule, expand_horizon_preferences
+
+WEEKS = 3
+MAX_SHIFTS = 3
+
+def _employees(count, rng):
+    return {
+        f"emp{i:02d}": {"id": f"emp{i:02d}", "name": f"Employee {i}", "total_shifts_assigned": rng.randint(0, 5)}
+        for i in range(count)
+    }
+
+def _random_preferences(employees_dict, rng):
+    weekly_slots = [f"{day}_{stype}" for day in DAYS_OF_WEEK for stype in SHIFT_TYPES]
+    return {emp_id: {shift_slot: rng.choice(["0", "1", "", ""]) for shift_slot in weekly_slots} for emp_id in employees_dict}
+
+def _assert_feasible(horizon):
+    """Every seat holder may work the slot, holds no conflicting slot and stays within the weekly limit."""
+    schedule = horizon.result()[0]
+    held = {}
+    for shift_slot, emp_ids in schedule.items():
+        assert len(emp_ids) == len(set(emp_ids)) <= horizon.model.seat_counts[horizon.slot_index[shift_slot]]
+        for emp_id in emp_ids:
+            assert horizon.preferences.get(emp_id, {}).get(shift_slot) != "0", (emp_id, shift_slot)
+            held.setdefault(emp_id, []).append(horizon.slot_index[shift_slot])
+    for emp_id, slots in held.items():
+        for s in slots:
+            assert not any(t != s and horizon.conflict_masks[s] >> t & 1 for t in slots), (emp_id, horizon.shifts_to_fill[s])
+        for week in range(WEEKS):
+            assert sum(horizon.week_of[s] == week for s in slots) <= MAX_SHIFTS
+
+def _horizon(seed, employee_count=8, time_budget_ms=None):
+    rng = random.Random(seed)
+    employees_dict = _employees(employee_count, rng)
+    preferences = _random_preferences(employees_dict, rng)
+    return create_horizon_schedule(preferences, employees_dict, WEEKS, DAYS_OF_WEEK, SHIFT_TYPES, MAX_SHIFTS, time_budget_ms), rng
+
+def test_horizon_key_overrides_weekly_key():
+    expanded = expand_horizon_preferences({"e": {"Monday_Day": "1", "W2-Monday_Day": "0", "Tuesday_Xmas": "1"}}, DAYS_OF_WEEK, SHIFT_TYPES, 3)["e"]
+    assert expanded == {"W1-Monday_Day": "1", "W2-Monday_Day": "0", "W3-Monday_Day": "1"}
+
+def test_unchanged_preference_resolves_nothing():
+    horizon, _ = _horizon(0)
+    emp_id = next(iter(horizon.employees_dict))
+    current = horizon.preferences.get(emp_id, {}).get("W1-Monday_Day", "")
+    before = horizon.result()[0]
+    assert horizon.update_preferences(emp_id, {"W1-Monday_Day": current}) == []
+    assert horizon.result()[0] == before
+
+def test_blocking_a_held_slot_moves_the_employee_and_keeps_the_rest():
+    horizon, _ = _horizon(1)
+    before = horizon.result()[0]
+    shift_slot, emp_ids = next((shift_slot, emp_ids) for shift_slot, emp_ids in before.items() if emp_ids)
+    emp_id = emp_ids[0]
+
+    resolved_slots = horizon.update_preferences(emp_id, {shift_slot: "0"})
+    after = horizon.result()[0]
+    assert shift_slot in resolved_slots
+    assert emp_id not in after[shift_slot]
+    # Only the edited slot and the slots it conflicts with are re-solved
+    s = horizon.slot_index[shift_slot]
+    assert resolved_slots == [t for t in horizon.shifts_to_fill if horizon.conflict_masks[s] >> horizon.slot_index[t] & 1]
+    assert {t: ids for t, ids in after.items() if t not in resolved_slots} == {t: ids for t, ids in before.items() if t not in resolved_slots}
+    _assert_feasible(horizon)
+
+def test_weekly_edit_applies_to_every_week():
+    horizon, _ = _horizon(2)
+    emp_id = next(iter(horizon.employees_dict))
+    horizon.update_preferences(emp_id, {"Friday_Night": "0"})
+    schedule = horizon.result()[0]
+    assert all(emp_id not in schedule[f"W{week + 1}-Friday_Night"] for week in range(WEEKS))
+    _assert_feasible(horizon)
+
+@pytest.mark.parametrize("seed", range(10))
+@pytest.mark.parametrize("time_budget_ms", [None, 20])
+def test_random_edits_stay_feasible(seed, time_budget_ms):
+    horizon, rng = _horizon(seed, 6 + seed % 5, time_budget_ms)
+    _assert_feasible(horizon)
+    emp_ids = list(horizon.employees_dict)
+    for _ in range(15):
+        shift_slot = rng.choice(horizon.shifts_to_fill)
+        if rng.random() < 0.5:
+            shift_slot = shift_slot.split('-', 1)[1] # Weekly key
+        horizon.update_preferences(rng.choice(emp_ids), {shift_slot: rng.choice(["0", "1", ""])})
+        _assert_feasible(horizon)
@@ -0,0 +1,29 @@
+import pytest
+
+from schedule_model import compile_schedule_model
+
+DAY_ONLY = {'Day': {'start': '08:00', 'end': '20:00'}}
+
+@pytest.mark.parametrize("shift_definitions, min_rest_hours, message", [
+    (5, None, "shift_definitions must be an object"),
+    ([DAY_ONLY], None, "shift_definitions must be an object"),
+    ({'Day': 'morning'}, None, "has no definition"),
+    ({'Day': {**DAY_ONLY['Day'], 'seats': 0}}, None, "positive integer number of seats"),
+    ({'Day': {**DAY_ONLY['Day'], 'counter': ''}}, None, "counter as a non-empty string"),
+    ({'Day': {**DAY_ONLY['Day'], 'counter': ['total']}}, None, "counter as a non-empty string"),
+    ({'Day': {'start': '8am', 'end': '20:00'}}, None, "Invalid time"),
+    (DAY_ONLY, [8], "min_rest_hours must be a non-negative number"),
+    (DAY_ONLY, -1, "min_rest_hours must be a non-negative number"),
+    (DAY_ONLY, True, "min_rest_hours must be a non-negative number"),
+])
+def test_invalid_inputs_raise_value_error(shift_definitions, min_rest_hours, message):
+    with pytest.raises(ValueError, match=message):
+        compile_schedule_model(['Monday'], ['Day'], shift_definitions, min_rest_hours)
+
+def test_rest_window_conflicts():
+    model = compile_schedule_model(['Monday', 'Tuesday'], ['Day', 'Night'])
+    conflicts = lambda a, b: bool(model.conflict_masks[model.slot_index[a]] >> model.slot_index[b] & 1)
+    assert conflicts('Monday_Day', 'Monday_Night')
+    assert conflicts('Monday_Night', 'Tuesday_Day')
+    assert not conflicts('Monday_Day', 'Tuesday_Day')
+    assert not conflicts('Monday_Night', 'Tuesday_Night')
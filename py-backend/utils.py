@@ -1,61 +1,586 @@
+import concurrent.futures
+import contextvars
+import copy
+import hashlib
 import json
 import os
-from firebase_init import db # Import the initialized db client
-from config import EMPLOYEES_COLLECTION, ON_CALL_COLLECTION # Import collection names
-
-def get_all_docs(collection_name):
-    """Fetches all documents from a Firestore collection."""
-    docs_ref = db.collection(collection_name).stream()
-    docs_list = []
-    for doc in docs_ref:
-        doc_data = doc.to_dict()
-        doc_data['id'] = doc.id # Use Firestore document ID as 'id'
-        docs_list.append(doc_data)
-    return docs_list
+import threading
+import time
+from metrics import timed_helper
+from storage import get_backend # Firestore or local SQLite, selected by config.STORAGE_BACKEND
+from config import EMPLOYEES_COLLECTION, ON_CALL_COLLECTION, EMPLOYEE_NAMES_COLLECTION, CACHE_TTL_SECONDS, CACHE_SNAPSHOT_LISTENERS # Import collection names
+from config import SCHEDULE_HISTORY_COLLECTION, HISTORY_WINDOW_WEEKS, FIRESTORE_BATCH_LIMIT, STORAGE_IO_THREADS
+from schedule_history import roll_recent_weeks
 
+# --- Read-through cache ---
+# Whole collections and single documents that are read on almost every request are kept in memory.
+# Snapshot listeners keep them fresh, writes made through the helpers below patch them immediately,
+# and entries older than CACHE_TTL_SECONDS are re-read in case a listener stopped delivering.
+# Backends without a change feed (SQLite) are asked for the collection's change counter instead, so
+# writes from other processes show up on the next read; without either, the cache is bypassed.
+CACHED_COLLECTIONS = {EMPLOYEES_COLLECTION}
+CACHED_DOCS = {(ON_CALL_COLLECTION, "current")}
+
+_cache_lock = threading.RLock()
+_collection_cache = {} # {collection_name: {"docs": {doc_id: doc_data}, "loaded_at": monotonic time, "change_counter": ...}}
+_doc_cache = {} # {(collection_name, doc_id): {"doc": doc_data or None, "loaded_at": monotonic time, "change_counter": ...}}
+_listeners = {} # {collection_name or (collection_name, doc_id): watch handle}
+_cache_stats = {"hits": 0, "misses": 0, "invalidations": 0, "snapshots": 0}
+_collection_versions = {} # {collection_name: counter bumped whenever its data may have changed}
+_collection_digests = {} # {collection_name: (docs map, content hash)}, recomputed once the cached map is replaced
+
+def _bump_version(collection_name):
+    with _cache_lock:
+        _collection_versions[collection_name] = _collection_versions.get(collection_name, 0) + 1
+
+def get_collection_version(collection_name):
+    """
+    Returns a number that changes whenever this process writes to the collection or a reload or
+    snapshot brings different data, so results derived from it can be keyed on (inputs, version).
+    Refreshes the cache first if it is stale, so the version changes once the data may have.
+    """
+    if collection_name in CACHED_COLLECTIONS:
+        _cached_collection(collection_name)
+    with _cache_lock:
+        return _collection_versions.get(collection_name, 0)
+
+def get_collection_etag(collection_name, *variant):
+    """
+    ETag for a response derived from a collection (and variant, e.g. the projected fields).
+    It hashes the documents themselves, so every worker process hands out the same tag for the same data.
+    """
+    if collection_name in CACHED_COLLECTIONS:
+        docs = _cached_collection(collection_name) # Refreshes the cache first if it is stale
+    else:
+        docs = {doc['id']: doc for doc in get_backend().get_all_docs(collection_name)}
+    with _cache_lock:
+        cached = _collection_digests.get(collection_name)
+    if cached is not None and cached[0] is docs:
+        content_hash = cached[1]
+    else:
+        content_hash = hashlib.blake2b(json.dumps(docs, sort_keys=True, default=str).encode('utf-8'), digest_size=8).hexdigest()
+        if collection_name in CACHED_COLLECTIONS:
+            with _cache_lock:
+                _collection_digests[collection_name] = (docs, content_hash)
+    variant_hash = hashlib.blake2b(json.dumps(variant).encode('utf-8'), digest_size=6).hexdigest()
+    return f"{collection_name}-{content_hash}-{variant_hash}"
+
+def _project(doc, fields):
+    return {field: doc[field] for field in fields if field in doc}
+
+def _is_fresh(entry, key, collection_name):
+    """
+    Whether a cached entry can be served: younger than CACHE_TTL_SECONDS and, unless a snapshot
+    listener keeps it up to date, read at the backend's current change counter for the collection.
+    """
+    if entry is None or time.monotonic() - entry["loaded_at"] >= CACHE_TTL_SECONDS:
+        return False
+    with _cache_lock:
+        if _listeners.get(key) is not None:
+            return True
+    return entry["change_counter"] is not None and get_backend().change_counter(collection_name) == entry["change_counter"]
+
+def _store_collection(collection_name, docs, change_counter=None, read_at_version=None):
+    """
+    Caches a freshly read collection; the version only changes if the documents did.
+    With read_at_version (the version before the read), a read that a write overtook isn't cached.
+    """
+    with _cache_lock:
+        if read_at_version is not None and _collection_versions.get(collection_name, 0) != read_at_version:
+            return docs
+        entry = _collection_cache.get(collection_name)
+        if entry is None or entry["docs"] != docs:
+            _bump_version(collection_name)
+        else:
+            docs = entry["docs"] # Unchanged, keep the map readers may already hold
+        _collection_cache[collection_name] = {"docs": docs, "loaded_at": time.monotonic(), "change_counter": change_counter}
+    return docs
+
+def _store_doc(collection_name, doc_id, doc, change_counter=None, read_at_version=None):
+    """Caches a freshly read document (unless a write overtook the read, see _store_collection)."""
+    with _cache_lock:
+        if read_at_version is not None and _collection_versions.get(collection_name, 0) != read_at_version:
+            return
+        entry = _doc_cache.get((collection_name, doc_id))
+        if entry is None or entry["doc"] != doc:
+            _bump_version(collection_name)
+        _doc_cache[(collection_name, doc_id)] = {"doc": doc, "loaded_at": time.monotonic(), "change_counter": change_counter}
+
+def _watch_collection(collection_name):
+    """Starts a snapshot listener that replaces the cached collection on every change."""
+    def on_snapshot(docs_list):
+        with _cache_lock:
+            _cache_stats["snapshots"] += 1
+        _store_collection(collection_name, {doc['id']: doc for doc in docs_list})
+    _start_listener(collection_name, lambda: get_backend().watch_collection(collection_name, on_snapshot))
+
+def _watch_doc(collection_name, doc_id):
+    """Starts a snapshot listener that replaces the cached document on every change."""
+    def on_snapshot(doc):
+        with _cache_lock:
+            _cache_stats["snapshots"] += 1
+        _store_doc(collection_name, doc_id, doc)
+    _start_listener((collection_name, doc_id), lambda: get_backend().watch_doc(collection_name, doc_id, on_snapshot))
+
+def _start_listener(key, start):
+    if not CACHE_SNAPSHOT_LISTENERS:
+        return
+    with _cache_lock:
+        if key in _listeners:
+            return
+        _listeners[key] = None # Reserve the slot so concurrent misses don't start duplicates
+    try:
+        watch = start()
+    except Exception as e:
+        print(f"Could not start snapshot listener for {key}, revalidating it on every read instead: {e}")
+        return
+    with _cache_lock:
+        _listeners[key] = watch
+
+def _cached_collection(collection_name):
+    """Returns the cached {doc_id: doc_data} map of a collection, loading it on a miss."""
+    with _cache_lock:
+        entry = _collection_cache.get(collection_name)
+    if _is_fresh(entry, collection_name, collection_name):
+        with _cache_lock:
+            _cache_stats["hits"] += 1
+        return entry["docs"]
+    with _cache_lock:
+        _cache_stats["misses"] += 1
+        version = _collection_versions.get(collection_name, 0)
+    change_counter = get_backend().change_counter(collection_name) # Taken before the read, so a concurrent write shows up next time
+    docs = {doc['id']: doc for doc in get_backend().get_all_docs(collection_name)}
+    docs = _store_collection(collection_name, docs, change_counter, version)
+    _watch_collection(collection_name)
+    return docs
+
+def _cached_doc(collection_name, doc_id):
+    """Returns a cached single document (or None if it doesn't exist), loading it on a miss."""
+    key = (collection_name, doc_id)
+    with _cache_lock:
+        entry = _doc_cache.get(key)
+    if _is_fresh(entry, key, collection_name):
+        with _cache_lock:
+            _cache_stats["hits"] += 1
+        return entry["doc"]
+    with _cache_lock:
+        _cache_stats["misses"] += 1
+        version = _collection_versions.get(collection_name, 0)
+    change_counter = get_backend().change_counter(collection_name)
+    doc = get_backend().get_doc(collection_name, doc_id)
+    _store_doc(collection_name, doc_id, doc, change_counter, version)
+    _watch_doc(collection_name, doc_id)
+    return doc
+
+def _patch_cache(collection_name, doc_id, doc_data=None, merge=False, deleted=False):
+    """Applies a write to any cached copy of the document; drops the copy if it can't be patched."""
+    doc_data = copy.deepcopy(doc_data) # The caller keeps ownership of what it wrote
+    with _cache_lock:
+        _bump_version(collection_name)
+        entry = _collection_cache.get(collection_name)
+        if entry is not None:
+            docs = dict(entry["docs"]) # Copy-on-write: readers may still hold the previous map
+            if deleted:
+                docs.pop(doc_id, None)
+            elif merge:
+                if doc_id in docs:
+                    docs[doc_id] = {**docs[doc_id], **doc_data}
+                else:
+                    _collection_cache.pop(collection_name) # Unknown document, re-read on next access
+                    _cache_stats["invalidations"] += 1
+                    docs = None
+            else:
+                docs[doc_id] = {**doc_data, 'id': doc_id}
+            if docs is not None:
+                entry["docs"] = docs
+
+        key = (collection_name, doc_id)
+        doc_entry = _doc_cache.get(key)
+        if doc_entry is not None:
+            if deleted:
+                doc_entry["doc"] = None
+            elif merge and doc_entry["doc"] is not None:
+                doc_entry["doc"] = {**doc_entry["doc"], **doc_data}
+            elif merge:
+                _doc_cache.pop(key)
+                _cache_stats["invalidations"] += 1
+            else:
+                doc_entry["doc"] = {**doc_data, 'id': doc_id}
+
+def invalidate_cache(collection_name=None):
+    """Drops cached data for one collection (including its cached documents), or everything."""
+    with _cache_lock:
+        for name in (list(_collection_versions) if collection_name is None else [collection_name]):
+            _bump_version(name)
+        for name in list(_collection_cache):
+            if collection_name is None or name == collection_name:
+                _collection_cache.pop(name)
+                _cache_stats["invalidations"] += 1
+        for key in list(_doc_cache):
+            if collection_name is None or key[0] == collection_name:
+                _doc_cache.pop(key)
+                _cache_stats["invalidations"] += 1
+
+def get_cache_stats():
+    """Returns the cache hit/miss/invalidation/snapshot counters."""
+    with _cache_lock:
+        return dict(_cache_stats)
+
+# --- Concurrent storage calls ---
+# Storage round trips are I/O bound (the Firestore client releases the GIL while it waits), so a
+# handler with independent reads or writes issues them together and waits for the slowest one.
+
+_io_pool = None
+_io_pool_lock = threading.Lock()
+_io_thread = threading.local()
+
+def _mark_io_thread():
+    _io_thread.active = True
+
+def _get_io_pool():
+    global _io_pool
+    with _io_pool_lock:
+        if _io_pool is None:
+            _io_pool = concurrent.futures.ThreadPoolExecutor(
+                max_workers=STORAGE_IO_THREADS, thread_name_prefix="storage-io", initializer=_mark_io_thread
+            )
+        return _io_pool
+
+def run_concurrently(*calls):
+    """
+    Runs independent storage calls (zero-argument callables) at the same time and returns their
+    results in order. The first call runs on the calling thread and the others on a shared thread
+    pool, each in a copy of the caller's context so they count towards the request's metrics.
+    Waits for every call before raising the first error. Nested use runs the calls in order, so
+    pool threads never wait on each other.
+    """
+    if len(calls) < 2 or STORAGE_IO_THREADS <= 1 or getattr(_io_thread, 'active', False):
+        return [call() for call in calls]
+    pool = _get_io_pool()
+    futures = [pool.submit(contextvars.copy_context().run, call) for call in calls[1:]]
+    try:
+        first = calls[0]()
+    finally:
+        concurrent.futures.wait(futures)
+    return [first] + [future.result() for future in futures]
+
+@timed_helper
+def get_all_docs(collection_name, fields=None):
+    """Fetches all documents from a collection; with fields, only those fields of each ('id' included only if listed)."""
+    if collection_name in CACHED_COLLECTIONS:
+        docs = _cached_collection(collection_name).values()
+        if fields is not None: # Projected from the cache, which keeps whole documents
+            return [_project(doc, fields) for doc in docs]
+        return [dict(doc) for doc in docs] # Copies, callers may mutate them
+    if fields is not None:
+        return [_project(doc, fields) for doc in get_backend().get_all_docs(collection_name, [f for f in fields if f != 'id'])]
+    return get_backend().get_all_docs(collection_name)
+
+@timed_helper
 def get_doc(collection_name, doc_id):
-    """Fetches a single document by ID from a Firestore collection."""
-    doc_ref = db.collection(collection_name).document(doc_id)
-    doc = doc_ref.get()
-    if doc.exists:
-        doc_data = doc.to_dict()
-        doc_data['id'] = doc.id
-        return doc_data
-    return None
+    """Fetches a single document by ID from a collection."""
+    if collection_name in CACHED_COLLECTIONS:
+        doc = _cached_collection(collection_name).get(doc_id)
+        return dict(doc) if doc is not None else None
+    if (collection_name, doc_id) in CACHED_DOCS:
+        doc = _cached_doc(collection_name, doc_id)
+        return copy.deepcopy(doc) # Callers may mutate nested values, e.g. rotation_order
+    return get_backend().get_doc(collection_name, doc_id)
 
+@timed_helper
 def set_doc(collection_name, doc_id, data):
-    """Sets (overwrites) a document in a Firestore collection."""
-    db.collection(collection_name).document(doc_id).set(data)
+    """Sets (overwrites) a document in a collection."""
+    get_backend().set_doc(collection_name, doc_id, data)
+    _patch_cache(collection_name, doc_id, data)
 
+@timed_helper
 def add_doc(collection_name, data):
-    """Adds a new document with an auto-generated ID to a Firestore collection."""
-    # Exclude 'id' field if present, as Firestore will generate it
+    """Adds a new document with an auto-generated ID to a collection."""
+    # Exclude 'id' field if present, as the backend will generate it
     data_to_add = {k: v for k, v in data.items() if k != 'id'}
-    _, doc_ref = db.collection(collection_name).add(data_to_add)
-    return doc_ref.id
+    new_id = get_backend().add_doc(collection_name, data_to_add)
+    _patch_cache(collection_name, new_id, data_to_add)
+    return new_id
 
+@timed_helper
 def update_doc(collection_name, doc_id, data_to_update):
     """Updates fields in an existing document."""
-    db.collection(collection_name).document(doc_id).update(data_to_update)
+    get_backend().update_doc(collection_name, doc_id, data_to_update)
+    _patch_cache(collection_name, doc_id, data_to_update, merge=True)
 
+@timed_helper
 def delete_doc(collection_name, doc_id):
-    """Deletes a document from a Firestore collection."""
-    db.collection(collection_name).document(doc_id).delete()
+    """Deletes a document from a collection."""
+    get_backend().delete_doc(collection_name, doc_id)
+    _patch_cache(collection_name, doc_id, deleted=True)
+
+@timed_helper
+def list_docs(collection_name, limit, start_after=None, descending=False):
+    """Fetches one page of a collection ordered by document ID, starting after the start_after ID."""
+    return get_backend().list_docs(collection_name, limit, start_after, descending)
+
+# --- Schedule history ---
+# Every finalized schedule is appended to SCHEDULE_HISTORY_COLLECTION under an ID that starts with
+# the finalization time, so pages ordered by document ID are in chronological order. The same
+# transaction adds the schedule to each employee's lifetime counters and 'recent_weeks' buckets
+# (see schedule_history), which keeps windowed loads available without reading the history.
+
+def _history_doc_id():
+    return f"{int(time.time() * 1000):013d}-{os.urandom(4).hex()}" # Time-sortable, unique across writers
 
+@timed_helper
+def record_finalized_schedule(deltas_by_id, counts_by_id, current_week_start, history_record):
+    """
+    Applies a finalized schedule: {emp_id: {field: amount}} to the lifetime counters and
+    {emp_id: {"shifts": n, ...}} to the recent_weeks of current_week_start, and appends
+    history_record to the schedule history. Returns (history_id, IDs of the employees updated).
+    """
+    history_id = _history_doc_id()
+    emp_ids = list(deltas_by_id)
+    updates_by_id = {}
 
+    def work(transaction, chunk, write_history):
+        updates = {}
+        for emp_id, employee in transaction.get_many(EMPLOYEES_COLLECTION, chunk):
+            if employee is None:
+                continue # Deleted since the schedule was generated
+            update = {field: employee.get(field, 0) + amount for field, amount in deltas_by_id[emp_id].items()}
+            update['recent_weeks'] = roll_recent_weeks(
+                employee.get('recent_weeks'), current_week_start, counts_by_id.get(emp_id, {}), HISTORY_WINDOW_WEEKS
+            )
+            updates[emp_id] = update
+        for emp_id, update in updates.items():
+            transaction.update(EMPLOYEES_COLLECTION, emp_id, update)
+        if write_history:
+            transaction.set(SCHEDULE_HISTORY_COLLECTION, history_id, history_record)
+        return updates
+
+    # One transaction per chunk keeps Firestore under its write limit (the chunks touch different
+    # employees, so they run concurrently); the last one also writes the history record
+    chunk_size = FIRESTORE_BATCH_LIMIT - 1
+    chunks = [emp_ids[start:start + chunk_size] for start in range(0, len(emp_ids), chunk_size)] or [[]]
+    backend = get_backend()
+    for updates in run_concurrently(*(
+        lambda chunk=chunk, write_history=(i == len(chunks) - 1): backend.run_transaction(lambda transaction: work(transaction, chunk, write_history))
+        for i, chunk in enumerate(chunks)
+    )):
+        updates_by_id.update(updates)
+
+    for emp_id, update in updates_by_id.items():
+        _patch_cache(EMPLOYEES_COLLECTION, emp_id, update, merge=True)
+    _patch_cache(SCHEDULE_HISTORY_COLLECTION, history_id, history_record)
+    return history_id, list(updates_by_id)
+
+# --- Unique employee names ---
+# Every employee stores its normalized name as 'name_key', and EMPLOYEE_NAMES_COLLECTION holds one
+# document per name_key pointing at its owner. Both are written in the same transaction as the
+# employee, so a duplicate check is a single keyed read that is atomic with the insert or rename.
+
+class DuplicateEmployeeNameError(Exception):
+    """Raised when another employee already uses the (normalized) name."""
+
+def employee_name_key(name):
+    """Normalizes a name for uniqueness checks (case-insensitive, surrounding whitespace ignored)."""
+    return name.strip().lower()
+
+def employee_name_index_id(name_key):
+    """Document ID of a name_key in EMPLOYEE_NAMES_COLLECTION (hashed, names may contain '/')."""
+    return hashlib.sha256(name_key.encode('utf-8')).hexdigest()
+
+def _name_owner(transaction, name_key):
+    """Returns the ID of the employee that currently holds name_key, ignoring stale index entries."""
+    entry = transaction.get(EMPLOYEE_NAMES_COLLECTION, employee_name_index_id(name_key))
+    if entry is None:
+        return None
+    owner = transaction.get(EMPLOYEES_COLLECTION, entry['employee_id'])
+    if owner is None or owner.get('name_key', employee_name_key(owner['name'])) != name_key:
+        return None # Owner was deleted or renamed without the index being updated
+    return owner['id']
+
+@timed_helper
+def add_employee_doc(employee_data):
+    """Adds an employee and claims its name in one transaction. Returns the new ID."""
+    name_key = employee_name_key(employee_data['name'])
+    data_to_add = {**{k: v for k, v in employee_data.items() if k != 'id'}, 'name_key': name_key}
+
+    def work(transaction):
+        if _name_owner(transaction, name_key) is not None:
+            raise DuplicateEmployeeNameError(employee_data['name'])
+        new_id = transaction.new_id(EMPLOYEES_COLLECTION)
+        transaction.set(EMPLOYEES_COLLECTION, new_id, data_to_add)
+        transaction.set(EMPLOYEE_NAMES_COLLECTION, employee_name_index_id(name_key), {"employee_id": new_id, "name_key": name_key})
+        return new_id
+
+    new_id = get_backend().run_transaction(work)
+    _patch_cache(EMPLOYEES_COLLECTION, new_id, data_to_add)
+    return new_id
+
+@timed_helper
+def rename_employee_doc(employee_id, new_name):
+    """
+    Renames an employee and moves its name claim in one transaction, which also updates the name
+    stored on the on-call rotation. Returns the updated employee, or None if not found.
+    """
+    new_key = employee_name_key(new_name)
+    rotation_updates = {}
+
+    def work(transaction):
+        rotation_updates.clear() # The transaction may be retried
+        employee = transaction.get(EMPLOYEES_COLLECTION, employee_id)
+        if employee is None:
+            return None
+        on_call_data = transaction.get(ON_CALL_COLLECTION, "current")
+        old_key = employee.get('name_key', employee_name_key(employee['name']))
+        new_owner = _name_owner(transaction, new_key)
+        old_owner = _name_owner(transaction, old_key) if old_key != new_key else None
+        if new_owner not in (None, employee_id):
+            raise DuplicateEmployeeNameError(new_name)
+        if old_owner == employee_id:
+            transaction.delete(EMPLOYEE_NAMES_COLLECTION, employee_name_index_id(old_key))
+        transaction.set(EMPLOYEE_NAMES_COLLECTION, employee_name_index_id(new_key), {"employee_id": employee_id, "name_key": new_key})
+        transaction.update(EMPLOYEES_COLLECTION, employee_id, {"name": new_name, "name_key": new_key})
+        if on_call_data and employee_id in (on_call_data.get("rotation_order") or []):
+            rotation_updates["rotation_names"] = {**(on_call_data.get("rotation_names") or {}), employee_id: new_name}
+            transaction.update(ON_CALL_COLLECTION, "current", rotation_updates)
+        return {**employee, "name": new_name, "name_key": new_key}
+
+    updated_employee = get_backend().run_transaction(work)
+    if updated_employee is not None:
+        _patch_cache(EMPLOYEES_COLLECTION, employee_id, {"name": new_name, "name_key": new_key}, merge=True)
+        if rotation_updates:
+            _patch_cache(ON_CALL_COLLECTION, "current", rotation_updates, merge=True)
+    return updated_employee
+
+@timed_helper
+def delete_employee_doc(employee_id):
+    """
+    Deletes an employee, releases its name and removes it from the on-call rotation in one
+    transaction. Returns the deleted employee, or None if not found.
+    """
+    rotation_updates = {}
+
+    def work(transaction):
+        rotation_updates.clear() # The transaction may be retried
+        employee = transaction.get(EMPLOYEES_COLLECTION, employee_id)
+        if employee is None:
+            return None
+        on_call_data = transaction.get(ON_CALL_COLLECTION, "current")
+        name_key = employee.get('name_key', employee_name_key(employee['name']))
+        if _name_owner(transaction, name_key) == employee_id:
+            transaction.delete(EMPLOYEE_NAMES_COLLECTION, employee_name_index_id(name_key))
+        transaction.delete(EMPLOYEES_COLLECTION, employee_id)
+        if on_call_data and employee_id in (on_call_data.get("rotation_order") or []):
+            rotation_updates.update(_prune_rotation(on_call_data, {employee_id}))
+            transaction.update(ON_CALL_COLLECTION, "current", rotation_updates)
+        return employee
+
+    deleted_employee = get_backend().run_transaction(work)
+    if deleted_employee is not None:
+        _patch_cache(EMPLOYEES_COLLECTION, employee_id, deleted=True)
+        if rotation_updates:
+            _patch_cache(ON_CALL_COLLECTION, "current", rotation_updates, merge=True)
+    return deleted_employee
+
+# --- On-call rotation ---
+# The rotation document keeps the employee IDs in 'rotation_order' and their names in
+# 'rotation_names' ({emp_id: name}). Renames and deletes update it in the same transaction as the
+# employee, so reading the current and upcoming on-call employees needs only this one document.
+
+@timed_helper
 def get_on_call_config():
     """Gets the on-call configuration (assuming a single doc named 'current')."""
     doc = get_doc(ON_CALL_COLLECTION, "current") # Using a fixed document ID "current"
     if doc:
         return doc
     # Default if not found
-    default_config = {"current_on_call_index": 0, "rotation_order": []}
+    default_config = {"current_on_call_index": 0, "rotation_order": [], "rotation_names": {}}
     set_doc(ON_CALL_COLLECTION, "current", default_config) # Create it if it doesn't exist
     return default_config
 
+@timed_helper
 def save_on_call_config(data):
-    """Saves the on-call configuration."""
-    set_doc(ON_CALL_COLLECTION, "current", data)
+    """Saves the on-call configuration, storing the names of the employees in its rotation_order."""
+    rotation_order = data.get("rotation_order") or []
+    employees = dict(get_backend().get_docs(EMPLOYEES_COLLECTION, rotation_order)) if rotation_order else {}
+    rotation_names = {emp_id: employees[emp_id]['name'] for emp_id in rotation_order if employees.get(emp_id)}
+    set_doc(ON_CALL_COLLECTION, "current", {**data, "rotation_names": rotation_names})
+
+def _prune_rotation(on_call_data, removed_ids):
+    """
+    Fields that remove removed_ids from the rotation. The current employee stays on call; if they are
+    removed, the next one in the rotation takes over.
+    """
+    rotation_order = on_call_data.get("rotation_order") or []
+    current_index = on_call_data.get("current_on_call_index", 0)
+    remaining = [emp_id for emp_id in rotation_order if emp_id not in removed_ids]
+    removed_before_current = sum(emp_id in removed_ids for emp_id in rotation_order[:current_index])
+    return {
+        "rotation_order": remaining,
+        "current_on_call_index": (current_index - removed_before_current) % len(remaining) if remaining else 0,
+        "rotation_names": {emp_id: name for emp_id, name in (on_call_data.get("rotation_names") or {}).items() if emp_id not in removed_ids},
+    }
+
+@timed_helper
+def sync_on_call_names():
+    """
+    Brings the rotation in line with the employees: fills in missing names, refreshes renamed ones
+    and prunes entries whose employee no longer exists (employees are also edited straight in
+    Firestore by the frontend). The check runs against the cached roster, so it costs no reads
+    unless something differs; the differing employees are then re-read before the rotation is
+    updated. Returns the (updated) configuration.
+    """
+    on_call_data = get_on_call_config()
+    rotation_names = on_call_data.get("rotation_names") or {}
+    roster = _cached_collection(EMPLOYEES_COLLECTION)
+    mismatched_ids = [
+        emp_id for emp_id in dict.fromkeys(on_call_data.get("rotation_order") or [])
+        if emp_id not in roster or rotation_names.get(emp_id) != roster[emp_id].get('name')
+    ]
+    if not mismatched_ids:
+        return on_call_data
+    employees = dict(get_backend().get_docs(EMPLOYEES_COLLECTION, mismatched_ids)) # The cache may lag behind storage
+
+    def backfill(current):
+        if not current:
+            return None
+        names = {**(current.get("rotation_names") or {})}
+        names.update((emp_id, employee['name']) for emp_id, employee in employees.items() if employee is not None)
+        removed_ids = {emp_id for emp_id, employee in employees.items() if employee is None and emp_id in (current.get("rotation_order") or [])}
+        if names == current.get("rotation_names") and not removed_ids:
+            return None # Already up to date
+        return _prune_rotation({**current, "rotation_names": names}, removed_ids)
+
+    on_call_data = get_backend().transform_doc(ON_CALL_COLLECTION, "current", backfill)
+    if on_call_data:
+        _patch_cache(ON_CALL_COLLECTION, "current", {k: v for k, v in on_call_data.items() if k != 'id'})
+    return on_call_data
+
+def upcoming_on_call(on_call_data, count):
+    """The next count rotation entries from the current one (wrapping around): [{"id", "name"}, ...]."""
+    rotation_order = on_call_data.get("rotation_order") or []
+    rotation_names = on_call_data.get("rotation_names") or {}
+    current_index = on_call_data.get("current_on_call_index", 0)
+    return [
+        {"id": emp_id, "name": rotation_names.get(emp_id, "N/A")}
+        for emp_id in (rotation_order[(current_index + offset) % len(rotation_order)] for offset in range(min(count, len(rotation_order))))
+    ]
+
+def _next_on_call_index(on_call_data):
+    if not on_call_data or not on_call_data.get("rotation_order"):
+        return None # Nothing to advance
+    current_index = on_call_data.get("current_on_call_index", 0)
+    return {"current_on_call_index": (current_index + 1) % len(on_call_data["rotation_order"])}
+
+@timed_helper
+def advance_on_call_index():
+    """
+    Moves the on-call rotation to the next employee inside a transaction, so concurrent
+    finalizations each advance it exactly once. Returns the updated configuration (or None if missing).
+    """
+    on_call_data = get_backend().transform_doc(ON_CALL_COLLECTION, "current", _next_on_call_index)
+    if on_call_data and on_call_data.get("rotation_order"):
+        _patch_cache(ON_CALL_COLLECTION, "current", {"current_on_call_index": on_call_data["current_on_call_index"]}, merge=True)
+    return on_call_data
 
 def initialize_databases():
     """Initializes database files with default structures if they don't exist."""
@@ -63,6 +588,18 @@ def initialize_databases():
     get_on_call_config() # This will create it if it doesn't exist
 
     # Check if employees collection is empty (optional: add default data or log)
-    employees = get_all_docs(EMPLOYEES_COLLECTION)
-    if not employees:
+    if not get_backend().has_docs(EMPLOYEES_COLLECTION): # Reads at most one document
         print(f"'{EMPLOYEES_COLLECTION}' collection is empty. Consider adding initial data via Firebase console or a migration script.")
+
+_databases_initialized = False
+_databases_init_lock = threading.Lock()
+
+def ensure_databases_initialized():
+    """Runs initialize_databases once per process; cheap to call on every request afterwards."""
+    global _databases_initialized
+    if _databases_initialized:
+        return
+    with _databases_init_lock:
+        if not _databases_initialized:
+            initialize_databases()
+            _databases_initialized = True